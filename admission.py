@@ -0,0 +1,148 @@
+"""
+Ingest admission control.
+
+Two layers protect the workers (and the dashboard sharing them) from a misbehaving
+unit or a whole fleet reconnecting at once:
+
+- a token bucket per device (plant_id, unit_id): `rate` readings per second with
+  bursts of up to `burst`, so one chatty unit cannot crowd out the rest;
+- global load shedding on signals that build up when the single SQLite writer falls
+  behind: the write-behind queue depth (when write-behind is on) and the time ingest
+  transactions take, lock waits included.
+
+A count of requests in flight would not work here: gunicorn runs sync workers, so
+each process only ever has one request in flight. Lock contention between workers
+shows up as slow write transactions instead; their duration is smoothed, and the
+smoothed value decays while no writes are seen, so shedding ends once load drops.
+
+Rejected requests get 429 with a Retry-After computed from the bucket refill time,
+the queue drain estimate or the write latency decay. Counters are kept for capacity
+planning.
+"""
+
+import math
+import threading
+import time
+
+
+class AdmissionController:
+    def __init__(self, rate=1.0, burst=20, max_write_latency=1.0, latency_half_life=2.0, smoothing=0.3):
+        """
+        rate               -- sustained readings per second per device
+        burst              -- bucket size per device
+        max_write_latency  -- shed ingest while smoothed write transactions take this many seconds
+        latency_half_life  -- seconds for the smoothed latency to halve when no writes are seen
+        smoothing          -- weight of the newest write in the moving average
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_write_latency = max_write_latency
+        self.latency_half_life = latency_half_life
+        self.smoothing = smoothing
+
+        self._buckets = {}
+        self._write_latency = 0.0
+        self._write_seen = None
+        self._lock = threading.Lock()
+
+        # Counters for capacity planning
+        self.admitted = 0
+        self.shed_rate_limited = 0
+        self.shed_overloaded = 0
+        self.shed_by_device = {}
+
+    def try_acquire_all(self, costs, now=None):
+        """
+        Take costs[device_key] tokens from every device's bucket, or none at all, so a
+        request is either admitted whole or rejected whole and can be resent unchanged.
+        A cost above `burst` is charged as a full bucket, otherwise a batch of buffered
+        readings larger than the bucket could never be admitted.
+        Returns (True, 0) when admitted, else (False, seconds until every bucket can pay).
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            refilled = {}
+            wait = 0
+            for device_key, cost in costs.items():
+                cost = min(cost, self.burst)
+                tokens, updated = self._buckets.get(device_key, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+                refilled[device_key] = (tokens, cost)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / self.rate)
+
+            if wait:
+                for device_key, (tokens, cost) in refilled.items():
+                    self._buckets[device_key] = (tokens, now)
+                    if tokens < cost:
+                        self.shed_by_device[device_key] = self.shed_by_device.get(device_key, 0) + 1
+                self.shed_rate_limited += 1
+                return False, wait
+
+            for device_key, (tokens, cost) in refilled.items():
+                self._buckets[device_key] = (tokens - cost, now)
+            self.admitted += 1
+            return True, 0
+
+    def record_write(self, seconds, now=None):
+        """Feed the duration of one ingest write transaction (lock waits and retries included)"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            latency = self._decayed_latency(now)
+            self._write_latency = latency + self.smoothing * (seconds - latency)
+            self._write_seen = now
+
+    def _decayed_latency(self, now):
+        if self._write_seen is None:
+            return 0.0
+        return self._write_latency * 0.5 ** ((now - self._write_seen) / self.latency_half_life)
+
+    def write_latency(self, now=None):
+        """Smoothed write transaction time in seconds, decayed for the time since the last write"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            return self._decayed_latency(now)
+
+    def check_writer(self, now=None):
+        """
+        Admit a request unless the writer is backed up.
+        Returns 0 when admitted, else seconds until the smoothed latency decays below the limit.
+        """
+        latency = self.write_latency(now)
+        with self._lock:
+            if latency < self.max_write_latency:
+                return 0
+            self.shed_overloaded += 1
+        return max(1.0, self.latency_half_life * math.log2(latency / self.max_write_latency))
+
+    def record_admitted(self):
+        """Count a request admitted without the device buckets (e.g. /data/bulk)"""
+        with self._lock:
+            self.admitted += 1
+
+    def record_overload(self):
+        """Count a request shed for write-behind queue depth"""
+        with self._lock:
+            self.shed_overloaded += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'admitted': self.admitted,
+                'write_latency': round(self._decayed_latency(time.monotonic()), 3),
+                'shed_rate_limited': self.shed_rate_limited,
+                'shed_overloaded': self.shed_overloaded,
+                'shed_by_device': {
+                    f"{plant_id}:{unit_id}": count
+                    for (plant_id, unit_id), count in self.shed_by_device.items()
+                },
+            }
+
+
+def retry_after_header(seconds):
+    """Retry-After value: whole seconds, at least 1"""
+    return str(max(1, int(math.ceil(seconds))))
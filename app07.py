@@ -1,8 +1,14 @@
 
 from flask import Flask, request, jsonify, render_template, session
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.sqlite import dialect as sqlite_dialect
 from datetime import datetime, timedelta
+from functools import lru_cache, wraps
+import atexit
+import click
+import json
+import os
 import sqlite3
-import threading
 import time
 import pytz
 import re
@@ -13,6 +19,51 @@ from extension import db, colombo_tz
 # Import auth blueprint and decorator
 from auth import auth_bp, login_required
 
+# SQLite reader/writer split and connection pragmas
+from storage import read_write_split_config, configure_engines, shard_key, shard_binds, read_engine
+
+# Daily time partitions for telemetry
+from partitions import TelemetryPartitions
+
+# Chunked, time-budgeted retention deletes
+from retention import RetentionEngine, RetentionPolicies, RETENTION_TIERS, ALL_PLANTS
+
+# Compact storage profile: scaled-integer measurements, epoch-ms timestamps
+from compact import ScaledInteger, EpochMilliseconds, day_expression, is_compact, convert_table
+
+# Continuous 1m/15m/1h rollups maintained by a watermark catch-up job
+from rollups import TelemetryRollups, ROLLUP_RESOLUTIONS
+
+# Compressed (Gorilla) archive tier, one chunk per unit-day
+from archive import TelemetryArchive, ARCHIVE_TABLE
+
+# gzip CSV day files of expiring telemetry, indexed by a manifest
+from export import TelemetryExport, ExportIntegrityError, source_fingerprint
+
+# Memory-mapped ring buffer of the last 24h per unit, shared by the workers
+from ringbuffer import TelemetryRing
+
+# Per-worker in-memory cache of each unit's latest reading for the snapshot views
+from latest_cache import LatestReadingCache
+
+# Write-behind ingestion queue (group commit)
+from ingest_queue import IngestQueue, IngestQueueFull
+
+# Compact binary telemetry format for /data/bin
+from telemetry_binary import decode_batch, BinaryFormatError
+
+# gzip/deflate request bodies on the ingest endpoints
+from content_encoding import decoding_stream, ContentEncodingError, InvalidCompressedBody
+
+# Per-device replay detection for retried POSTs
+from dedup import DedupWindow, MessageLog
+
+# Ingest admission control (per-device token buckets, 429 backpressure)
+from admission import AdmissionController, retry_after_header
+
+# Cron-scheduled background jobs, run by one leader worker
+from scheduler import JobScheduler
+
 app = Flask(__name__)
 
 # IMPORTANT: Set a secret key for session management
@@ -20,7 +71,10 @@ app.secret_key = 'ae672b758d988238d431925a099a315f5f54d3849a47b43e751e5d162b02fb
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=200)
 
 # Database configuration
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///plant_monitoring.db?check_same_thread=False"
+# PLANT_DB_URI lets benchmarks and maintenance scripts point at a scratch database
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+    "PLANT_DB_URI", "sqlite:///plant_monitoring.db?check_same_thread=False"
+)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=200)
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
@@ -33,8 +87,136 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     }
 }
 
+# Reader/writer split: one serialized writer connection, a pool of query-only readers.
+# Opt-in (PLANT_RW_SPLIT=1): WAL and the pragmas apply either way, so readers already never
+# block the writer, and on the single-CPU host benchmarks/bench_concurrency.py measured
+# slower writes with the split (the pool_size=1 writer queues a worker's threads on one
+# connection) and no read gain. Worth trying with threaded workers on more cores.
+app.config['SQLITE_READ_WRITE_SPLIT'] = os.environ.get("PLANT_RW_SPLIT", "0") == "1"
+if app.config['SQLITE_READ_WRITE_SPLIT']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'], app.config['SQLALCHEMY_BINDS'] = read_write_split_config(
+        app.config["SQLALCHEMY_DATABASE_URI"],
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+    )
+
+# Per-plant shards (see storage.py): PLANT_SHARDS=N moves the per-plant telemetry tables
+# into N database files beside the main one (plant p in shard (p - 1) % N + 1), so plants
+# in different shards ingest in parallel; fleet-wide reads ATTACH every shard. Copy existing
+# rows with 'flask --app app07 shard-existing-data' after switching this on. The unified and
+# partitioned layouts, unit_state, rollups and the archive stay in the main database.
+app.config['TELEMETRY_SHARDS'] = int(os.environ.get("PLANT_SHARDS", "0"))
+if app.config['TELEMETRY_SHARDS']:
+    app.config['SQLALCHEMY_BINDS'] = dict(
+        app.config.get('SQLALCHEMY_BINDS', {}),
+        **shard_binds(app.config["SQLALCHEMY_DATABASE_URI"], app.config['TELEMETRY_SHARDS'],
+                      app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    )
+
+# Compact storage profile (see compact.py): measurements stored as integers scaled to
+# TELEMETRY_COMPACT_DECIMALS places and timestamps as epoch milliseconds, roughly half the
+# bytes per row. Applies to the plant tables, their partitions and fleet_telemetry; convert
+# an existing database with 'flask --app app07 compact-existing-data' after switching it on.
+app.config['TELEMETRY_COMPACT'] = os.environ.get("PLANT_COMPACT", "0") == "1"
+app.config['TELEMETRY_COMPACT_DECIMALS'] = 2
+
+# Store telemetry in daily partitions per plant (see partitions.py); migrate existing
+# rows with 'flask --app app07 partition-existing-data' before switching this on
+app.config['TELEMETRY_PARTITIONING'] = os.environ.get("PLANT_PARTITIONS", "0") == "1"
+
+# Store telemetry in the unified fleet_telemetry table instead of the per-plant tables;
+# copy existing rows with 'flask --app app07 migrate-to-unified' before switching this on.
+# Takes precedence over TELEMETRY_PARTITIONING, which applies to the per-plant schema.
+app.config['TELEMETRY_UNIFIED'] = os.environ.get("PLANT_UNIFIED", "0") == "1"
+
+# Retention per resolution tier, in days (None keeps the tier forever): raw telemetry, the
+# 1m/15m/1h rollups and the compressed archive. Complete days are packed into the archive
+# (see archive.py) before raw rows are deleted, and history reads fall back to it.
+# PLANT_RETENTION_POLICIES overrides tiers per plant, e.g. {3: {'raw': 30}}; the
+# retention_policy table ('flask --app app07 set-retention') overrides both at runtime.
+app.config['RETENTION_POLICY'] = {'raw': 7, '1m': 90, '15m': 365, '1h': None, 'archive': None}
+app.config['PLANT_RETENTION_POLICIES'] = {}
+
+# Before raw rows expire, each plant-day is streamed into a gzip CSV file with a manifest
+# entry (see export.py), under <database dir>/telemetry_export unless PLANT_EXPORT_DIR is set
+app.config['TELEMETRY_EXPORT'] = os.environ.get("PLANT_EXPORT", "1") == "1"
+app.config['TELEMETRY_EXPORT_DIR'] = os.environ.get("PLANT_EXPORT_DIR")
+app.config['TELEMETRY_EXPORT_BATCH_ROWS'] = 2000   # rows fetched per round trip while streaming
+app.config['TELEMETRY_ARCHIVE'] = os.environ.get("PLANT_ARCHIVE", "1") == "1"
+app.config['HISTORY_MAX_DAYS'] = 31             # widest range /api/plant/<id>/unit/<id>/history serves
+app.config['RETENTION_CHUNK_ROWS'] = 5000       # first chunk of each purge; adapts to the budget
+app.config['RETENTION_CHUNK_BUDGET_MS'] = 250   # longest a retention chunk should hold the write lock
+app.config['RETENTION_PAUSE_MS'] = 50           # gap between chunks for ingest to commit
+
+# unit_state: latest reading per unit, upserted in every ingest transaction; the
+# snapshot views read it (one row per unit) when the ring buffer cannot answer
+app.config['TELEMETRY_UNIT_STATE'] = os.environ.get("PLANT_UNIT_STATE", "1") == "1"
+
+# Ring buffer (see ringbuffer.py): the live views and recent windows read the last 24h
+# from a memory-mapped file instead of SQLite. The file sits next to the SQLite database
+# unless PLANT_RING_PATH is set; capacity is records per unit (24h at one reading per 5 s).
+app.config['TELEMETRY_RING'] = os.environ.get("PLANT_RING", "1") == "1"
+app.config['TELEMETRY_RING_PATH'] = os.environ.get("PLANT_RING_PATH")
+app.config['TELEMETRY_RING_CAPACITY'] = 17280
+
+# Latest-reading cache (see latest_cache.py): the snapshot views read each unit's newest
+# reading from process memory. It is updated after every ingest commit in this worker and
+# reloaded from unit_state / the ring / telemetry (readings within the lookback) at most
+# every LATEST_CACHE_REFRESH_SECONDS, which brings in rows other workers stored.
+app.config['LATEST_CACHE'] = os.environ.get("PLANT_LATEST_CACHE", "1") == "1"
+app.config['LATEST_CACHE_REFRESH_SECONDS'] = 1.0
+app.config['LATEST_CACHE_LOOKBACK_SECONDS'] = 3600
+
+# Rollups (see rollups.py): a background job keeps 1m/15m/1h summaries per unit up to
+# ROLLUP_LAG_SECONDS behind the clock; history charts read them instead of raw telemetry
+app.config['TELEMETRY_ROLLUPS'] = os.environ.get("PLANT_ROLLUPS", "1") == "1"
+app.config['ROLLUP_LAG_SECONDS'] = 120
+
+# Background jobs (see scheduler.py): every gunicorn worker starts a scheduler from the
+# post_worker_init hook in gunicorn_config.py, and the one holding <database>.scheduler.lock
+# runs the jobs. Importing the app (flask CLI, scripts, benchmarks) starts nothing.
+# Schedules are cron expressions in Colombo time; a job whose feature is switched off is
+# not registered. PLANT_JOBS=0 keeps a serving process out of the election.
+app.config['BACKGROUND_JOBS'] = os.environ.get("PLANT_JOBS", "1") == "1"
+app.config['BACKGROUND_JOBS_LOCK_PATH'] = os.environ.get("PLANT_JOBS_LOCK_PATH")
+app.config['BACKGROUND_JOBS_POLL_SECONDS'] = 5
+app.config['JOB_SCHEDULES'] = {
+    'retention': '30 0 * * *',      # archive, purge and reclaim once a day
+    'rollups': '* * * * *',         # rollup catch-up and late-minute recompute
+    'ingest-messages': '*/10 * * * *',  # forget stored message ids past the dedup horizon
+}
+
+# Write-behind ingestion: /data queues rows and a flusher thread group-commits them
+app.config['INGEST_WRITE_BEHIND'] = os.environ.get("PLANT_WRITE_BEHIND", "0") == "1"
+app.config['INGEST_QUEUE_MAX_ROWS'] = 10000      # bound on queued rows before /data returns 503
+app.config['INGEST_FLUSH_INTERVAL_MS'] = 50      # commit whatever arrived in this window...
+app.config['INGEST_FLUSH_MAX_ROWS'] = 500        # ...or as soon as this many rows are queued
+app.config['INGEST_FLUSH_ATTEMPTS'] = 5          # commits tried per batch (backoff 0.5 s doubling to 30 s)...
+app.config['INGEST_SPILL_DIR'] = os.environ.get("PLANT_INGEST_SPILL_DIR")  # ...then spilled here
+
+# Admission control: per-device token bucket and global load limits (429 + Retry-After)
+app.config['INGEST_DEVICE_RATE'] = 1.0           # sustained readings per second per unit
+app.config['INGEST_DEVICE_BURST'] = 20           # bucket size, absorbs reconnect flushes
+app.config['INGEST_MAX_WRITE_LATENCY_MS'] = 1000  # shed while ingest commits (lock waits included) take this long
+app.config['INGEST_QUEUE_HIGH_WATER'] = 0.8      # shed when the write-behind queue is this full
+
+# Recent message ids / sequence numbers remembered per device for replay detection
+# (see dedup.py): in each worker's memory, and in ingest_message for the horizon
+app.config['INGEST_DEDUP_WINDOW'] = 1024
+app.config['INGEST_DEDUP_RESET_GAP'] = 100       # a sequence this far behind the newest is a device restart
+app.config['INGEST_DEDUP_HORIZON_HOURS'] = 24
+
+# Hard cap on the decompressed size of gzip/deflate ingest bodies
+app.config['INGEST_MAX_DECOMPRESSED_BYTES'] = 32 * 1024 * 1024
+
+# NDJSON bulk ingestion (/data/bulk)
+app.config['INGEST_BULK_CHUNK_ROWS'] = 500       # rows per INSERT transaction while streaming
+app.config['INGEST_BULK_MAX_LINE_BYTES'] = 64 * 1024
+app.config['INGEST_BACKFILL_CHUNK_ROWS'] = 5000  # larger chunks for /data/bulk?mode=backfill
+
 # Initialize db with app
 db.init_app(app)
+with app.app_context():
+    configure_engines(db)
 
 # Register authentication blueprint
 app.register_blueprint(auth_bp)
@@ -76,42 +258,69 @@ def utc_to_colombo(utc_dt):
         utc_dt = pytz.utc.localize(utc_dt)
     return utc_dt.astimezone(colombo_tz)
 
+# Declarative index set for every telemetry table: (name suffix, columns).
+# (unit_id, timestamp) serves "latest record per unit"; timestamp serves history and cleanup.
+PLANT_TABLE_INDEXES = (
+    ('unit_id_timestamp', ('unit_id', 'timestamp')),
+    ('timestamp', ('timestamp',)),
+)
+
+# Column types of the telemetry tables in the configured storage profile
+if app.config['TELEMETRY_COMPACT']:
+    MeasurementType = ScaledInteger(10 ** app.config['TELEMETRY_COMPACT_DECIMALS'])
+    TimestampType = EpochMilliseconds()
+else:
+    MeasurementType, TimestampType = db.Float, db.DateTime
+
 # Enhanced table model for comprehensive ESP32 data
 def create_plant_table(plant_id,plant_name):
     class_name = f'Plant{plant_id}Data'
     table_name = f'plant_{plant_name}_data'
     
+    table_args = tuple(
+        db.Index(f'ix_{table_name}_{suffix}', *columns)
+        for suffix, columns in PLANT_TABLE_INDEXES
+    )
+    
     attrs = {
         '__tablename__': table_name,
+        '__table_args__': table_args,
         'id': db.Column(db.Integer, primary_key=True),
         'unit_id': db.Column(db.Integer, nullable=False),
         
         # Power measurements
-        'power': db.Column(db.Float, nullable=True),
+        'power': db.Column(MeasurementType, nullable=True),
         
         # Current measurements (3-phase)
-        'current_l1': db.Column(db.Float, nullable=True),
-        'current_l2': db.Column(db.Float, nullable=True),
-        'current_l3': db.Column(db.Float, nullable=True),
-        'current_avg': db.Column(db.Float, nullable=True),
+        'current_l1': db.Column(MeasurementType, nullable=True),
+        'current_l2': db.Column(MeasurementType, nullable=True),
+        'current_l3': db.Column(MeasurementType, nullable=True),
+        'current_avg': db.Column(MeasurementType, nullable=True),
         
         # Voltage measurements (3-phase)
-        'voltage_l12': db.Column(db.Float, nullable=True),
-        'voltage_l23': db.Column(db.Float, nullable=True),
-        'voltage_l13': db.Column(db.Float, nullable=True),
-        'voltage_avg': db.Column(db.Float, nullable=True),
+        'voltage_l12': db.Column(MeasurementType, nullable=True),
+        'voltage_l23': db.Column(MeasurementType, nullable=True),
+        'voltage_l13': db.Column(MeasurementType, nullable=True),
+        'voltage_avg': db.Column(MeasurementType, nullable=True),
         
         # Energy and runtime
-        'energy': db.Column(db.Float, nullable=True),
-        'runtime': db.Column(db.Float, nullable=True),
+        'energy': db.Column(MeasurementType, nullable=True),
+        'runtime': db.Column(MeasurementType, nullable=True),
         
         # Additional calculated fields
-        'power_factor': db.Column(db.Float, nullable=True),
-        'efficiency': db.Column(db.Float, nullable=True),
+        'power_factor': db.Column(MeasurementType, nullable=True),
+        'efficiency': db.Column(MeasurementType, nullable=True),
         
-        'timestamp': db.Column(db.DateTime, default=datetime.utcnow)
+        'timestamp': db.Column(TimestampType, default=datetime.utcnow)
     }
     
+    if app.config['TELEMETRY_SHARDS']:
+        # The bind key routes writes to the shard's engine, the schema name finds the table
+        # in the shard file that reader connections ATTACH under that name
+        key = shard_key(plant_id, app.config['TELEMETRY_SHARDS'])
+        attrs['__bind_key__'] = key
+        attrs['__table_args__'] = table_args + ({'schema': key},)
+    
     return type(class_name, (db.Model,), attrs)
 
 # Create all plant table models
@@ -119,67 +328,376 @@ PLANT_TABLES = {}
 for plant_id,plant_name in PLANT_NAMES.items():
     PLANT_TABLES[plant_id] = create_plant_table(plant_id,plant_name)
 
+def plant_engine(plant_id):
+    """Engine writing a plant's table: its shard's, or the main writer"""
+    if app.config['TELEMETRY_SHARDS']:
+        return db.engines[shard_key(plant_id, app.config['TELEMETRY_SHARDS'])]
+    return db.engine
+
+def database_engines():
+    """Writer engine of every database file: the main one, then the shards"""
+    engines = [db.engine]
+    for plant_id in PLANT_TABLES:
+        if plant_engine(plant_id) not in engines:
+            engines.append(plant_engine(plant_id))
+    return engines
+
+# Optional unified fleet schema: every plant in one table, clustered on
+# (plant_id, unit_id, timestamp) so fleet-wide views run as single indexed statements
+class FleetTelemetry(db.Model):
+    __tablename__ = 'fleet_telemetry'
+    __table_args__ = (
+        db.Index('ix_fleet_telemetry_timestamp', 'timestamp'),
+        {'sqlite_with_rowid': False},
+    )
+    
+    plant_id = db.Column(db.Integer, primary_key=True)
+    unit_id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(TimestampType, primary_key=True, default=datetime.utcnow)
+    
+    power = db.Column(MeasurementType, nullable=True)
+    current_l1 = db.Column(MeasurementType, nullable=True)
+    current_l2 = db.Column(MeasurementType, nullable=True)
+    current_l3 = db.Column(MeasurementType, nullable=True)
+    current_avg = db.Column(MeasurementType, nullable=True)
+    voltage_l12 = db.Column(MeasurementType, nullable=True)
+    voltage_l23 = db.Column(MeasurementType, nullable=True)
+    voltage_l13 = db.Column(MeasurementType, nullable=True)
+    voltage_avg = db.Column(MeasurementType, nullable=True)
+    energy = db.Column(MeasurementType, nullable=True)
+    runtime = db.Column(MeasurementType, nullable=True)
+    power_factor = db.Column(MeasurementType, nullable=True)
+    efficiency = db.Column(MeasurementType, nullable=True)
+
+FLEET_TABLE = FleetTelemetry.__table__
+
+# Latest reading per unit, kept current by store_plant_rows in the ingest transaction
+class UnitState(db.Model):
+    __tablename__ = 'unit_state'
+    
+    plant_id = db.Column(db.Integer, primary_key=True)
+    unit_id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    
+    power = db.Column(db.Float, nullable=True)
+    current_l1 = db.Column(db.Float, nullable=True)
+    current_l2 = db.Column(db.Float, nullable=True)
+    current_l3 = db.Column(db.Float, nullable=True)
+    current_avg = db.Column(db.Float, nullable=True)
+    voltage_l12 = db.Column(db.Float, nullable=True)
+    voltage_l23 = db.Column(db.Float, nullable=True)
+    voltage_l13 = db.Column(db.Float, nullable=True)
+    voltage_avg = db.Column(db.Float, nullable=True)
+    energy = db.Column(db.Float, nullable=True)
+    runtime = db.Column(db.Float, nullable=True)
+
+UNIT_STATE_TABLE = UnitState.__table__
+
 # Create all tables
 with app.app_context():
     db.create_all()
 
-def parse_esp32_data(json_data):
+# Daily partitions per plant (plant_<NAME>_data_YYYYMMDD); the plant tables become templates
+telemetry_partitions = TelemetryPartitions(
+    {plant_id: PlantTable.__table__ for plant_id, PlantTable in PLANT_TABLES.items()},
+    PLANT_TABLE_INDEXES,
+)
+
+def latest_unit_record(plant_id, unit_id, since):
+    """Most recent reading of a unit at or after `since`, or None"""
+    if app.config['TELEMETRY_UNIFIED']:
+        return db.session.execute(
+            db.select(FLEET_TABLE)
+            .where(FLEET_TABLE.c.plant_id == plant_id)
+            .where(FLEET_TABLE.c.unit_id == unit_id)
+            .where(FLEET_TABLE.c.timestamp >= since)
+            .order_by(FLEET_TABLE.c.timestamp.desc())
+            .limit(1)
+        ).first()
+    
+    if app.config['TELEMETRY_PARTITIONING']:
+        return telemetry_partitions.latest(db.session, plant_id, unit_id, since)
+    
+    PlantTable = PLANT_TABLES[plant_id]
+    return PlantTable.query.filter_by(unit_id=unit_id)\
+                           .filter(PlantTable.timestamp >= since)\
+                           .order_by(PlantTable.timestamp.desc())\
+                           .first()
+
+def latest_fleet_statement(since, plant_id=None):
     """
-    Parse ESP32-style JSON data and extract plant_id, unit_id, and measurements
-    Expected format: {plantname}_u{unit_id}_{parameter}: value
+    Unified schema: latest reading per (plant_id, unit_id) at or after `since` as one
+    statement - one primary key seek per configured unit, never a range scan.
     """
-    parsed_units = {}
+    plant_ids = [plant_id] if plant_id is not None else list(PLANT_CONFIG)
+    latest = [
+        db.select(FLEET_TABLE)
+          .where(FLEET_TABLE.c.plant_id == pid)
+          .where(FLEET_TABLE.c.unit_id == unit_id)
+          .where(FLEET_TABLE.c.timestamp >= since)
+          .order_by(FLEET_TABLE.c.timestamp.desc())
+          .limit(1)
+          .subquery()
+        for pid in plant_ids
+        for unit_id in range(1, PLANT_CONFIG[pid] + 1)
+    ]
+    return db.union_all(*(db.select(subquery) for subquery in latest))
+
+def latest_plants_statement(since):
+    """
+    Per-plant schema: the same as one statement over every plant table - one
+    (unit_id, timestamp) index seek per unit. With shards it spans the attached
+    shard files, so run it on read_engine(db).
+    """
+    latest = []
+    for plant_id, PlantTable in PLANT_TABLES.items():
+        table = PlantTable.__table__
+        for unit_id in range(1, PLANT_CONFIG[plant_id] + 1):
+            latest.append(
+                db.select(db.literal(plant_id).label('plant_id'), *table.c)
+                  .where(table.c.unit_id == unit_id)
+                  .where(table.c.timestamp >= since)
+                  .order_by(table.c.timestamp.desc())
+                  .limit(1)
+                  .subquery()
+            )
+    return db.union_all(*(db.select(subquery) for subquery in latest))
+
+def ring_covers(plant_id, since):
+    """True if the ring buffer holds every reading of the plant's units at or after `since`"""
+    return telemetry_ring is not None and all(
+        telemetry_ring.covers(plant_id, unit_id, since) for unit_id in range(1, PLANT_CONFIG[plant_id] + 1)
+    )
+
+def ring_latest_records(plant_id, since):
+    """{unit_id: latest reading} from the ring buffer, or None if it does not cover `since`"""
+    if not ring_covers(plant_id, since):
+        return None
     
-    # Regular expression to match the ESP32 data format
-    pattern = r'([a-zA-Z0-9]+)_u(\d+)_(.+)'
+    latest_records = {}
+    for unit_id in range(1, PLANT_CONFIG[plant_id] + 1):
+        latest_record = telemetry_ring.latest(plant_id, unit_id, since)
+        if latest_record:
+            latest_records[unit_id] = latest_record
+    return latest_records
+
+def unit_state_records(since, plant_id=None):
+    """unit_state rows updated at or after `since` (one per unit at most)"""
+    query = db.select(UNIT_STATE_TABLE).where(UNIT_STATE_TABLE.c.timestamp >= since)
+    if plant_id is not None:
+        query = query.where(UNIT_STATE_TABLE.c.plant_id == plant_id)
+    return db.session.execute(query).all()
+
+def latest_plant_records(plant_id, since):
+    """{unit_id: latest reading at or after `since`} for one plant's units"""
+    if latest_cache is not None:
+        return latest_cache.plant(plant_id, since)
+    return stored_latest_plant_records(plant_id, since)
+
+def stored_latest_plant_records(plant_id, since):
+    """latest_plant_records() from the ring buffer, unit_state or the telemetry history"""
+    latest_records = ring_latest_records(plant_id, since)
+    if latest_records is not None:
+        return latest_records
     
-    for key, value in json_data.items():
-        match = re.match(pattern, key)
-        if match:
-            plant_name = match.group(1).lower()
-            unit_id = int(match.group(2))
-            parameter = match.group(3)
-            
-            # Get plant_id from plant name
-            plant_id = PLANT_NAME_TO_ID.get(plant_name)
-            if plant_id is None:
-                continue
-                
-            # Initialize unit data if not exists
-            unit_key = (plant_id, unit_id)
-            if unit_key not in parsed_units:
-                parsed_units[unit_key] = {
-                    'plant_id': plant_id,
-                    'unit_id': unit_id,
-                }
-            
-            # Map parameters to database fields
-            try:
-                value = float(value)
-                if parameter == 'power':
-                    parsed_units[unit_key]['power'] = value
-                elif parameter == 'current_L1':
-                    parsed_units[unit_key]['current_l1'] = value
-                elif parameter == 'current_L2':
-                    parsed_units[unit_key]['current_l2'] = value
-                elif parameter == 'current_L3':
-                    parsed_units[unit_key]['current_l3'] = value
-                elif parameter == 'voltage_L12':
-                    parsed_units[unit_key]['voltage_l12'] = value
-                elif parameter == 'voltage_L23':
-                    parsed_units[unit_key]['voltage_l23'] = value
-                elif parameter == 'voltage_L13':
-                    parsed_units[unit_key]['voltage_l13'] = value
-                elif parameter == 'energy':
-                    parsed_units[unit_key]['energy'] = value
-                elif parameter == 'runtime':
-                    parsed_units[unit_key]['runtime'] = value
-                    
-            except (ValueError, TypeError):
-                continue
+    if app.config['TELEMETRY_UNIT_STATE']:
+        return {row.unit_id: row for row in unit_state_records(since, plant_id)}
     
-    # Calculate averages for units that have the data
-    for unit_data in parsed_units.values():
+    return search_latest_records(plant_id, since)
+
+def search_latest_records(plant_id, since):
+    """latest_plant_records() searched in the telemetry history itself"""
+    if app.config['TELEMETRY_UNIFIED']:
+        rows = db.session.execute(latest_fleet_statement(since, plant_id)).all()
+        return {row.unit_id: row for row in rows}
+    
+    latest_records = {}
+    for unit_id in range(1, PLANT_CONFIG[plant_id] + 1):
+        latest_record = latest_unit_record(plant_id, unit_id, since)
+        if latest_record:
+            latest_records[unit_id] = latest_record
+    return latest_records
+
+def latest_fleet_records(since):
+    """{(plant_id, unit_id): latest reading at or after `since`} for the whole fleet"""
+    if latest_cache is not None:
+        return latest_cache.fleet(since)
+    return stored_latest_fleet_records(since)
+
+def stored_latest_fleet_records(since):
+    """latest_fleet_records() from the ring buffer, unit_state or the telemetry history"""
+    if not all(ring_covers(plant_id, since) for plant_id in PLANT_CONFIG):
+        if app.config['TELEMETRY_UNIT_STATE']:
+            return {(row.plant_id, row.unit_id): row for row in unit_state_records(since)}
+        if app.config['TELEMETRY_UNIFIED']:
+            rows = db.session.execute(latest_fleet_statement(since)).all()
+            return {(row.plant_id, row.unit_id): row for row in rows}
+        if not app.config['TELEMETRY_PARTITIONING']:
+            rows = db.session.execute(latest_plants_statement(since), bind_arguments={'bind': read_engine(db)}).all()
+            return {(row.plant_id, row.unit_id): row for row in rows}
+    
+    return {
+        (plant_id, unit_id): latest_record
+        for plant_id in PLANT_CONFIG
+        for unit_id, latest_record in stored_latest_plant_records(plant_id, since).items()
+    }
+
+def plant_records_since(plant_id, since, until=None, unit_id=None):
+    """All readings of a plant (or one unit) at or after `since` (and before `until`), oldest first"""
+    if app.config['TELEMETRY_UNIFIED']:
+        query = db.select(FLEET_TABLE)\
+                  .where(FLEET_TABLE.c.plant_id == plant_id)\
+                  .where(FLEET_TABLE.c.timestamp >= since)
+        if until is not None:
+            query = query.where(FLEET_TABLE.c.timestamp < until)
+        if unit_id is not None:
+            query = query.where(FLEET_TABLE.c.unit_id == unit_id)
+        return db.session.execute(query.order_by(FLEET_TABLE.c.timestamp.asc())).all()
+    
+    if app.config['TELEMETRY_PARTITIONING']:
+        if until is None and unit_id is None:
+            return telemetry_partitions.rows_since(db.session, plant_id, since)
+        statement = telemetry_partitions.select_range(
+            db.session, plant_id, since, until or datetime.utcnow() + timedelta(days=1), unit_id=unit_id
+        )
+        return db.session.execute(statement).all() if statement is not None else []
+    
+    PlantTable = PLANT_TABLES[plant_id]
+    query = PlantTable.query.filter(PlantTable.timestamp >= since)
+    if until is not None:
+        query = query.filter(PlantTable.timestamp < until)
+    if unit_id is not None:
+        query = query.filter(PlantTable.unit_id == unit_id)
+    return query.order_by(PlantTable.timestamp.asc()).all()
+
+def recent_plant_records(plant_id, since, until=None):
+    """plant_records_since() served from the ring buffer when it covers `since`"""
+    if not ring_covers(plant_id, since):
+        return plant_records_since(plant_id, since, until)
+    
+    records = []
+    for unit_id in range(1, PLANT_CONFIG[plant_id] + 1):
+        records.extend(telemetry_ring.records(plant_id, unit_id, since, until))
+    records.sort(key=lambda record: record.timestamp)
+    return records
+
+retention_policies = RetentionPolicies(
+    app.config['RETENTION_POLICY'],
+    app.config['PLANT_RETENTION_POLICIES'],
+)
+
+# Retention deletes in chunks of about RETENTION_CHUNK_BUDGET_MS each (see retention.py)
+telemetry_retention = RetentionEngine(
+    chunk_rows=app.config['RETENTION_CHUNK_ROWS'],
+    time_budget=app.config['RETENTION_CHUNK_BUDGET_MS'] / 1000.0,
+    pause=app.config['RETENTION_PAUSE_MS'] / 1000.0,
+)
+
+telemetry_rollups = TelemetryRollups(
+    plant_records_since,
+    PLANT_CONFIG,
+    read_recent=recent_plant_records,
+    lag=timedelta(seconds=app.config['ROLLUP_LAG_SECONDS']),
+    initial_lookback=timedelta(days=app.config['RETENTION_POLICY']['raw']),
+    raw_start=lambda plant_id: retention_policies.cutoff(plant_id, 'raw', datetime.utcnow(), db.session),
+)
+
+# ESP32 key format: {plantname}_u{unit_id}_{parameter}
+ESP32_KEY_PATTERN = re.compile(r'([a-zA-Z0-9]+)_u(\d+)_(.+)')
+
+# ESP32 parameter name -> database column
+ESP32_PARAMETER_COLUMNS = {
+    'power': 'power',
+    'current_L1': 'current_l1',
+    'current_L2': 'current_l2',
+    'current_L3': 'current_l3',
+    'voltage_L12': 'voltage_l12',
+    'voltage_L23': 'voltage_l23',
+    'voltage_L13': 'voltage_l13',
+    'energy': 'energy',
+    'runtime': 'runtime',
+    # Optional device-side reading time (epoch seconds/ms or ISO-8601)
+    'timestamp': 'timestamp',
+    'ts': 'timestamp',
+    # Optional sequence number / message id used to drop retried duplicates
+    'seq': 'message_id',
+    'msg_id': 'message_id',
+}
+
+# Payload-level device timestamp keys, applied to every unit without its own
+ESP32_PAYLOAD_TIMESTAMP_KEYS = ('timestamp', 'ts')
+
+# Payload-level message id keys, applied to every unit without its own
+ESP32_PAYLOAD_MESSAGE_ID_KEYS = ('msg_id', 'seq')
+
+# Device clocks running further ahead than this are ignored (server time is used instead)
+MAX_DEVICE_CLOCK_SKEW = timedelta(minutes=5)
+
+def parse_device_timestamp(value):
+    """
+    Convert a device timestamp to a naive UTC datetime (the storage convention).
+    Accepts epoch seconds or milliseconds and ISO-8601 strings (naive = UTC).
+    Returns None for missing, malformed or future timestamps.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    
+    try:
+        if isinstance(value, str) and not value.strip().replace('.', '', 1).isdigit():
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(pytz.utc).replace(tzinfo=None)
+        else:
+            epoch = float(value)
+            if epoch > 1e11:
+                # Milliseconds since epoch
+                epoch /= 1000.0
+            parsed = datetime.utcfromtimestamp(epoch)
+    except (ValueError, TypeError, OverflowError, OSError):
+        return None
+    
+    if parsed > datetime.utcnow() + MAX_DEVICE_CLOCK_SKEW:
+        return None
+    return parsed
+
+def drop_implausible_timestamps(parsed_units, now=None):
+    """
+    Live ingest (/data, /data/bin): a device timestamp from the future, or older than the
+    plant's raw retention cutoff, falls back to the receive time. A clock that never synced
+    sends boot-relative seconds (1970), and such a row would be purged as soon as it landed.
+    Backfill (/data/bulk?mode=backfill) keeps old timestamps; it is meant for them.
+    """
+    now = now or datetime.utcnow()
+    latest_allowed = now + MAX_DEVICE_CLOCK_SKEW
+    for unit_data in parsed_units:
+        timestamp = unit_data.get('timestamp')
+        if timestamp is None:
+            continue
+        earliest_allowed = retention_policies.cutoff(unit_data['plant_id'], 'raw', now, db.session)
+        if timestamp > latest_allowed or (earliest_allowed is not None and timestamp < earliest_allowed):
+            del unit_data['timestamp']
+
+@lru_cache(maxsize=4096)
+def resolve_esp32_key(key):
+    """
+    Resolve a raw ESP32 key to (plant_id, unit_id, column), memoized.
+    column is None for unknown parameters; returns None for keys that are rejected.
+    Devices resend the same keys every cycle, so known payloads only cost cache hits.
+    """
+    match = ESP32_KEY_PATTERN.match(key)
+    if not match:
+        return None
+    
+    # Get plant_id from plant name
+    plant_id = PLANT_NAME_TO_ID.get(match.group(1).lower())
+    if plant_id is None:
+        return None
+    
+    return plant_id, int(match.group(2)), ESP32_PARAMETER_COLUMNS.get(match.group(3))
+
+def calculate_unit_averages(units):
+    """Fill current_avg / voltage_avg on parsed unit dicts from the 3-phase readings"""
+    for unit_data in units:
         # Calculate average current
         currents = [unit_data.get('current_l1'), unit_data.get('current_l2'), unit_data.get('current_l3')]
         valid_currents = [c for c in currents if c is not None]
@@ -191,58 +709,1035 @@ def parse_esp32_data(json_data):
         valid_voltages = [v for v in voltages if v is not None]
         if valid_voltages:
             unit_data['voltage_avg'] = sum(valid_voltages) / len(valid_voltages)
+
+def parse_esp32_data(json_data):
+    """
+    Parse ESP32-style JSON data and extract plant_id, unit_id, and measurements
+    Expected format: {plantname}_u{unit_id}_{parameter}: value
+    """
+    parsed_units = {}
+    
+    for key, value in json_data.items():
+        resolved = resolve_esp32_key(key) if isinstance(key, str) else None
+        if resolved is None:
+            continue
+        plant_id, unit_id, column = resolved
+        
+        # Initialize unit data if not exists
+        unit_key = (plant_id, unit_id)
+        unit_data = parsed_units.get(unit_key)
+        if unit_data is None:
+            unit_data = parsed_units[unit_key] = {
+                'plant_id': plant_id,
+                'unit_id': unit_id,
+            }
+        
+        # Map parameters to database fields
+        if column is None:
+            continue
+        if column == 'timestamp':
+            device_time = parse_device_timestamp(value)
+            if device_time is not None:
+                unit_data['timestamp'] = device_time
+            continue
+        if column == 'message_id':
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                unit_data['message_id'] = str(value)
+            continue
+        try:
+            unit_data[column] = float(value)
+        except (ValueError, TypeError):
+            continue
+    
+    # A payload-level timestamp covers every unit that did not send its own
+    for timestamp_key in ESP32_PAYLOAD_TIMESTAMP_KEYS:
+        if timestamp_key in json_data:
+            device_time = parse_device_timestamp(json_data[timestamp_key])
+            if device_time is not None:
+                for unit_data in parsed_units.values():
+                    unit_data.setdefault('timestamp', device_time)
+            break
+    
+    for message_id_key in ESP32_PAYLOAD_MESSAGE_ID_KEYS:
+        value = json_data.get(message_id_key)
+        if isinstance(value, (str, int)) and not isinstance(value, bool):
+            for unit_data in parsed_units.values():
+                unit_data.setdefault('message_id', str(value))
+            break
+    
+    # Calculate averages for units that have the data
+    calculate_unit_averages(parsed_units.values())
     
     return list(parsed_units.values())
-def cleanup_old_data():
+def apply_retention():
     """
-    Runs every 24 hours and deletes records older than 7 days
+    Enforce each plant's retention policy (see retention.py): archive complete days, then
+    delete raw rows, rollups and archive chunks older than their tier's period. Rows go in
+    time-budgeted chunks so ingest keeps its turn at the write lock; freed pages are
+    reclaimed at the end.
     """
-    while True:
+    now = datetime.utcnow()
+    retention_policies.load(db.session)
+    
+    print(f"[{datetime.now()}] Running retention")
+    
+    if app.config['TELEMETRY_ARCHIVE']:
+        # Late rows for archived days go into their chunks before raw retention deletes them
+        rebuilt = telemetry_archive.process_dirty(db.session)
+        print(f"  ✓ Rebuilt {rebuilt} archived days that received late records")
+    
+    for plant_id, PlantTable in PLANT_TABLES.items():
+        policy = retention_policies.policy(plant_id)
+        print(f"  Plant {plant_id}: " + ", ".join(
+            f"{tier} {'forever' if policy[tier] is None else f'{policy[tier]}d'}" for tier in RETENTION_TIERS
+        ))
+        
+        if app.config['TELEMETRY_ARCHIVE']:
+            archived = archive_complete_days(plant_id)
+            print(f"  ✓ Plant {plant_id}: Archived {sum(archived.values())} records from {len(archived)} days")
+        
+        cutoff_date = retention_policies.cutoff(plant_id, 'raw', now)
+        if telemetry_export is not None:
+            exported = export_expiring_days(plant_id, cutoff_date)
+            print(f"  ✓ Plant {plant_id}: Exported {sum(exported.values())} records from {len(exported)} days "
+                  f"to {telemetry_export.directory}")
+        
+        deleted = telemetry_retention.purge(db.session, PlantTable.__table__, cutoff_date)
+        print(f"  ✓ Plant {plant_id}: Deleted {deleted} old records")
+        
+        if app.config['TELEMETRY_UNIFIED']:
+            deleted = telemetry_retention.purge(
+                db.session, FLEET_TABLE, cutoff_date, FLEET_TABLE.c.plant_id == plant_id,
+                label=f"fleet_telemetry plant {plant_id}"
+            )
+            print(f"  ✓ Plant {plant_id}: Deleted {deleted} old fleet records")
+        
+        if app.config['TELEMETRY_PARTITIONING']:
+            # Whole days are dropped, only the boundary day is trimmed row by row
+            dropped, trimmed = telemetry_partitions.drop_before(db.session, plant_id, cutoff_date)
+            db.session.commit()
+            print(f"  ✓ Plant {plant_id}: Dropped {len(dropped)} partitions, trimmed {trimmed} records")
+        
+        if app.config['TELEMETRY_ROLLUPS']:
+            for resolution in ROLLUP_RESOLUTIONS:
+                rollup_cutoff = retention_policies.cutoff(plant_id, resolution, now)
+                if rollup_cutoff is None:
+                    continue
+                deleted = telemetry_retention.purge(
+                    db.session, telemetry_rollups.tables[resolution], rollup_cutoff,
+                    telemetry_rollups.tables[resolution].c.plant_id == plant_id,
+                    column='bucket'
+                )
+                print(f"  ✓ Plant {plant_id}: Deleted {deleted} old {resolution} rollups")
+        
+        archive_cutoff = retention_policies.cutoff(plant_id, 'archive', now)
+        if archive_cutoff is not None:
+            # One chunk per unit-day, so a plain delete stays short
+            deleted = telemetry_archive.drop_before(db.session, plant_id, archive_cutoff.date())
+            db.session.commit()
+            print(f"  ✓ Plant {plant_id}: Deleted {deleted} old archive chunks")
+    
+    for engine in database_engines():
+        freed = telemetry_retention.reclaim(engine)
+        if freed is None:
+            print(f"  ! {engine.url.database}: auto_vacuum is not INCREMENTAL, free pages are kept "
+                  f"(run 'flask --app app07 enable-incremental-vacuum' once)")
+    
+    print("Cleanup completed successfully!")
+
+@app.cli.command("apply-retention")
+def apply_retention_command():
+    """Run one retention pass now (archive, chunked deletes, reclaim free pages)"""
+    apply_retention()
+
+@app.cli.command("set-retention")
+@click.argument("plant")
+@click.argument("tier", type=click.Choice(RETENTION_TIERS))
+@click.argument("days")
+def set_retention_command(plant, tier, days):
+    """Keep TIER of PLANT (a plant id or 'all') for DAYS days ('forever' to keep it, 'default' to drop the override)"""
+    plant_id = ALL_PLANTS if plant == 'all' else int(plant)
+    if plant_id != ALL_PLANTS and plant_id not in PLANT_CONFIG:
+        raise click.BadParameter(f"Plant {plant_id} not found", param_hint="PLANT")
+    if days == 'default':
+        removed = retention_policies.clear(db.session, plant_id, tier)
+        print(f"✓ {'Removed' if removed else 'No'} {tier} override for {plant}")
+        return
+    try:
+        retention_policies.set(db.session, plant_id, tier, None if days == 'forever' else int(days))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="DAYS")
+    print(f"✓ {plant}: {tier} kept {'forever' if days == 'forever' else f'for {days} days'}")
+
+@app.cli.command("show-retention")
+def show_retention_command():
+    """Print the retention policy in force for every plant"""
+    retention_policies.load(db.session)
+    print("plant  " + "".join(f"{tier:>9}" for tier in RETENTION_TIERS))
+    for plant_id in PLANT_CONFIG:
+        policy = retention_policies.policy(plant_id)
+        print(f"{plant_id:<7}" + "".join(
+            f"{'forever' if policy[tier] is None else f'{policy[tier]}d':>9}" for tier in RETENTION_TIERS
+        ))
+
+@app.cli.command("verify-exports")
+def verify_exports_command():
+    """Check every exported day file against the SHA-256 in the export manifest"""
+    if telemetry_export is None:
+        raise click.ClickException("Telemetry export is disabled (PLANT_EXPORT=0 or in-memory database)")
+    failures = 0
+    manifest = telemetry_export.manifest()
+    for plant_id, day in sorted(manifest):
+        try:
+            telemetry_export.verify(plant_id, day)
+        except ExportIntegrityError as e:
+            failures += 1
+            print(f"  ✗ Plant {plant_id} {day}: {str(e)}")
+    print(f"{len(manifest) - failures} of {len(manifest)} exported days verified")
+    if failures:
+        raise SystemExit(1)
+
+@app.cli.command("reload-export")
+@click.argument("plant_id", type=int)
+@click.argument("day", type=click.DateTime(formats=["%Y-%m-%d"]))
+def reload_export_command(plant_id, day):
+    """Load an exported day of PLANT_ID back into raw telemetry (the next retention pass removes it again)"""
+    if telemetry_export is None:
+        raise click.ClickException("Telemetry export is disabled (PLANT_EXPORT=0 or in-memory database)")
+    day = day.date()
+    if day >= raw_history_start(plant_id).date():
+        raise click.ClickException(f"{day} is still within plant {plant_id}'s raw retention")
+    statement = plant_day_statement(plant_id, day)
+    if statement is not None and db.session.execute(statement.limit(1)).first() is not None:
+        raise click.ClickException(f"Plant {plant_id} already has raw rows for {day}")
+    try:
+        rows = telemetry_export.read_day(plant_id, day)
+        chunk = []
+        loaded = 0
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= app.config['INGEST_BACKFILL_CHUNK_ROWS']:
+                loaded += store_plant_rows({plant_id: chunk}, summarize=False)
+                chunk = []
+        if chunk:
+            loaded += store_plant_rows({plant_id: chunk}, summarize=False)
+    except ExportIntegrityError as e:
+        raise click.ClickException(str(e))
+    print(f"✓ Plant {plant_id}: Reloaded {loaded} records for {day}")
+
+@app.cli.command("enable-incremental-vacuum")
+def enable_incremental_vacuum_command():
+    """Switch existing database files to auto_vacuum=INCREMENTAL (rewrites each file with VACUUM)"""
+    for engine in database_engines():
+        started = time.time()
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.exec_driver_sql("VACUUM")
+            mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        print(f"  ✓ {engine.url.database}: auto_vacuum={mode} ({time.time() - started:.2f}s)")
+
+@app.cli.command("partition-existing-data")
+def partition_existing_data_command():
+    """Move rows from the plant tables into their daily partitions, one day per transaction"""
+    for plant_id, PlantTable in PLANT_TABLES.items():
+        table = PlantTable.__table__
+        days = db.session.execute(
+            db.select(db.func.distinct(day_expression(table.c.timestamp))).where(table.c.timestamp.isnot(None))
+        ).scalars().all()
+        db.session.commit()
+        
+        for day_text in sorted(days):
+            day = datetime.strptime(day_text, "%Y-%m-%d")
+            next_day = day + timedelta(days=1)
+            partition = telemetry_partitions.ensure(db.session, plant_id, day.date())
+            columns = [column.name for column in table.columns]
+            in_day = db.and_(table.c.timestamp >= day, table.c.timestamp < next_day)
+            
+            moved = db.session.execute(
+                partition.insert().from_select(columns, db.select(*table.c).where(in_day))
+            ).rowcount
+            db.session.execute(table.delete().where(in_day))
+            db.session.commit()
+            print(f"  ✓ {partition.name}: {moved} records")
+    
+    print("Existing data partitioned; set PLANT_PARTITIONS=1 to read and write partitions")
+
+@app.cli.command("migrate-to-unified")
+def migrate_to_unified_command():
+    """Copy the per-plant tables into fleet_telemetry (re-runnable; source tables are kept)"""
+    columns = [column.name for column in FLEET_TABLE.columns]
+    for plant_id, PlantTable in PLANT_TABLES.items():
+        table = PlantTable.__table__
+        source = db.select(*[
+            db.literal(plant_id).label('plant_id') if name == 'plant_id' else table.c[name]
+            for name in columns
+        ]).where(table.c.timestamp.isnot(None))
+        copied = db.session.execute(
+            FLEET_TABLE.insert().prefix_with('OR IGNORE').from_select(columns, source)
+        ).rowcount
+        db.session.commit()
+        print(f"  ✓ {table.name}: {copied} records copied")
+    
+    print("Migration complete; set PLANT_UNIFIED=1 to read and write fleet_telemetry")
+
+@app.cli.command("shard-existing-data")
+def shard_existing_data_command():
+    """Copy the plant tables of the main database into their shards (re-runnable; sources are kept)"""
+    if not app.config['TELEMETRY_SHARDS']:
+        print("Set PLANT_SHARDS to the shard count first")
+        raise SystemExit(1)
+
+    for plant_id, PlantTable in PLANT_TABLES.items():
+        table = PlantTable.__table__
+        with plant_engine(plant_id).connect() as connection:
+            # ATTACH is not allowed inside a transaction, so it brackets the copy
+            connection.exec_driver_sql("ATTACH DATABASE ? AS unsharded", (db.engine.url.database,))
+            try:
+                exists = connection.exec_driver_sql(
+                    "SELECT 1 FROM unsharded.sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+                ).first()
+                copied = 0
+                if exists:
+                    # Keeping the ids makes OR IGNORE skip rows copied by an earlier run
+                    copied = connection.exec_driver_sql(
+                        f"INSERT OR IGNORE INTO {table.name} SELECT * FROM unsharded.{table.name}"
+                    ).rowcount
+                    connection.commit()
+            finally:
+                connection.exec_driver_sql("DETACH DATABASE unsharded")
+        print(f"  ✓ {table.name} -> {table.schema}: {copied} records copied")
+
+    print("Existing data copied into the shards")
+
+@app.cli.command("compact-existing-data")
+def compact_existing_data_command():
+    """Rebuild REAL/DATETIME telemetry tables in the compact profile, one table per transaction"""
+    if not app.config['TELEMETRY_COMPACT']:
+        print("Set PLANT_COMPACT=1 first")
+        raise SystemExit(1)
+
+    tables = [(plant_engine(plant_id), PlantTable.__table__) for plant_id, PlantTable in PLANT_TABLES.items()]
+    for plant_id in PLANT_TABLES:
+        tables.extend(
+            (db.engine, telemetry_partitions.table(plant_id, day))
+            for day in telemetry_partitions.all_days(db.session, plant_id)
+        )
+    tables.append((db.engine, FLEET_TABLE))
+    db.session.commit()
+
+    for engine, table in tables:
+        started = time.time()
+        with engine.begin() as connection:
+            if is_compact(connection, table.name):
+                print(f"  ✓ {table.name}: already compact")
+                continue
+            converted = convert_table(connection, table)
+        print(f"  ✓ {table.name}: {converted} records converted ({time.time() - started:.2f}s)")
+
+    print("Telemetry tables use the compact profile; run VACUUM to return the freed pages")
+
+@app.cli.command("create-indexes")
+def create_indexes_command():
+    """Build missing telemetry indexes on an existing database (one index per transaction)"""
+    for plant_id, PlantTable in PLANT_TABLES.items():
+        for index in PlantTable.__table__.indexes:
+            started = time.time()
+            with plant_engine(plant_id).begin() as connection:
+                # checkfirst skips indexes that already exist, so the command is re-runnable
+                index.create(connection, checkfirst=True)
+            print(f"  ✓ {index.name} ({time.time() - started:.2f}s)")
+    
+    for engine in database_engines():
+        with engine.begin() as connection:
+            connection.exec_driver_sql("ANALYZE")
+    print("Indexes are up to date")
+
+def hot_telemetry_queries(PlantTable):
+    """The per-table queries on the dashboard, history and cleanup paths"""
+    now = datetime.utcnow()
+    return {
+        'latest record per unit': db.select(PlantTable)
+            .filter_by(unit_id=1)
+            .filter(PlantTable.timestamp >= now - timedelta(minutes=2))
+            .order_by(PlantTable.timestamp.desc())
+            .limit(1),
+        'history range': db.select(PlantTable)
+            .filter(PlantTable.timestamp >= now - timedelta(hours=7))
+            .order_by(PlantTable.timestamp.asc()),
+        'cleanup count': db.select(db.func.count()).select_from(PlantTable)
+            .filter(PlantTable.timestamp < now - timedelta(days=7)),
+        'cleanup delete': db.delete(PlantTable)
+            .where(PlantTable.timestamp < now - timedelta(days=7)),
+    }
+
+def explain_query_plan(connection, statement):
+    """Rows of SQLite's EXPLAIN QUERY PLAN for a SQLAlchemy statement"""
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in compiled.positiontup)
+    return [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), positional)]
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if any hot telemetry query scans a table or sorts without an index"""
+    failures = 0
+    with read_engine(db).connect() as connection:
+        for plant_id, PlantTable in PLANT_TABLES.items():
+            for label, statement in hot_telemetry_queries(PlantTable).items():
+                plan = explain_query_plan(connection, statement)
+                full_scan = any(step.startswith('SCAN') and 'USING' not in step for step in plan)
+                temp_sort = any('TEMP B-TREE' in step for step in plan)
+                if full_scan or temp_sort:
+                    failures += 1
+                    print(f"  ✗ {PlantTable.__tablename__} {label}: {' | '.join(plan)}")
+        
+        plan = explain_query_plan(connection, latest_fleet_statement(datetime.utcnow() - timedelta(minutes=2)))
+        if any(step.startswith('SCAN fleet_telemetry') and 'USING' not in step for step in plan):
+            failures += 1
+            print(f"  ✗ fleet_telemetry latest per unit: {' | '.join(plan)}")
+        
+        plan = explain_query_plan(connection, latest_plants_statement(datetime.utcnow() - timedelta(minutes=2)))
+        if any(step.startswith('SCAN plant_') and 'USING' not in step for step in plan):
+            failures += 1
+            print(f"  ✗ plant tables latest per unit: {' | '.join(plan)}")
+    
+    if failures:
+        print(f"{failures} hot queries do not use an index (run 'flask --app app07 create-indexes')")
+        raise SystemExit(1)
+    print("All hot telemetry queries use an index")
+
+def run_rollup_catch_up():
+    """Advance the rollup watermark and recompute minutes that received late rows"""
+    telemetry_rollups.catch_up(db.session)
+    telemetry_rollups.process_dirty(db.session)
+
+@app.cli.command("archive-telemetry")
+def archive_telemetry_command():
+    """Pack every complete day still in raw telemetry into the compressed archive"""
+    for plant_id in PLANT_CONFIG:
+        archived = archive_complete_days(plant_id)
+        print(f"  ✓ Plant {plant_id}: archived {sum(archived.values())} records from {len(archived)} days")
+    
+    stats = db.session.execute(db.select(
+        db.func.count(), db.func.sum(ARCHIVE_TABLE.c.row_count), db.func.sum(db.func.length(ARCHIVE_TABLE.c.chunk))
+    )).one()
+    chunks, readings, chunk_bytes = stats[0], stats[1] or 0, stats[2] or 0
+    print(f"Archive: {chunks} chunks, {readings} readings, {chunk_bytes} bytes "
+          f"({chunk_bytes / readings if readings else 0:.1f} bytes/reading)")
+
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute all rollups from the raw telemetry still retained"""
+    telemetry_rollups.reset(db.session)
+    watermark = telemetry_rollups.catch_up(db.session)
+    telemetry_rollups.process_dirty(db.session)
+    print(f"Rollups rebuilt up to {watermark}")
+
+# Measurement columns written for every stored unit
+MEASUREMENT_COLUMNS = (
+    'power',
+    'current_l1', 'current_l2', 'current_l3', 'current_avg',
+    'voltage_l12', 'voltage_l23', 'voltage_l13', 'voltage_avg',
+    'energy', 'runtime',
+)
+
+telemetry_archive = TelemetryArchive(plant_records_since, MEASUREMENT_COLUMNS)
+
+def telemetry_ring_path():
+    """PLANT_RING_PATH, else <database>.ring next to the SQLite file (None for in-memory databases)"""
+    if app.config['TELEMETRY_RING_PATH']:
+        return app.config['TELEMETRY_RING_PATH']
+    with app.app_context():
+        database = db.engine.url.database
+    if not database or database == ':memory:':
+        return None
+    return os.path.splitext(database)[0] + '.ring'
+
+telemetry_ring = None
+if app.config['TELEMETRY_RING'] and telemetry_ring_path():
+    telemetry_ring = TelemetryRing(
+        telemetry_ring_path(),
+        [(plant_id, unit_id) for plant_id, unit_count in PLANT_CONFIG.items() for unit_id in range(1, unit_count + 1)],
+        MEASUREMENT_COLUMNS,
+        counter_fields=('energy', 'runtime'),
+        capacity=app.config['TELEMETRY_RING_CAPACITY'],
+    )
+
+def telemetry_export_directory():
+    """PLANT_EXPORT_DIR, else telemetry_export/ next to the SQLite file (None for in-memory databases)"""
+    if app.config['TELEMETRY_EXPORT_DIR']:
+        return app.config['TELEMETRY_EXPORT_DIR']
+    with app.app_context():
+        database = db.engine.url.database
+    if not database or database == ':memory:':
+        return None
+    return os.path.join(os.path.dirname(database), 'telemetry_export')
+
+telemetry_export = None
+if app.config['TELEMETRY_EXPORT'] and telemetry_export_directory():
+    telemetry_export = TelemetryExport(telemetry_export_directory(), MEASUREMENT_COLUMNS)
+
+def plant_day_statement(plant_id, day):
+    """Statement selecting one UTC day of a plant's raw readings, oldest first (None if there are none)"""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    if app.config['TELEMETRY_UNIFIED']:
+        table = FLEET_TABLE
+        query = db.select(table).where(table.c.plant_id == plant_id)
+    elif app.config['TELEMETRY_PARTITIONING']:
+        return telemetry_partitions.select_range(db.session, plant_id, start, end)
+    else:
+        table = PLANT_TABLES[plant_id].__table__
+        query = db.select(table)
+    return query.where(table.c.timestamp >= start).where(table.c.timestamp < end).order_by(table.c.timestamp.asc())
+
+def oldest_raw_timestamp(plant_id):
+    """Timestamp of a plant's oldest raw reading, or None if it has none"""
+    if app.config['TELEMETRY_UNIFIED']:
+        return db.session.execute(
+            db.select(db.func.min(FLEET_TABLE.c.timestamp)).where(FLEET_TABLE.c.plant_id == plant_id)
+        ).scalar()
+    if app.config['TELEMETRY_PARTITIONING']:
+        days = telemetry_partitions.all_days(db.session, plant_id)
+        return datetime.combine(min(days), datetime.min.time()) if days else None
+    return db.session.execute(db.select(db.func.min(PLANT_TABLES[plant_id].timestamp))).scalar()
+
+def export_expiring_days(plant_id, cutoff):
+    """
+    Stream every day holding raw rows older than `cutoff` into the export directory. Days before
+    the cutoff's are complete, and so is the cutoff's own day (retention is days long), so each
+    file holds the whole day. A day already in the manifest is exported again, merged with its
+    file, when its rows no longer match the fingerprint recorded at export (rows backfilled or
+    replaced since), so no row is deleted unexported. Returns {day: rows exported}.
+    """
+    oldest = oldest_raw_timestamp(plant_id)
+    exported = {}
+    if oldest is None:
+        return exported
+    day = oldest.date()
+    while day <= cutoff.date():
+        statement = plant_day_statement(plant_id, day)
+        if statement is not None:
+            previous = telemetry_export.exported(plant_id, day)
+            if previous is None or plant_day_fingerprint(statement) != previous.get('source'):
+                result = db.session.execute(
+                    statement, execution_options={'yield_per': app.config['TELEMETRY_EXPORT_BATCH_ROWS']}
+                )
+                entry = telemetry_export.export_day(plant_id, day, result, merge=True)
+                if entry is not None:
+                    exported[day] = entry['rows']
+            db.session.commit()
+        day += timedelta(days=1)
+    return exported
+
+def plant_day_fingerprint(statement):
+    """source_fingerprint() of the rows a plant_day_statement() selects, reading only their keys"""
+    day_rows = statement.order_by(None).subquery()
+    keys = db.session.execute(
+        db.select(day_rows.c.unit_id, day_rows.c.timestamp),
+        execution_options={'yield_per': app.config['TELEMETRY_EXPORT_BATCH_ROWS']}
+    )
+    return source_fingerprint(keys)
+
+latest_cache = None
+if app.config['LATEST_CACHE']:
+    latest_cache = LatestReadingCache(
+        lambda: stored_latest_fleet_records(
+            datetime.utcnow() - timedelta(seconds=app.config['LATEST_CACHE_LOOKBACK_SECONDS'])
+        ),
+        MEASUREMENT_COLUMNS,
+        refresh_interval=app.config['LATEST_CACHE_REFRESH_SECONDS'],
+    )
+
+def raw_history_start(plant_id):
+    """Start of the oldest day the plant's raw retention still holds completely"""
+    oldest = retention_policies.cutoff(plant_id, 'raw', datetime.utcnow(), db.session)
+    return datetime.combine(oldest.date() + timedelta(days=1), datetime.min.time())
+
+def archive_complete_days(plant_id):
+    """Archive every complete day still in raw telemetry that is not archived yet"""
+    oldest = retention_policies.cutoff(plant_id, 'raw', datetime.utcnow(), db.session)
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    return telemetry_archive.archive_pending(db.session, plant_id, oldest.date(), yesterday)
+
+def unit_history(plant_id, unit_id, start, end, columns):
+    """
+    Readings of one unit with start <= timestamp < end as (timestamps, {column: values}):
+    decoded from the archive for days raw retention no longer holds, raw rows after that.
+    """
+    timestamps = []
+    values = {column: [] for column in columns}
+    
+    raw_start = start
+    if app.config['TELEMETRY_ARCHIVE']:
+        raw_start = max(start, raw_history_start(plant_id))
+        if start < raw_start:
+            archived = telemetry_archive.read(db.session, plant_id, start, min(end, raw_start), unit_id, columns)
+            archived_timestamps, archived_values = archived.get(unit_id, ([], {}))
+            timestamps.extend(archived_timestamps)
+            for column in columns:
+                values[column].extend(archived_values.get(column, [None] * len(archived_timestamps)))
+    
+    if raw_start < end:
+        for record in plant_records_since(plant_id, raw_start, end, unit_id=unit_id):
+            timestamps.append(record.timestamp)
+            for column in columns:
+                values[column].append(getattr(record, column))
+    
+    return timestamps, values
+
+def build_plant_rows(parsed_units, timestamp=None):
+    """
+    Validate parsed units against PLANT_CONFIG and group them into insert rows per plant.
+    Rows carry the device timestamp when one was sent, otherwise the receive time.
+    Returns {plant_id: [row_dict, ...]}; units for unknown plants/units are dropped.
+    """
+    if timestamp is None:
+        timestamp = datetime.utcnow()
+    
+    rows_by_plant = {}
+    for unit_data in parsed_units:
+        plant_id = unit_data['plant_id']
+        unit_id = unit_data['unit_id']
+        
+        # Validate plant exists in configuration
+        if plant_id not in PLANT_CONFIG:
+            continue
+            
+        # Validate unit exists for this plant
+        if unit_id < 1 or unit_id > PLANT_CONFIG[plant_id]:
+            continue
+        
+        row = {column: unit_data.get(column) for column in MEASUREMENT_COLUMNS}
+        row['unit_id'] = unit_id
+        row['timestamp'] = unit_data.get('timestamp') or timestamp
+        if unit_data.get('message_id') is not None:
+            # Checked against ingest_message and removed by store_plant_rows
+            row['message_id'] = unit_data['message_id']
+        rows_by_plant.setdefault(plant_id, []).append(row)
+    
+    return rows_by_plant
+
+dedup_window = DedupWindow(size=app.config['INGEST_DEDUP_WINDOW'], reset_gap=app.config['INGEST_DEDUP_RESET_GAP'])
+message_log = MessageLog(reset_gap=app.config['INGEST_DEDUP_RESET_GAP'])
+
+def claim_unit_messages(parsed_units):
+    """
+    Drop units whose message id was already seen for that device (retried POSTs).
+    Returns (fresh_units, duplicate_count, claimed); pass claimed to release_unit_messages
+    if storing fails, so the device's next retry is not mistaken for a replay.
+    """
+    fresh_units = []
+    claimed = []
+    duplicates = 0
+    for unit_data in parsed_units:
+        message_id = unit_data.get('message_id')
+        plant_id = unit_data['plant_id']
+        unit_id = unit_data['unit_id']
+        
+        # Only track configured units; the rest is dropped by build_plant_rows anyway
+        if message_id is None or plant_id not in PLANT_CONFIG or not 1 <= unit_id <= PLANT_CONFIG[plant_id]:
+            fresh_units.append(unit_data)
+            continue
+        
+        device_key = (plant_id, unit_id)
+        if dedup_window.claim(device_key, message_id):
+            claimed.append((device_key, message_id))
+            fresh_units.append(unit_data)
+        else:
+            duplicates += 1
+    
+    return fresh_units, duplicates, claimed
+
+def release_unit_messages(claimed):
+    for device_key, message_id in claimed:
+        dedup_window.release(device_key, message_id)
+
+def drop_stored_replays(rows_by_plant):
+    """
+    Inside the ingest transaction: record the rows' message ids in ingest_message and drop
+    the rows whose id was already stored, by any worker. Returns the rows to insert, without
+    their message_id key. The worker's DedupWindow only catches replays it saw itself.
+    """
+    messages = [
+        (plant_id, row['unit_id'], row['message_id'])
+        for plant_id, rows in rows_by_plant.items()
+        for row in rows
+        if row.get('message_id') is not None
+    ]
+    if not messages:
+        return rows_by_plant
+    
+    fresh = message_log.claim(db.session, messages, datetime.utcnow())
+    kept_by_plant = {}
+    for plant_id, rows in rows_by_plant.items():
+        kept = []
+        for row in rows:
+            message_id = row.get('message_id')
+            if message_id is not None:
+                message = (plant_id, row['unit_id'], message_id)
+                if message not in fresh:
+                    continue
+                fresh.discard(message)      # a second copy in the same batch is a replay too
+                row = {column: value for column, value in row.items() if column != 'message_id'}
+            kept.append(row)
+        if kept:
+            kept_by_plant[plant_id] = kept
+    return kept_by_plant
+
+def prune_ingest_messages():
+    """Forget stored message ids older than the dedup horizon"""
+    before = datetime.utcnow() - timedelta(hours=app.config['INGEST_DEDUP_HORIZON_HOURS'])
+    deleted = message_log.prune(db.session, before)
+    if deleted:
+        print(f"[{datetime.now()}] Pruned {deleted} ingest message ids")
+
+def unit_state_upsert_statement():
+    """
+    INSERT ... ON CONFLICT DO UPDATE for unit_state, as a text() statement with typed bind
+    parameters. The ON CONFLICT guard keeps a late (older) reading from overwriting a newer
+    one. SQLAlchemy does not cache the compiled form of SQLite's on_conflict_do_update(), so
+    used directly it is recompiled on every ingest; compiled once here, it is a cache hit.
+    """
+    statement = sqlite_insert(UNIT_STATE_TABLE)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UNIT_STATE_TABLE.c.plant_id, UNIT_STATE_TABLE.c.unit_id],
+        set_={column: statement.excluded[column] for column in ('timestamp',) + MEASUREMENT_COLUMNS},
+        where=statement.excluded.timestamp >= UNIT_STATE_TABLE.c.timestamp
+    )
+    compiled = statement.compile(
+        dialect=sqlite_dialect(paramstyle='named'),
+        column_keys=[column.name for column in UNIT_STATE_TABLE.columns],
+    )
+    return db.text(str(compiled)).bindparams(
+        *[db.bindparam(column.name, type_=column.type) for column in UNIT_STATE_TABLE.columns]
+    )
+
+UNIT_STATE_UPSERT = unit_state_upsert_statement()
+
+def stored_timestamp(value):
+    """A timestamp as the telemetry tables give it back (compact storage keeps milliseconds)"""
+    if app.config['TELEMETRY_COMPACT']:
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+def insert_fleet_rows(plant_id, rows):
+    """
+    Unified mode: INSERT OR IGNORE into fleet_telemetry, keyed on (plant_id, unit_id, timestamp),
+    and return only the rows that were inserted. A repeat of a stored reading must not move
+    unit_state, the ring or the latest cache again.
+    """
+    inserted = db.session.execute(
+        FLEET_TABLE.insert().prefix_with('OR IGNORE').returning(FLEET_TABLE.c.unit_id, FLEET_TABLE.c.timestamp),
+        [dict(row, plant_id=plant_id) for row in rows]
+    ).all()
+    
+    remaining = {tuple(key) for key in inserted}
+    stored = []
+    for row in rows:
+        key = (row['unit_id'], stored_timestamp(row['timestamp']))
+        # A key repeated within the batch was inserted once, from its first row
+        if key in remaining:
+            remaining.discard(key)
+            stored.append(row)
+    return stored
+
+def upsert_unit_state(plant_id, rows):
+    """Move unit_state to the newest of these rows for each unit, in the caller's transaction"""
+    newest = {}
+    for row in rows:
+        current = newest.get(row['unit_id'])
+        if current is None or row['timestamp'] >= current['timestamp']:
+            newest[row['unit_id']] = row
+    
+    db.session.execute(
+        UNIT_STATE_UPSERT,
+        [
+            dict({column: row.get(column) for column in MEASUREMENT_COLUMNS},
+                 plant_id=plant_id, unit_id=row['unit_id'], timestamp=row['timestamp'])
+            for row in newest.values()
+        ]
+    )
+
+def rebuild_unit_state():
+    """Fill unit_state from the retained telemetry history; returns the number of units found"""
+    found = 0
+    for plant_id in PLANT_CONFIG:
+        since = retention_policies.cutoff(plant_id, 'raw', datetime.utcnow(), db.session)
+        latest_records = search_latest_records(plant_id, since)
+        if latest_records:
+            upsert_unit_state(plant_id, [
+                dict({column: getattr(record, column) for column in MEASUREMENT_COLUMNS},
+                     unit_id=unit_id, timestamp=record.timestamp)
+                for unit_id, record in latest_records.items()
+            ])
+            found += len(latest_records)
+    db.session.commit()
+    return found
+
+@app.cli.command("rebuild-unit-state")
+def rebuild_unit_state_command():
+    """Recompute unit_state (latest reading per unit) from the telemetry history"""
+    print(f"unit_state rebuilt for {rebuild_unit_state()} units")
+
+# A fresh unit_state is seeded once, so the views do not show every unit offline after an upgrade
+if app.config['TELEMETRY_UNIT_STATE']:
+    with app.app_context():
+        if db.session.execute(db.select(db.func.count()).select_from(UNIT_STATE_TABLE)).scalar() == 0:
+            rebuild_unit_state()
+        db.session.remove()
+
+# Warm the latest-reading cache so the first dashboard poll is answered from memory
+if latest_cache is not None:
+    with app.app_context():
+        latest_cache.refresh()
+        db.session.remove()
+    print(f"✓ Latest-reading cache warmed with {latest_cache.unit_count} units")
+
+def store_plant_rows(rows_by_plant, max_retries=3, summarize=True):
+    """
+    Write all rows in one transaction: one executemany INSERT per plant table
+    and a single commit, instead of an add/commit round trip per unit.
+    Returns the stored record summaries used in the /data response, or just
+    the number of stored rows when summarize=False (bulk and queued ingest).
+    """
+    if not rows_by_plant:
+        return [] if summarize else 0
+    
+    write_started = time.monotonic()
+    for attempt in range(max_retries):
         try:
-            with app.app_context():
-                # Calculate cutoff date (7 days ago)
-                cutoff_date = datetime.utcnow() - timedelta(days=7)
+            stored_records = []
+            stored_count = 0
+            rows_to_store = drop_stored_replays(rows_by_plant)
+            # What actually went in: unified mode drops readings whose key is already stored
+            stored_rows = dict(rows_to_store)
+            for plant_id, rows in rows_to_store.items():
+                table = PLANT_TABLES[plant_id].__table__
+                if app.config['TELEMETRY_UNIFIED']:
+                    rows = insert_fleet_rows(plant_id, rows)
+                    stored_rows[plant_id] = rows
+                    if not rows:
+                        continue
+                    record_ids = [None] * len(rows)
+                elif app.config['TELEMETRY_PARTITIONING']:
+                    record_ids = telemetry_partitions.insert(db.session, plant_id, rows, returning=summarize)
+                elif summarize:
+                    record_ids = db.session.execute(
+                        table.insert().returning(table.c.id, sort_by_parameter_order=True),
+                        rows
+                    ).scalars().all()
+                else:
+                    db.session.execute(table.insert(), rows)
                 
-                print(f"[{datetime.now()}] Running cleanup for data older than {cutoff_date}")
+                if app.config['TELEMETRY_UNIT_STATE']:
+                    upsert_unit_state(plant_id, rows)
                 
-                # Delete old data from each plant table
-                for plant_id, PlantTable in PLANT_TABLES.items():
-                    # Count records to be deleted
-                    old_records = PlantTable.query.filter(
-                        PlantTable.timestamp < cutoff_date
-                    ).count()
-                    
-                    if old_records > 0:
-                        # Delete old records
-                        PlantTable.query.filter(
-                            PlantTable.timestamp < cutoff_date
-                        ).delete()
-                        
-                        db.session.commit()
-                        print(f"  ✓ Plant {plant_id}: Deleted {old_records} old records")
-                    else:
-                        print(f"  ✓ Plant {plant_id}: No old records to delete")
+                if app.config['TELEMETRY_ROLLUPS']:
+                    telemetry_rollups.mark_late(db.session, plant_id, rows)
                 
-                print("Cleanup completed successfully!")
+                if app.config['TELEMETRY_ARCHIVE']:
+                    telemetry_archive.mark_late(db.session, plant_id, rows)
                 
-        except Exception as e:
-            print(f"Error during cleanup: {str(e)}")
+                if not summarize:
+                    stored_count += len(rows)
+                    continue
+                
+                for row, record_id in zip(rows, record_ids):
+                    # Convert timestamp to Colombo timezone for response
+                    local_timestamp = utc_to_colombo(row['timestamp'])
+                    stored_records.append({
+                        "plant_id": plant_id,
+                        "unit_id": row['unit_id'],
+                        "id": record_id,
+                        "power": row['power'],
+                        "timestamp": local_timestamp.strftime("%Y-%m-%d %H:%M:%S") if local_timestamp else "Unknown"
+                    })
+            db.session.commit()
+            admission.record_write(time.monotonic() - write_started)
+            
+            if latest_cache is not None:
+                for plant_id, rows in stored_rows.items():
+                    latest_cache.update(plant_id, rows)
+            
+            if telemetry_ring is not None:
+                # Only committed rows go into the ring; the database stays the source of truth
+                for plant_id, rows in stored_rows.items():
+                    try:
+                        telemetry_ring.append_rows(plant_id, rows)
+                    except Exception as ring_error:
+                        print(f"Error appending to telemetry ring: {str(ring_error)}")
+                        # The rows are committed but not in the ring: stop it claiming to cover them
+                        try:
+                            telemetry_ring.invalidate(plant_id, rows)
+                        except Exception as invalidate_error:
+                            print(f"Error invalidating telemetry ring, serving from SQL: {str(invalidate_error)}")
+            
+            return stored_records if summarize else stored_count
+            
+        except Exception as db_error:
             db.session.rollback()
+            if attempt == max_retries - 1:
+                admission.record_write(time.monotonic() - write_started)
+                raise db_error
+            time.sleep(0.1 * (attempt + 1))
+
+def flush_ingest_batch(rows_by_plant):
+    """Flusher-thread entry point: commit one group of queued rows"""
+    with app.app_context():
+        store_plant_rows(rows_by_plant, summarize=False)
+        db.session.remove()
+
+def ingest_spill_dir():
+    """PLANT_INGEST_SPILL_DIR, else <database>.ingest-spill/ next to the SQLite file (None for in-memory databases)"""
+    if app.config['INGEST_SPILL_DIR']:
+        return app.config['INGEST_SPILL_DIR']
+    with app.app_context():
+        database = db.engine.url.database
+    if not database or database == ':memory:':
+        return None
+    return os.path.splitext(database)[0] + '.ingest-spill'
+
+ingest_queue = IngestQueue(
+    flush_ingest_batch,
+    max_rows=app.config['INGEST_QUEUE_MAX_ROWS'],
+    flush_interval=app.config['INGEST_FLUSH_INTERVAL_MS'] / 1000.0,
+    max_batch_rows=app.config['INGEST_FLUSH_MAX_ROWS'],
+    max_attempts=app.config['INGEST_FLUSH_ATTEMPTS'],
+    spill_dir=ingest_spill_dir(),
+)
+
+if app.config['INGEST_WRITE_BEHIND']:
+    ingest_queue.start()
+    # Flush queued rows on graceful shutdown (gunicorn_config.worker_exit also calls this)
+    atexit.register(ingest_queue.stop)
+
+def job_lock_path():
+    """PLANT_JOBS_LOCK_PATH, else <database>.scheduler.lock next to the SQLite file (None for in-memory databases)"""
+    if app.config['BACKGROUND_JOBS_LOCK_PATH']:
+        return app.config['BACKGROUND_JOBS_LOCK_PATH']
+    with app.app_context():
+        database = db.engine.url.database
+    if not database or database == ':memory:':
+        return None
+    return os.path.splitext(database)[0] + '.scheduler.lock'
+
+job_scheduler = JobScheduler(
+    app,
+    lock_path=job_lock_path(),
+    timezone=colombo_tz,
+    poll_interval=app.config['BACKGROUND_JOBS_POLL_SECONDS'],
+)
+job_scheduler.add('retention', app.config['JOB_SCHEDULES']['retention'], apply_retention)
+if app.config['TELEMETRY_ROLLUPS']:
+    job_scheduler.add('rollups', app.config['JOB_SCHEDULES']['rollups'], run_rollup_catch_up)
+job_scheduler.add('ingest-messages', app.config['JOB_SCHEDULES']['ingest-messages'], prune_ingest_messages)
+
+def start_background_jobs():
+    """Join the job scheduler election; called once per serving worker (gunicorn post_worker_init)"""
+    if not app.config['BACKGROUND_JOBS']:
+        return
+    job_scheduler.start()
+    print(f"✓ Job scheduler started ({', '.join(job_scheduler.jobs)}; lock {job_scheduler.lock_path})")
+
+admission = AdmissionController(
+    rate=app.config['INGEST_DEVICE_RATE'],
+    burst=app.config['INGEST_DEVICE_BURST'],
+    max_write_latency=app.config['INGEST_MAX_WRITE_LATENCY_MS'] / 1000.0,
+)
+
+def too_many_requests(message, retry_after):
+    response = jsonify({"status": "error", "message": message})
+    response.status_code = 429
+    response.headers['Retry-After'] = retry_after_header(retry_after)
+    return response
+
+# Global admission decorator for ingest endpoints
+def ingest_admission(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if app.config['INGEST_WRITE_BEHIND']:
+            pending_rows = ingest_queue.pending_rows
+            if pending_rows >= app.config['INGEST_QUEUE_HIGH_WATER'] * ingest_queue.max_rows:
+                admission.record_overload()
+                # Rough drain estimate: one flush interval per full batch queued
+                drain_seconds = pending_rows / ingest_queue.max_batch_rows * ingest_queue.flush_interval
+                return too_many_requests("Ingest queue is near capacity, retry later", drain_seconds)
+        
+        # Writes slowed by lock contention from the other workers (or a long backfill)
+        retry_after = admission.check_writer()
+        if retry_after:
+            return too_many_requests("Database writer is backed up, retry later", retry_after)
         
-        # Wait 24 hours before next cleanup
-        time.sleep(24 * 60 * 60)  # 86400 seconds = 24 hours
+        return f(*args, **kwargs)
+    return decorated_function
 
-# Start cleanup thread when app starts
-def start_cleanup_thread():
-    cleanup_thread = threading.Thread(target=cleanup_old_data, daemon=True)
-    cleanup_thread.start()
-    print("✓ Auto-cleanup thread started (runs every 24 hours)")
+def admit_units(parsed_units):
+    """
+    Apply the per-device token buckets to a request, all or nothing: each device pays one
+    token per reading. Returns 0 if the request is admitted, else the Retry-After seconds
+    for a 429. Rejecting the whole request (rather than dropping the over-rate units and
+    answering 200) makes the device resend every reading after the wait.
+    """
+    costs = {}
+    for unit_data in parsed_units:
+        plant_id = unit_data['plant_id']
+        unit_id = unit_data['unit_id']
+        
+        # Unknown units are dropped by build_plant_rows; don't create buckets for them
+        if plant_id not in PLANT_CONFIG or not 1 <= unit_id <= PLANT_CONFIG[plant_id]:
+            continue
+        costs[(plant_id, unit_id)] = costs.get((plant_id, unit_id), 0) + 1
+    
+    allowed, retry_after = admission.try_acquire_all(costs)
+    return 0 if allowed else retry_after
+
+def request_body_stream():
+    """Request body as a stream, inflated on the fly when Content-Encoding is gzip/deflate"""
+    return decoding_stream(
+        request.stream,
+        request.headers.get('Content-Encoding'),
+        app.config['INGEST_MAX_DECOMPRESSED_BYTES']
+    )
+
+def get_ingest_json():
+    """JSON body of an ingest request, decompressing it first if needed"""
+    if not request.headers.get('Content-Encoding'):
+        return request.json
+    try:
+        return json.load(request_body_stream())
+    except ValueError:
+        raise InvalidCompressedBody("Compressed request body is not valid JSON")
+
+def wants_lean_ack():
+    """
+    Lean acknowledgement: ?ack=lean returns only the stored count, and
+    'Prefer: return=minimal' returns 204 with no body. Devices never read the records list.
+    """
+    return request.args.get('ack') == 'lean' or 'return=minimal' in request.headers.get('Prefer', '')
+
+def lean_ack(stored_count, queued=False):
+    """
+    Fixed-shape acknowledgement, built without jsonify or per-record work.
+    queued=True acknowledges rows handed to the write-behind queue: 202 instead of 200/204.
+    """
+    if 'return=minimal' in request.headers.get('Prefer', ''):
+        return app.response_class(status=202 if queued else 204, headers={'Preference-Applied': 'return=minimal'})
+    if queued:
+        return app.response_class('{"status":"success","queued_records":%d}' % stored_count,
+                                  status=202, mimetype='application/json')
+    return app.response_class(
+        '{"status":"success","stored_records":%d}' % stored_count,
+        mimetype='application/json'
+    )
 
 # API endpoint for ESP32 data submission (No authentication required for IoT devices)
 @app.route("/data", methods=["POST"])
+@ingest_admission
 def receive_data():
+    claimed = []
     try:
-        data = request.json
+        data = get_ingest_json()
         if not data:
             return jsonify({"status": "error", "message": "No JSON data provided"}), 400
         
@@ -251,65 +1746,39 @@ def receive_data():
         
         if not parsed_units:
             return jsonify({"status": "error", "message": "No valid unit data found in request"}), 400
+        drop_implausible_timestamps(parsed_units)
         
-        stored_records = []
+        # Per-device rate limit
+        retry_after = admit_units(parsed_units)
+        if retry_after:
+            return too_many_requests("Device rate limit exceeded, resend the whole request", retry_after)
         
-        # Process each unit's data
-        for unit_data in parsed_units:
-            plant_id = unit_data['plant_id']
-            unit_id = unit_data['unit_id']
-            
-            # Validate plant exists in configuration
-            if plant_id not in PLANT_CONFIG:
-                continue
-                
-            # Validate unit exists for this plant
-            if unit_id < 1 or unit_id > PLANT_CONFIG[plant_id]:
-                continue
-            
-            # Get the appropriate table for this plant
-            PlantTable = PLANT_TABLES[plant_id]
-            
-            # Create new record with all available data
-            new_data = PlantTable(
-                unit_id=unit_id,
-                power=unit_data.get('power'),
-                current_l1=unit_data.get('current_l1'),
-                current_l2=unit_data.get('current_l2'),
-                current_l3=unit_data.get('current_l3'),
-                current_avg=unit_data.get('current_avg'),
-                voltage_l12=unit_data.get('voltage_l12'),
-                voltage_l23=unit_data.get('voltage_l23'),
-                voltage_l13=unit_data.get('voltage_l13'),
-                voltage_avg=unit_data.get('voltage_avg'),
-                energy=unit_data.get('energy'),
-                runtime=unit_data.get('runtime')
-            )
-            
-            # Store data with retry mechanism
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    db.session.add(new_data)
-                    db.session.commit()
-                    
-                    # Convert timestamp to Colombo timezone for response
-                    local_timestamp = utc_to_colombo(new_data.timestamp)
-                    
-                    stored_records.append({
-                        "plant_id": plant_id,
-                        "unit_id": unit_id,
-                        "id": new_data.id,
-                        "power": unit_data.get('power'),
-                        "timestamp": local_timestamp.strftime("%Y-%m-%d %H:%M:%S") if local_timestamp else "Unknown"
-                    })
-                    break
-                    
-                except Exception as db_error:
-                    db.session.rollback()
-                    if attempt == max_retries - 1:
-                        raise db_error
-                    time.sleep(0.1 * (attempt + 1))
+        # Drop replays of readings already stored (device retried after a timeout/5xx)
+        parsed_units, duplicates, claimed = claim_unit_messages(parsed_units)
+        if not parsed_units:
+            return jsonify({"status": "success", "stored_records": 0, "duplicate_records": duplicates})
+        
+        rows_by_plant = build_plant_rows(parsed_units)
+        if not rows_by_plant:
+            return jsonify({"status": "error", "message": "No valid data could be stored"}), 400
+        
+        if app.config['INGEST_WRITE_BEHIND']:
+            # Queue for the flusher thread and acknowledge immediately
+            try:
+                queued = ingest_queue.put(rows_by_plant)
+            except IngestQueueFull as e:
+                release_unit_messages(claimed)
+                return jsonify({"status": "error", "message": str(e)}), 503
+            if wants_lean_ack():
+                return lean_ack(queued, queued=True)
+            return jsonify({"status": "success", "queued_records": queued}), 202
+        
+        # Store all units of this request in a single transaction. Rows another worker
+        # already stored (a retry that went elsewhere) are dropped by store_plant_rows.
+        if wants_lean_ack():
+            return lean_ack(store_plant_rows(rows_by_plant, summarize=False))
+        
+        stored_records = store_plant_rows(rows_by_plant)
         
         if stored_records:
             return jsonify({
@@ -317,14 +1786,307 @@ def receive_data():
                 "stored_records": len(stored_records),
                 "records": stored_records
             })
-        else:
-            return jsonify({"status": "error", "message": "No valid data could be stored"}), 400
-                
+        row_count = sum(len(rows) for rows in rows_by_plant.values())
+        return jsonify({"status": "success", "stored_records": 0, "duplicate_records": duplicates + row_count})
+    
+    except ContentEncodingError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
     except Exception as e:
         db.session.rollback()
+        release_unit_messages(claimed)
         print(f"Error in receive_data: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def iter_ndjson(stream, max_line_bytes):
+    """
+    Yield (line_no, object, error) for each non-empty line of a newline-delimited
+    JSON stream. Reads one line at a time so memory does not grow with the body.
+    """
+    line_no = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            break
+        line_no += 1
+        
+        if len(line) > max_line_bytes and not line.endswith(b"\n"):
+            # Oversized line: skip the rest of it
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_line_bytes)
+            yield line_no, None, "line too long"
+            continue
+        
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield line_no, None, "invalid JSON"
+            continue
+        if not isinstance(obj, dict):
+            yield line_no, None, "not a JSON object"
+            continue
+        yield line_no, obj, None
+
+def store_or_queue_rows(rows_by_plant):
+    """Store rows without per-record summaries, through the write-behind queue when enabled"""
+    if app.config['INGEST_WRITE_BEHIND']:
+        return ingest_queue.put(rows_by_plant)
+    return store_plant_rows(rows_by_plant, summarize=False)
+
+# Callbacks run after a backfill with {plant_id: (earliest, latest)} of the rows it
+# inserted, so derived data is recomputed only for the affected time ranges
+BACKFILL_HANDLERS = []
+
+def on_backfill(handler):
+    """Register a backfill handler (usable as a decorator)"""
+    BACKFILL_HANDLERS.append(handler)
+    return handler
+
+def run_backfill_handlers(affected_ranges):
+    for handler in BACKFILL_HANDLERS:
+        try:
+            handler(affected_ranges)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error in backfill handler {handler.__name__}: {str(e)}")
+
+@on_backfill
+def refresh_backfilled_rollups(affected_ranges):
+    # Backfilled rows were marked dirty on insert; roll them up before responding
+    if app.config['TELEMETRY_ROLLUPS']:
+        telemetry_rollups.process_dirty(db.session)
+
+@on_backfill
+def rearchive_backfilled_days(affected_ranges):
+    # Backfilled rows marked their days late on insert; merge them into archived days now
+    if app.config['TELEMETRY_ARCHIVE']:
+        telemetry_archive.process_dirty(db.session)
+
+def store_backfill_rows(rows_by_plant, affected_ranges):
+    """
+    Insert a chunk of historical rows directly (bypassing the write-behind queue),
+    ordered by (unit_id, timestamp) for index locality, and widen affected_ranges.
+    """
+    for plant_id, rows in rows_by_plant.items():
+        rows.sort(key=lambda row: (row['unit_id'], row['timestamp']))
+        earliest = min(row['timestamp'] for row in rows)
+        latest = max(row['timestamp'] for row in rows)
+        if plant_id in affected_ranges:
+            earliest = min(earliest, affected_ranges[plant_id][0])
+            latest = max(latest, affected_ranges[plant_id][1])
+        affected_ranges[plant_id] = (earliest, latest)
+    
+    return store_plant_rows(rows_by_plant, summarize=False)
+
+# Streaming bulk ingestion for gateways: one ESP32-style JSON object per line.
+# ?mode=backfill is for store-and-forward history: every line must carry a device
+# timestamp, rows are inserted in large sorted chunks and backfill handlers run afterwards.
+@app.route("/data/bulk", methods=["POST"])
+@ingest_admission
+def receive_bulk_data():
+    backfill = request.args.get('mode') == 'backfill'
+    chunk_rows = app.config['INGEST_BACKFILL_CHUNK_ROWS' if backfill else 'INGEST_BULK_CHUNK_ROWS']
+    store_chunk = store_or_queue_rows
+    if backfill:
+        store_chunk = lambda chunk: store_backfill_rows(chunk, affected_ranges)
+    max_errors = 50
+    # No per-device buckets here: passing the global checks is the whole admission
+    admission.record_admitted()
+    
+    # One character per non-empty line: 'A' accepted (stored or queued), 'R' rejected (bad
+    # line, don't resend), 'T' not stored because its chunk failed (resend). A line is only
+    # marked 'A' once its chunk is stored; lines after a failure are not listed at all.
+    line_results = []
+    errors = []
+    accepted_lines = 0
+    stored_rows = 0
+    affected_ranges = {}
+    
+    chunk = {}
+    chunk_count = 0
+    chunk_claims = []
+    chunk_lines = []    # indexes into line_results of the lines in the unstored chunk
+    duplicates = 0
+    
+    def mark_chunk_accepted():
+        for index in chunk_lines:
+            line_results[index] = 'A'
+        chunk_lines.clear()
+    
+    try:
+        for line_no, obj, error in iter_ndjson(request_body_stream(), app.config['INGEST_BULK_MAX_LINE_BYTES']):
+            if error is None:
+                parsed_units = parse_esp32_data(obj)
+                if backfill and any('timestamp' not in unit_data for unit_data in parsed_units):
+                    error = "missing or invalid timestamp"
+                else:
+                    parsed_units, line_duplicates, claimed = claim_unit_messages(parsed_units)
+                    duplicates += line_duplicates
+                    chunk_claims.extend(claimed)
+                    rows_by_plant = build_plant_rows(parsed_units)
+                    if not rows_by_plant and not line_duplicates:
+                        error = "no valid unit data"
+            
+            if error is not None:
+                line_results.append('R')
+                if len(errors) < max_errors:
+                    errors.append([line_no, error])
+                continue
+            
+            accepted_lines += 1
+            if not rows_by_plant:
+                # Only replays of stored readings: nothing left to store
+                line_results.append('A')
+                continue
+            chunk_lines.append(len(line_results))
+            line_results.append('T')
+            for plant_id, rows in rows_by_plant.items():
+                chunk.setdefault(plant_id, []).extend(rows)
+                chunk_count += len(rows)
+            
+            if chunk_count >= chunk_rows:
+                stored_rows += store_chunk(chunk)
+                mark_chunk_accepted()
+                chunk = {}
+                chunk_count = 0
+                chunk_claims = []
+        
+        if chunk_count:
+            stored_rows += store_chunk(chunk)
+            mark_chunk_accepted()
+        chunk_claims = []
+    
+    except IngestQueueFull as e:
+        release_unit_messages(chunk_claims)
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "stored_records": stored_rows,
+            "lines": "".join(line_results)
+        }), 503
+    except ContentEncodingError as e:
+        release_unit_messages(chunk_claims)
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "stored_records": stored_rows,
+            "lines": "".join(line_results)
+        }), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        release_unit_messages(chunk_claims)
+        print(f"Error in receive_bulk_data: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "stored_records": stored_rows,
+            "lines": "".join(line_results)
+        }), 500
+    finally:
+        # Committed chunks stay committed, so recompute for them even if a later chunk failed
+        if affected_ranges:
+            run_backfill_handlers(affected_ranges)
+    
+    if not line_results:
+        return jsonify({"status": "error", "message": "No NDJSON lines provided"}), 400
+    
+    return jsonify({
+        "status": "success" if accepted_lines else "error",
+        "accepted": accepted_lines,
+        "rejected": len(line_results) - accepted_lines,
+        "stored_records": stored_rows,
+        "duplicate_records": duplicates,
+        "lines": "".join(line_results),
+        "errors": errors
+    }), 200 if accepted_lines else 400
+
+# Compact binary ingestion (see telemetry_binary.py for the record layout)
+@app.route("/data/bin", methods=["POST"])
+@ingest_admission
+def receive_binary_data():
+    try:
+        if request.headers.get('Content-Encoding'):
+            body = request_body_stream().read()
+        else:
+            body = request.get_data(cache=False)
+        parsed_units = decode_batch(body)
+    except ContentEncodingError as e:
+        return jsonify({"status": "error", "message": str(e)}), e.status_code
+    except BinaryFormatError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    drop_implausible_timestamps(parsed_units)
+    
+    try:
+        # Per-device rate limit
+        retry_after = admit_units(parsed_units)
+        if retry_after:
+            return too_many_requests("Device rate limit exceeded, resend the whole request", retry_after)
+        
+        calculate_unit_averages(parsed_units)
+        rows_by_plant = build_plant_rows(parsed_units)
+        if not rows_by_plant:
+            return jsonify({"status": "error", "message": "No valid unit data found in request"}), 400
+        
+        stored = store_or_queue_rows(rows_by_plant)
+        return jsonify({"status": "success", "stored_records": stored})
+    
+    except IngestQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in receive_binary_data: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# Ingest counters for capacity planning (Login Required)
+@app.route("/api/ingest/stats")
+@login_required
+def get_ingest_stats():
+    return jsonify({
+        'admission': admission.stats(),
+        'write_behind': {
+            'enabled': app.config['INGEST_WRITE_BEHIND'],
+            'pending_rows': ingest_queue.pending_rows,
+            'flushed_rows': ingest_queue.flushed_rows,
+            'flushed_batches': ingest_queue.flushed_batches,
+            'retried_batches': ingest_queue.retried_batches,
+            'spilled_rows': ingest_queue.spilled_rows,
+            'replayed_rows': ingest_queue.replayed_rows,
+            'failed_rows': ingest_queue.failed_rows,
+        },
+        'duplicates_dropped': dedup_window.duplicates + message_log.duplicates,
+        'sequence_resets': message_log.resets,
+        'latest_cache': {
+            'enabled': latest_cache is not None,
+            'units': latest_cache.unit_count if latest_cache is not None else 0,
+            'reads': latest_cache.reads if latest_cache is not None else 0,
+            'refreshes': latest_cache.refreshes if latest_cache is not None else 0,
+            'refresh_errors': latest_cache.refresh_errors if latest_cache is not None else 0,
+        },
+        'timestamp': get_colombo_time().strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+@app.route("/api/jobs")
+@login_required
+def get_job_status():
+    try:
+        jobs = job_scheduler.status()
+        for job in jobs:
+            for key in ('last_started', 'last_finished', 'next_run'):
+                local_time = utc_to_colombo(job[key])
+                job[key] = local_time.strftime("%Y-%m-%d %H:%M:%S") if local_time else None
+        return jsonify({
+            'worker': job_scheduler.worker,
+            'running': app.config['BACKGROUND_JOBS'],
+            'is_leader': job_scheduler.is_leader,
+            'jobs': jobs,
+            'timestamp': get_colombo_time().strftime("%Y-%m-%d %H:%M:%S")
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 # Master Dashboard - Main page (Login Required)
 @app.route("/")
 @login_required
@@ -333,6 +2095,9 @@ def master_dashboard():
         # Get latest data from all plants (within last 2 minutes for online check)
         time_limit = datetime.utcnow() - timedelta(minutes=2)
         
+        # One lookup for the whole fleet instead of a query per unit
+        latest_records = latest_fleet_records(time_limit)
+        
         plant_data = {}
         total_power = 0
         total_running_units = 0  # Changed from total_online_units
@@ -341,8 +2106,6 @@ def master_dashboard():
         active_plants = 0
         
         for plant_id, unit_count in PLANT_CONFIG.items():
-            PlantTable = PLANT_TABLES[plant_id]
-            
             # Get latest data for each unit in this plant
             units_data = []
             plant_power = 0
@@ -351,10 +2114,7 @@ def master_dashboard():
             plant_offline_units = 0  # NEW
             
             for unit_id in range(1, unit_count + 1):
-                latest_record = PlantTable.query.filter_by(unit_id=unit_id)\
-                                               .filter(PlantTable.timestamp >= time_limit)\
-                                               .order_by(PlantTable.timestamp.desc())\
-                                               .first()
+                latest_record = latest_records.get((plant_id, unit_id))
                 
                 if latest_record:
                     local_timestamp = utc_to_colombo(latest_record.timestamp)
@@ -454,6 +2214,9 @@ def get_master_live_data():
     try:
         time_limit = datetime.utcnow() - timedelta(minutes=2)
         
+        # One lookup for the whole fleet instead of a query per unit
+        latest_records = latest_fleet_records(time_limit)
+        
         plant_data = {}
         total_power = 0
         total_running_units = 0
@@ -462,8 +2225,6 @@ def get_master_live_data():
         active_plants = 0
         
         for plant_id, unit_count in PLANT_CONFIG.items():
-            PlantTable = PLANT_TABLES[plant_id]
-            
             units_data = []
             plant_power = 0
             plant_running_units = 0
@@ -471,10 +2232,7 @@ def get_master_live_data():
             plant_offline_units = 0
             
             for unit_id in range(1, unit_count + 1):
-                latest_record = PlantTable.query.filter_by(unit_id=unit_id)\
-                                               .filter(PlantTable.timestamp >= time_limit)\
-                                               .order_by(PlantTable.timestamp.desc())\
-                                               .first()
+                latest_record = latest_records.get((plant_id, unit_id))
                 
                 if latest_record:
                     local_timestamp = utc_to_colombo(latest_record.timestamp)
@@ -579,34 +2337,37 @@ def get_plant_history(plant_id):
         if plant_id not in PLANT_CONFIG:
             return jsonify({"error": f"Plant {plant_id} not found"}), 404
             
-        PlantTable = PLANT_TABLES[plant_id]
-        
         # Get last 5 hours of data
         time_limit = datetime.utcnow() - timedelta(hours=7)
         current_time = datetime.utcnow()
-        records = PlantTable.query.filter(PlantTable.timestamp >= time_limit)\
-                                 .order_by(PlantTable.timestamp.asc()).all()
         
         # Group by 5-minute intervals
         time_groups = {}
-        for record in records:
-            local_timestamp = utc_to_colombo(record.timestamp)
-            if local_timestamp is None:
-                continue
+        if app.config['TELEMETRY_ROLLUPS']:
+            # Last power reading of each unit per minute, from the 1m rollups
+            for rollup in telemetry_rollups.series(db.session, plant_id, '1m', time_limit, current_time):
+                time_key = utc_to_colombo(rollup['bucket']).replace(tzinfo=None)
+                time_groups.setdefault(time_key, {})[rollup['unit_id']] = rollup['power_last'] or 0
+        else:
+            records = recent_plant_records(plant_id, time_limit)
+            for record in records:
+                local_timestamp = utc_to_colombo(record.timestamp)
+                if local_timestamp is None:
+                    continue
+                    
+                # Round to nearest 5-minute interval
+                time_key = local_timestamp.replace(second=0, microsecond=0, tzinfo=None)
+                minute = time_key.minute
+                time_key = time_key.replace(minute=minute - (minute % 1))
                 
-            # Round to nearest 5-minute interval
-            time_key = local_timestamp.replace(second=0, microsecond=0, tzinfo=None)
-            minute = time_key.minute
-            time_key = time_key.replace(minute=minute - (minute % 1))
-            
-            if time_key not in time_groups:
-                time_groups[time_key] = {}
-            
-            unit_id = record.unit_id
-            if unit_id not in time_groups[time_key]:
-                time_groups[time_key][unit_id] = record.power or 0
-            else:
-                time_groups[time_key][unit_id] = record.power or 0
+                if time_key not in time_groups:
+                    time_groups[time_key] = {}
+                
+                unit_id = record.unit_id
+                if unit_id not in time_groups[time_key]:
+                    time_groups[time_key][unit_id] = record.power or 0
+                else:
+                    time_groups[time_key][unit_id] = record.power or 0
                 
          # Fill ALL time intervals (including missing ones)
         local_time_limit = utc_to_colombo(time_limit)
@@ -650,6 +2411,59 @@ def get_plant_history(plant_id):
         return jsonify({"error": str(e)}), 500
     
 
+# API for a unit's readings over any range, including days only the archive still holds
+# ?start=&end= are ISO-8601 (naive = UTC) or epoch seconds; ?fields=power,energy,...
+@app.route("/api/plant/<int:plant_id>/unit/<int:unit_id>/history")
+@login_required
+def get_unit_history(plant_id, unit_id):
+    try:
+        if plant_id not in PLANT_CONFIG or not 1 <= unit_id <= PLANT_CONFIG[plant_id]:
+            return jsonify({"error": f"Unit {unit_id} of plant {plant_id} not found"}), 404
+        
+        end = datetime.utcnow()
+        start = end - timedelta(days=1)
+        try:
+            for name in ('start', 'end'):
+                value = request.args.get(name)
+                if value is None:
+                    continue
+                if value.replace('.', '', 1).isdigit():
+                    parsed = datetime.utcfromtimestamp(float(value))
+                else:
+                    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+                    if parsed.tzinfo is not None:
+                        parsed = parsed.astimezone(pytz.utc).replace(tzinfo=None)
+                if name == 'start':
+                    start = parsed
+                else:
+                    end = parsed
+        except (ValueError, OverflowError, OSError):
+            return jsonify({"error": "start and end must be ISO-8601 or epoch seconds"}), 400
+        
+        if end <= start:
+            return jsonify({"error": "end must be after start"}), 400
+        if end - start > timedelta(days=app.config['HISTORY_MAX_DAYS']):
+            return jsonify({"error": f"Range is limited to {app.config['HISTORY_MAX_DAYS']} days"}), 400
+        
+        fields = request.args.get('fields', 'power').split(',')
+        unknown = [field for field in fields if field not in MEASUREMENT_COLUMNS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+        
+        timestamps, values = unit_history(plant_id, unit_id, start, end, fields)
+        
+        response = {
+            'plant_id': plant_id,
+            'unit_id': unit_id,
+            'timestamps': [utc_to_colombo(timestamp).strftime("%Y-%m-%d %H:%M:%S") for timestamp in timestamps],
+        }
+        response.update(values)
+        return jsonify(response)
+        
+    except Exception as e:
+        print(f"Error in get_unit_history: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 # Plant Detail Page (Login Required)
 @app.route("/plant/<int:plant_id>")
 @login_required
@@ -658,9 +2472,9 @@ def plant_detail_page(plant_id):
         if plant_id not in PLANT_CONFIG:
             return render_template("error.html", error=f"Plant {plant_id} not found"), 404
             
-        PlantTable = PLANT_TABLES[plant_id]
         time_limit = datetime.utcnow() - timedelta(minutes=2)
         unit_count = PLANT_CONFIG[plant_id]
+        latest_records = latest_plant_records(plant_id, time_limit)
         
         units_data = []
         plant_power = 0
@@ -669,10 +2483,7 @@ def plant_detail_page(plant_id):
         offline_units = 0
         
         for unit_id in range(1, unit_count + 1):
-            latest_record = PlantTable.query.filter_by(unit_id=unit_id)\
-                                           .filter(PlantTable.timestamp >= time_limit)\
-                                           .order_by(PlantTable.timestamp.desc())\
-                                           .first()
+            latest_record = latest_records.get(unit_id)
             
             if latest_record:
                 local_timestamp = utc_to_colombo(latest_record.timestamp)
@@ -765,34 +2576,18 @@ def get_plant_details(plant_id):
         if plant_id not in PLANT_CONFIG:
             return jsonify({"error": f"Plant {plant_id} not found"}), 404
             
-        PlantTable = PLANT_TABLES[plant_id]
         time_limit = datetime.utcnow() - timedelta(minutes=2)
         unit_count = PLANT_CONFIG[plant_id]
+        latest_records = latest_plant_records(plant_id, time_limit)
         
         units_data = []
         plant_power = 0
-        online_units = 0
-        
-        for unit_id in range(1, unit_count + 1):
-            latest_record = PlantTable.query.filter_by(unit_id=unit_id)\
-                                           .filter(PlantTable.timestamp >= time_limit)\
-                                           .order_by(PlantTable.timestamp.desc())\
-                                           .first()
-            
-            if latest_record:
-                local_timestamp = utc_to_colombo(latest_record.timestamp)
-                
-                units_data = []
-        plant_power = 0
         running_units = 0
         standby_units = 0
         offline_units = 0
         
         for unit_id in range(1, unit_count + 1):
-            latest_record = PlantTable.query.filter_by(unit_id=unit_id)\
-                                           .filter(PlantTable.timestamp >= time_limit)\
-                                           .order_by(PlantTable.timestamp.desc())\
-                                           .first()
+            latest_record = latest_records.get(unit_id)
             
             if latest_record:
                 local_timestamp = utc_to_colombo(latest_record.timestamp)
@@ -0,0 +1,216 @@
+"""
+Compressed cold-storage tier for plant telemetry.
+
+Each unit-day is packed into one Gorilla chunk (see gorilla.py) and stored as a BLOB
+in telemetry_archive, one row per (plant_id, unit_id, day). That is roughly one
+row and a few kilobytes per unit per day, instead of thousands of raw rows, so years
+of history stay affordable after the raw rows have been deleted by retention.
+
+Timestamps are kept to the millisecond. Raw telemetry is read through the `read_raw`
+callable, so this module does not depend on the storage layout.
+
+A day can gain rows after it was archived (late readings, backfills). Ingest marks the
+days of rows older than today with mark_late(), and process_dirty() rebuilds the marked
+days that are archived. A rebuild merges raw telemetry into the readings already in the
+chunks, so rebuilding a day that raw retention has deleted keeps its history.
+"""
+
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extension import db
+from gorilla import encode_chunk, decode_chunk
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MS = timedelta(milliseconds=1)
+
+ARCHIVE_TABLE = db.Table(
+    'telemetry_archive',
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('plant_id', sa.Integer, nullable=False),
+    sa.Column('unit_id', sa.Integer, nullable=False),
+    sa.Column('day', sa.Date, nullable=False),
+    sa.Column('row_count', sa.Integer, nullable=False),
+    sa.Column('first_timestamp', sa.DateTime, nullable=False),
+    sa.Column('last_timestamp', sa.DateTime, nullable=False),
+    sa.Column('chunk', sa.LargeBinary, nullable=False),
+    sa.Index('ix_telemetry_archive_plant_day_unit', 'plant_id', 'day', 'unit_id', unique=True),
+)
+
+# Days that received rows after (or while) they were archived
+ARCHIVE_DIRTY_TABLE = db.Table(
+    'telemetry_archive_dirty',
+    sa.Column('plant_id', sa.Integer, primary_key=True),
+    sa.Column('day', sa.Date, primary_key=True),
+    sqlite_with_rowid=False,
+)
+
+
+def to_epoch_ms(timestamp):
+    return (timestamp - EPOCH) // ONE_MS
+
+
+def from_epoch_ms(milliseconds):
+    return EPOCH + milliseconds * ONE_MS
+
+
+def day_bounds(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+class TelemetryArchive:
+    def __init__(self, read_raw, columns):
+        """
+        read_raw  -- (plant_id, start, end) -> raw readings with start <= timestamp < end, oldest first
+        columns   -- measurement columns packed into each chunk
+        """
+        self.read_raw = read_raw
+        self.columns = tuple(columns)
+
+    # Writes -------------------------------------------------------------------------
+
+    def archive_day(self, session, plant_id, day):
+        """
+        (Re)build the chunks of every unit of a plant for one UTC day: the readings already
+        archived merged with raw telemetry, a reading in both (same unit and millisecond)
+        taken from raw. Returns the number of readings archived. Does not commit.
+        """
+        start, end = day_bounds(day)
+        by_unit = {}    # unit_id -> {epoch ms: (value per column)}
+        for unit_id, chunk in session.execute(
+            sa.select(ARCHIVE_TABLE.c.unit_id, ARCHIVE_TABLE.c.chunk)
+            .where(ARCHIVE_TABLE.c.plant_id == plant_id)
+            .where(ARCHIVE_TABLE.c.day == day)
+        ):
+            timestamps, values = decode_chunk(chunk, self.columns)
+            column_values = [values.get(column, [None] * len(timestamps)) for column in self.columns]
+            by_unit[unit_id] = {
+                timestamp: tuple(column[i] for column in column_values)
+                for i, timestamp in enumerate(timestamps)
+            }
+        for reading in self.read_raw(plant_id, start, end):
+            by_unit.setdefault(reading.unit_id, {})[to_epoch_ms(reading.timestamp)] = tuple(
+                getattr(reading, column) for column in self.columns
+            )
+
+        session.execute(
+            ARCHIVE_TABLE.delete()
+            .where(ARCHIVE_TABLE.c.plant_id == plant_id)
+            .where(ARCHIVE_TABLE.c.day == day)
+        )
+        if not by_unit:
+            return 0
+
+        rows = []
+        for unit_id, readings in sorted(by_unit.items()):
+            timestamps = sorted(readings)
+            chunk = encode_chunk(
+                timestamps,
+                {column: [readings[timestamp][i] for timestamp in timestamps] for i, column in enumerate(self.columns)}
+            )
+            rows.append({
+                'plant_id': plant_id,
+                'unit_id': unit_id,
+                'day': day,
+                'row_count': len(timestamps),
+                'first_timestamp': from_epoch_ms(timestamps[0]),
+                'last_timestamp': from_epoch_ms(timestamps[-1]),
+                'chunk': chunk,
+            })
+        session.execute(ARCHIVE_TABLE.insert(), rows)
+        return sum(row['row_count'] for row in rows)
+
+    def mark_late(self, session, plant_id, rows, now=None):
+        """
+        Ingest hook: record the days of rows older than today (UTC), which may already be
+        archived. Live readings cost one comparison each.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        today = datetime.combine(now.date(), datetime.min.time())
+        days = {row['timestamp'].date() for row in rows if row['timestamp'] < today}
+        if days:
+            session.execute(
+                sqlite_insert(ARCHIVE_DIRTY_TABLE).on_conflict_do_nothing(),
+                [{'plant_id': plant_id, 'day': day} for day in sorted(days)]
+            )
+
+    def process_dirty(self, session):
+        """
+        Rebuild the archived days marked by mark_late(), in one transaction; marked days
+        not archived yet are left to archive_pending(). Returns the number rebuilt.
+        """
+        # Delete first: the transaction holds the write lock before it reads raw telemetry
+        dirty = sorted(session.execute(
+            ARCHIVE_DIRTY_TABLE.delete().returning(ARCHIVE_DIRTY_TABLE.c.plant_id, ARCHIVE_DIRTY_TABLE.c.day)
+        ).all())
+        archived = {}
+        rebuilt = 0
+        for plant_id, day in dirty:
+            if plant_id not in archived:
+                archived[plant_id] = self.archived_days(session, plant_id)
+            if day in archived[plant_id]:
+                self.archive_day(session, plant_id, day)
+                rebuilt += 1
+        session.commit()
+        return rebuilt
+
+    def archived_days(self, executor, plant_id):
+        return set(executor.execute(
+            sa.select(ARCHIVE_TABLE.c.day).distinct().where(ARCHIVE_TABLE.c.plant_id == plant_id)
+        ).scalars())
+
+    def archive_pending(self, session, plant_id, first_day, last_day):
+        """
+        Archive every day in [first_day, last_day] that is not archived yet, one committed
+        transaction per day. Returns {day: readings archived} for the days that had data.
+        """
+        done = self.archived_days(session, plant_id)
+        archived = {}
+        day = first_day
+        while day <= last_day:
+            if day not in done:
+                count = self.archive_day(session, plant_id, day)
+                session.commit()
+                if count:
+                    archived[day] = count
+            day += timedelta(days=1)
+        return archived
+
+    def drop_before(self, session, plant_id, cutoff_day):
+        return session.execute(
+            ARCHIVE_TABLE.delete()
+            .where(ARCHIVE_TABLE.c.plant_id == plant_id)
+            .where(ARCHIVE_TABLE.c.day < cutoff_day)
+        ).rowcount
+
+    # Reads --------------------------------------------------------------------------
+
+    def read(self, executor, plant_id, start, end, unit_id=None, columns=None):
+        """
+        Archived readings of a plant with start <= timestamp < end, decoded per unit:
+        {unit_id: (timestamps, {column: values})}, oldest first. Only the requested
+        columns are decoded.
+        """
+        query = sa.select(ARCHIVE_TABLE.c.unit_id, ARCHIVE_TABLE.c.chunk)\
+                  .where(ARCHIVE_TABLE.c.plant_id == plant_id)\
+                  .where(ARCHIVE_TABLE.c.day >= start.date())\
+                  .where(ARCHIVE_TABLE.c.day <= end.date())\
+                  .where(ARCHIVE_TABLE.c.last_timestamp >= start)\
+                  .where(ARCHIVE_TABLE.c.first_timestamp < end)
+        if unit_id is not None:
+            query = query.where(ARCHIVE_TABLE.c.unit_id == unit_id)
+
+        start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+        series = {}
+        for chunk_unit_id, chunk in executor.execute(query.order_by(ARCHIVE_TABLE.c.day)):
+            timestamps, values = decode_chunk(chunk, columns if columns is not None else self.columns)
+            unit_timestamps, unit_values = series.setdefault(chunk_unit_id, ([], {}))
+            keep = [i for i, timestamp in enumerate(timestamps) if start_ms <= timestamp < end_ms]
+            unit_timestamps.extend(from_epoch_ms(timestamps[i]) for i in keep)
+            for column, column_values in values.items():
+                unit_values.setdefault(column, []).extend(column_values[i] for i in keep)
+        return series
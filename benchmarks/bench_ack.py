@@ -0,0 +1,148 @@
+"""
+/data acknowledgement benchmark: full records response vs ?ack=lean vs Prefer: return=minimal
+Run from the repository root:  python benchmarks/bench_ack.py [seconds] [clients]
+
+The app runs in its own process behind a real HTTP server (werkzeug, threaded, HTTP/1.1),
+and `clients` threads post script03.py-style payloads over keep-alive connections as
+fast as they can. Reports client-side latency (p50/p99), throughput, response bytes and
+the server process's CPU time per request, which is what the lean modes save.
+"""
+
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 5099
+
+MODES = {
+    "full": ("/data", {}),
+    "lean": ("/data?ack=lean", {}),
+    "minimal": ("/data", {"Prefer": "return=minimal"}),
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def serve():
+    """Runs in the server process"""
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from app07 import app, admission
+
+    # Replay the fleet faster than real time: lift the per-device rate limit
+    admission.rate = admission.burst = 1e9
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"    # keep-alive, like a requests session
+    make_server("127.0.0.1", PORT, app, threaded=True).serve_forever()
+
+
+def fleet_payloads():
+    """One script03.py-style payload per unit, JSON-encoded"""
+    sys.path.insert(0, ROOT)
+    from app07 import PLANT_NAMES, PLANT_CONFIG
+
+    payloads = []
+    for plant_id, plant_name in PLANT_NAMES.items():
+        for unit_id in range(1, PLANT_CONFIG[plant_id] + 1):
+            prefix = f"{plant_name.lower()}_u{unit_id}"
+            payloads.append(json.dumps({
+                f"{prefix}_power": 1500, f"{prefix}_current_L1": 150, f"{prefix}_current_L2": 151,
+                f"{prefix}_current_L3": 149, f"{prefix}_voltage_L12": 230, f"{prefix}_voltage_L23": 229,
+                f"{prefix}_voltage_L13": 231, f"{prefix}_energy": 1500000, f"{prefix}_runtime": 5000,
+            }).encode())
+    return payloads
+
+
+def process_cpu_seconds(pid):
+    """utime + stime of a process, from /proc"""
+    with open(f"/proc/{pid}/stat") as handle:
+        fields = handle.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def run(server, label, path, headers, payloads, seconds, clients):
+    latencies = []
+    response_bytes = [0]
+    failures = [0]
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def client(offset):
+        connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+        request_headers = dict(headers, **{"Content-Type": "application/json"})
+        i = offset
+        local = []
+        while time.time() < deadline:
+            t0 = time.perf_counter()
+            connection.request("POST", path, body=payloads[i % len(payloads)], headers=request_headers)
+            response = connection.getresponse()
+            body = response.read()
+            local.append(time.perf_counter() - t0)
+            with lock:
+                response_bytes[0] += len(body)
+                if response.status not in (200, 204):
+                    failures[0] += 1
+            i += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+
+    cpu_before = process_cpu_seconds(server.pid)
+    threads = [threading.Thread(target=client, args=(n * 7,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server_cpu = process_cpu_seconds(server.pid) - cpu_before
+
+    count = len(latencies)
+    print(f"{label:<8} req/s={count / seconds:7.1f} p50={percentile(latencies, 50) * 1000:6.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:7.2f}ms resp={response_bytes[0] / count:6.1f}B "
+          f"server_cpu={server_cpu / count * 1000:5.2f}ms/req failures={failures[0]}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    scratch_dir = tempfile.mkdtemp(prefix="plant_bench_")
+    env = dict(
+        os.environ,
+        PLANT_DB_URI=f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}?check_same_thread=False",
+        PLANT_JOBS="0",
+    )
+    os.environ.update(env)
+    server = subprocess.Popen([sys.executable, __file__, '--serve'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        payloads = fleet_payloads()
+        for _ in range(100):
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=1)
+                connection.request("GET", "/login")
+                connection.getresponse().read()
+                connection.close()
+                break
+            except OSError:
+                time.sleep(0.2)
+
+        print(f"{clients} clients x {seconds}s per mode, scratch database: {scratch_dir}")
+        for label, (path, headers) in MODES.items():
+            run(server, label, path, headers, payloads, seconds, clients)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve()
+    else:
+        main()
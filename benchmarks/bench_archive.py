@@ -0,0 +1,142 @@
+"""
+Archive tier benchmark: compression ratio and encode/decode throughput of Gorilla chunks
+on one unit-day of simulator data, against the same readings stored as raw SQLite rows.
+
+Readings go through the real parse path (parse_esp32_data, build_plant_rows) with
+script03.py's cadence: one reading per unit every ~7.5 s (25 units x 0.1 s + 5 s sleep)
+plus a few milliseconds of request jitter.
+
+Profiles:
+  simulator       script03.py's current ranges (zero power/current/voltage, random energy/runtime)
+  simulator-live  script03.py's commented-out ranges (random power, currents and voltages)
+  meter           smooth power and monotonic energy/runtime counters, as a real meter reports
+
+Run from the repository root:  python benchmarks/bench_archive.py [repeats]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="plant_bench_")
+os.environ["PLANT_DB_URI"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}?check_same_thread=False"
+os.environ.setdefault("PLANT_ROLLUPS", "0")
+os.environ.setdefault("PLANT_JOBS", "0")
+
+from app07 import app, db, parse_esp32_data, build_plant_rows, store_plant_rows, MEASUREMENT_COLUMNS
+from archive import to_epoch_ms
+from gorilla import encode_chunk, decode_chunk
+
+PLANT_ID, PLANT_NAME, UNIT_ID = 9, "weg", 1
+CYCLE_SECONDS = 25 * 0.1 + 5   # script03.py: 25 units x 0.1 s, then a 5 s sleep
+
+
+def simulator_payload(prefix, step, live):
+    if live:
+        ranges = {'power': (1000, 2000), 'current_L1': (100, 200), 'current_L2': (100, 200),
+                  'current_L3': (100, 200), 'voltage_L12': (100, 230), 'voltage_L23': (100, 230),
+                  'voltage_L13': (100, 230)}
+    else:
+        ranges = {'power': (0, 0), 'current_L1': (0, 0), 'current_L2': (0, 0), 'current_L3': (0, 0),
+                  'voltage_L12': (0, 0), 'voltage_L23': (0, 0), 'voltage_L13': (0, 0)}
+    ranges.update({'energy': (1000000, 2000000), 'runtime': (1000, 100000)})
+    return {f"{prefix}_{name}": random.randint(low, high) for name, (low, high) in ranges.items()}
+
+
+def meter_payload(prefix, step, state):
+    state['power'] = min(2000.0, max(0.0, state['power'] + random.choice((-1, 0, 0, 1)) * 0.5))
+    state['energy'] += state['power'] * CYCLE_SECONDS / 3600.0
+    state['runtime'] += CYCLE_SECONDS
+    current = round(state['power'] / 230.0 / 3 * 10, 1)
+    payload = {f"{prefix}_power": round(state['power'], 1), f"{prefix}_energy": round(state['energy'], 2),
+               f"{prefix}_runtime": round(state['runtime'], 1)}
+    for phase in ('L1', 'L2', 'L3'):
+        payload[f"{prefix}_current_{phase}"] = current
+    for phase in ('L12', 'L23', 'L13'):
+        payload[f"{prefix}_voltage_{phase}"] = 230.0
+    return payload
+
+
+def unit_day(profile):
+    """Rows of one unit for one day, as build_plant_rows produces them"""
+    random.seed(16)
+    prefix = f"{PLANT_NAME}_u{UNIT_ID}"
+    state = {'power': 1500.0, 'energy': 1500000.0, 'runtime': 5000.0}
+    start = datetime(2026, 1, 1)
+    rows = []
+    step = 0
+    timestamp = start
+    while timestamp < start + timedelta(days=1):
+        if profile == 'meter':
+            payload = meter_payload(prefix, step, state)
+        else:
+            payload = simulator_payload(prefix, step, profile == 'simulator-live')
+        rows.extend(build_plant_rows(parse_esp32_data(payload), timestamp)[PLANT_ID])
+        step += 1
+        timestamp = start + timedelta(seconds=step * CYCLE_SECONDS, milliseconds=random.randint(0, 30))
+    return rows
+
+
+def raw_bytes(rows):
+    """Growth of the SQLite file (table + indexes) when the rows are inserted"""
+    def size():
+        connection = db.session.connection()
+        pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        free = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        return (pages - free) * page_size
+
+    before = size()
+    store_plant_rows({PLANT_ID: [dict(row) for row in rows]}, summarize=False)
+    after = size()
+    db.session.commit()
+    return after - before
+
+
+def timed(repeats, fn):
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats
+
+
+def run(profile, repeats):
+    rows = unit_day(profile)
+    timestamps = [to_epoch_ms(row['timestamp']) for row in rows]
+    columns = {column: [row[column] for row in rows] for column in MEASUREMENT_COLUMNS}
+    values = len(rows) * len(MEASUREMENT_COLUMNS)
+
+    chunk = encode_chunk(timestamps, columns)
+    decoded_timestamps, decoded = decode_chunk(chunk)
+    assert decoded_timestamps == timestamps and decoded == columns, "round trip mismatch"
+
+    with app.app_context():
+        raw = raw_bytes(rows)
+
+    encode_s = timed(repeats, lambda: encode_chunk(timestamps, columns))
+    decode_s = timed(repeats, lambda: decode_chunk(chunk))
+    decode_power_s = timed(repeats, lambda: decode_chunk(chunk, ['power']))
+
+    print(f"{profile:<15} rows={len(rows):<6} chunk={len(chunk):>7}B ({len(chunk) / len(rows):5.1f}B/row) "
+          f"raw_sqlite={raw:>8}B ({raw / len(rows):5.1f}B/row) ratio={raw / len(chunk):5.1f}x "
+          f"vs_float64={len(rows) * (len(MEASUREMENT_COLUMNS) + 1) * 8 / len(chunk):4.1f}x")
+    print(f"{'':<15} encode={values / encode_s / 1e6:5.2f}M values/s  "
+          f"decode={len(rows) / decode_s / 1e3:7.1f}k rows/s ({values / decode_s / 1e6:5.2f}M values/s)  "
+          f"decode power only={len(rows) / decode_power_s / 1e3:7.1f}k rows/s")
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"one unit-day per profile, {repeats} repeats, scratch database: {SCRATCH_DIR}")
+    for profile in ('simulator', 'simulator-live', 'meter'):
+        run(profile, repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Compact storage profile benchmark: database size and scan speed of a synthetic fleet
+dataset stored with REAL/DATETIME columns (default) and with scaled integers and
+epoch-millisecond timestamps (PLANT_COMPACT=1).
+
+Every configured unit reports at script03.py's cadence (one reading every 7.5 s) for
+`days` days, with 2-decimal meter values: a slowly drifting power, matching per-phase
+currents, ~230 V voltages and monotonic energy/runtime counters. Each profile is loaded
+into a fresh scratch database in its own process, since the profile is fixed at import.
+
+Reported per profile:
+  size        used database pages after loading, and bytes per reading
+  sql scan    SELECT count(*), sum(power), max(timestamp) over every plant table (SQLite only)
+  core read   every row of one plant through a Core select, decoded to floats/datetimes
+  orm read    plant_records_since() for one plant over the whole range
+
+Run from the repository root:  python benchmarks/bench_compact.py [days]
+"""
+
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CYCLE_SECONDS = 25 * 0.1 + 5   # script03.py: 25 units x 0.1 s, then a 5 s sleep
+READ_PLANT_ID = 9
+
+
+def fleet_rows(plant_config, start, days):
+    """{plant_id: rows} for `days` days of readings, one hour of the fleet at a time"""
+    random.seed(20)
+    state = {
+        (plant_id, unit_id): {'power': random.uniform(500, 1800), 'energy': random.uniform(1e6, 2e6),
+                              'runtime': random.uniform(1e3, 1e5)}
+        for plant_id, unit_count in plant_config.items()
+        for unit_id in range(1, unit_count + 1)
+    }
+    steps_per_hour = int(3600 / CYCLE_SECONDS)
+    for hour in range(days * 24):
+        rows_by_plant = {}
+        for step in range(hour * steps_per_hour, (hour + 1) * steps_per_hour):
+            timestamp = start + timedelta(seconds=step * CYCLE_SECONDS, milliseconds=random.randint(0, 30))
+            for (plant_id, unit_id), unit in state.items():
+                unit['power'] = min(2000.0, max(0.0, unit['power'] + random.uniform(-5, 5)))
+                unit['energy'] += unit['power'] * CYCLE_SECONDS / 3600.0
+                unit['runtime'] += CYCLE_SECONDS
+                current = round(unit['power'] / 230.0 / 3 * 10, 2)
+                voltages = [round(random.uniform(228, 232), 2) for _ in range(3)]
+                rows_by_plant.setdefault(plant_id, []).append({
+                    'unit_id': unit_id,
+                    'timestamp': timestamp,
+                    'power': round(unit['power'], 2),
+                    'current_l1': current, 'current_l2': current, 'current_l3': current, 'current_avg': current,
+                    'voltage_l12': voltages[0], 'voltage_l23': voltages[1], 'voltage_l13': voltages[2],
+                    'voltage_avg': round(sum(voltages) / 3, 2),
+                    'energy': round(unit['energy'], 2),
+                    'runtime': round(unit['runtime'], 2),
+                })
+        yield rows_by_plant
+
+
+def worker(days):
+    """Runs inside one process: load the dataset in this process's profile and measure it"""
+    sys.path.insert(0, ROOT)
+    from app07 import app, db, PLANT_CONFIG, PLANT_TABLES, store_plant_rows, plant_records_since
+
+    start = datetime(2026, 1, 1)
+    result = {}
+    with app.app_context():
+        t0 = time.perf_counter()
+        rows = 0
+        for rows_by_plant in fleet_rows(PLANT_CONFIG, start, days):
+            rows += store_plant_rows(rows_by_plant, summarize=False)
+        result['load_s'] = time.perf_counter() - t0
+        result['rows'] = rows
+
+        connection = db.session.connection()
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        free = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        result['bytes'] = (pages - free) * connection.exec_driver_sql("PRAGMA page_size").scalar()
+        db.session.commit()
+
+        t0 = time.perf_counter()
+        for PlantTable in PLANT_TABLES.values():
+            db.session.execute(
+                db.select(db.func.count(), db.func.sum(PlantTable.power), db.func.max(PlantTable.timestamp))
+            ).one()
+        result['sql_scan_s'] = time.perf_counter() - t0
+
+        table = PLANT_TABLES[READ_PLANT_ID].__table__
+        t0 = time.perf_counter()
+        result['read_rows'] = len(db.session.execute(db.select(table)).all())
+        result['core_read_s'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        plant_records_since(READ_PLANT_ID, start, start + timedelta(days=days + 1))
+        result['orm_read_s'] = time.perf_counter() - t0
+        db.session.commit()
+
+    print(json.dumps(result))
+
+
+def run(label, compact, days):
+    scratch_dir = tempfile.mkdtemp(prefix="plant_bench_")
+    env = dict(
+        os.environ,
+        PLANT_DB_URI=f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}?check_same_thread=False",
+        PLANT_COMPACT="1" if compact else "0",
+        PLANT_RING="0",
+    )
+    for name in ("PLANT_ROLLUPS", "PLANT_ARCHIVE", "PLANT_JOBS"):
+        env.setdefault(name, "0")
+
+    output = subprocess.run([sys.executable, __file__, '--worker', str(days)], env=env, check=True,
+                            stdout=subprocess.PIPE, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    rows = result['rows']
+    print(f"{label:<8} rows={rows:<8} size={result['bytes'] / 1e6:7.1f}MB ({result['bytes'] / rows:5.1f}B/row) "
+          f"load={rows / result['load_s'] / 1e3:6.1f}k rows/s")
+    print(f"{'':<8} sql scan={rows / result['sql_scan_s'] / 1e6:6.2f}M rows/s  "
+          f"core read={result['read_rows'] / result['core_read_s'] / 1e3:6.1f}k rows/s  "
+          f"orm read={result['read_rows'] / result['orm_read_s'] / 1e3:6.1f}k rows/s")
+    return result
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    print(f"{days}-day fleet dataset, one reading per unit every {CYCLE_SECONDS}s")
+    default = run("default", False, days)
+    compact = run("compact", True, days)
+    print(f"compact/default: size {compact['bytes'] / default['bytes']:.2f}x, "
+          f"sql scan speed {default['sql_scan_s'] / compact['sql_scan_s']:.2f}x, "
+          f"core read speed {default['core_read_s'] / compact['core_read_s']:.2f}x")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '--worker':
+        worker(int(sys.argv[2]))
+    else:
+        main()
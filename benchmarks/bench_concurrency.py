@@ -0,0 +1,137 @@
+"""
+Concurrent reader + writer stress test for the SQLite storage layer.
+Runs the same workload with the reader/writer split off (single engine and pool) and on
+(one writer connection, query-only reader pool), in separate worker processes like
+gunicorn's workers, and reports latencies and "database is locked" error rates. Both
+modes run WAL with the same pragmas, so this measures the pooling and routing alone.
+
+Run from the repository root:  python benchmarks/bench_concurrency.py [seconds] [processes]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WRITER_THREADS = 2
+READER_THREADS = 4
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def worker(seconds):
+    """Runs inside one process: writer threads ingest, reader threads poll the dashboard queries"""
+    sys.path.insert(0, ROOT)
+    from app07 import app, db, PLANT_CONFIG, PLANT_TABLES, build_plant_rows, store_plant_rows
+
+    deadline = time.time() + seconds
+    results = {'write': [], 'read': [], 'write_locked': 0, 'read_locked': 0, 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+
+    def record(kind, latency=None, error=None):
+        with lock:
+            if error is None:
+                results[kind].append(latency)
+            elif 'database is locked' in str(error):
+                results[f'{kind}_locked'] += 1
+            else:
+                results[f'{kind}_errors'] += 1
+
+    def writer():
+        units = [
+            {'plant_id': plant_id, 'unit_id': unit_id, 'power': 1500.0, 'current_l1': 150.0, 'voltage_l12': 230.0}
+            for plant_id, unit_count in PLANT_CONFIG.items()
+            for unit_id in range(1, unit_count + 1)
+        ]
+        with app.app_context():
+            while time.time() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    store_plant_rows(build_plant_rows(units), max_retries=1, summarize=False)
+                    record('write', time.perf_counter() - t0)
+                except Exception as e:
+                    db.session.rollback()
+                    record('write', error=e)
+
+    def reader():
+        with app.app_context():
+            while time.time() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    for plant_id, unit_count in PLANT_CONFIG.items():
+                        PlantTable = PLANT_TABLES[plant_id]
+                        for unit_id in range(1, unit_count + 1):
+                            PlantTable.query.filter_by(unit_id=unit_id)\
+                                            .order_by(PlantTable.timestamp.desc())\
+                                            .first()
+                    db.session.commit()
+                    record('read', time.perf_counter() - t0)
+                except Exception as e:
+                    db.session.rollback()
+                    record('read', error=e)
+
+    threads = [threading.Thread(target=writer) for _ in range(WRITER_THREADS)]
+    threads += [threading.Thread(target=reader) for _ in range(READER_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps(results))
+
+
+def run_mode(label, split, seconds, processes):
+    scratch_dir = tempfile.mkdtemp(prefix="plant_bench_")
+    env = dict(
+        os.environ,
+        PLANT_DB_URI=f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}?check_same_thread=False",
+        PLANT_RW_SPLIT="1" if split else "0",
+        PLANT_JOBS="0",
+    )
+
+    # Create the schema once before the workers race for it
+    subprocess.run([sys.executable, __file__, '--worker', '0'], env=env, check=True, capture_output=True)
+
+    workers = [
+        subprocess.Popen([sys.executable, __file__, '--worker', str(seconds)], env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    merged = {'write': [], 'read': [], 'write_locked': 0, 'read_locked': 0, 'write_errors': 0, 'read_errors': 0}
+    for proc in workers:
+        output, _ = proc.communicate()
+        result = json.loads(output.strip().splitlines()[-1])
+        for key, value in result.items():
+            merged[key] += value
+
+    for kind in ('write', 'read'):
+        ok = len(merged[kind])
+        locked = merged[f'{kind}_locked']
+        total = ok + locked + merged[f'{kind}_errors']
+        print(f"{label:<6} {kind:<5} ops={ok:<6} ops/s={ok / seconds:8.1f} "
+              f"p50={percentile(merged[kind], 50) * 1000:7.2f}ms p99={percentile(merged[kind], 99) * 1000:8.2f}ms "
+              f"locked={locked} ({locked / total * 100 if total else 0:.2f}%) other_errors={merged[f'{kind}_errors']}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(f"{processes} processes x ({WRITER_THREADS} writers + {READER_THREADS} readers), {seconds}s per mode")
+    run_mode("single", False, seconds, processes)
+    run_mode("split", True, seconds, processes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '--worker':
+        worker(float(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,88 @@
+"""
+Ingest benchmark: per-unit add/commit (old receive_data) vs single-transaction bulk insert
+Run from the repository root:  python benchmarks/bench_ingest.py [cycles]
+Uses a scratch SQLite database, the real plant_monitoring.db is never touched.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="plant_bench_")
+os.environ["PLANT_DB_URI"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}?check_same_thread=False"
+os.environ.setdefault("PLANT_JOBS", "0")
+
+from app07 import app, db, PLANT_CONFIG, PLANT_NAMES, PLANT_TABLES, parse_esp32_data, build_plant_rows, store_plant_rows
+
+
+def generate_plant_payload(plant_id):
+    """One ESP32-style payload carrying every unit of a plant (e.g. 3 units for WEG)"""
+    plant_name = PLANT_NAMES[plant_id].lower()
+    payload = {}
+    for unit_id in range(1, PLANT_CONFIG[plant_id] + 1):
+        prefix = f"{plant_name}_u{unit_id}"
+        payload.update({
+            f"{prefix}_power": random.randint(1000, 2000),
+            f"{prefix}_current_L1": random.randint(100, 200),
+            f"{prefix}_current_L2": random.randint(100, 200),
+            f"{prefix}_current_L3": random.randint(100, 200),
+            f"{prefix}_voltage_L12": random.randint(100, 230),
+            f"{prefix}_voltage_L23": random.randint(100, 230),
+            f"{prefix}_voltage_L13": random.randint(100, 230),
+            f"{prefix}_energy": random.randint(1000000, 2000000),
+            f"{prefix}_runtime": random.randint(1000, 100000),
+        })
+    return payload
+
+
+def store_per_unit(parsed_units):
+    """The previous receive_data storage loop: one ORM add + commit per unit"""
+    for plant_id, rows in build_plant_rows(parsed_units).items():
+        PlantTable = PLANT_TABLES[plant_id]
+        for row in rows:
+            db.session.add(PlantTable(**row))
+            db.session.commit()
+
+
+def store_bulk(parsed_units):
+    store_plant_rows(build_plant_rows(parsed_units))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(label, store, cycles):
+    latencies = []
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(cycles):
+        for plant_id in PLANT_CONFIG:
+            parsed_units = parse_esp32_data(generate_plant_payload(plant_id))
+            t0 = time.perf_counter()
+            store(parsed_units)
+            latencies.append(time.perf_counter() - t0)
+            rows += len(parsed_units)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} rows={rows:<7} rows/s={rows / elapsed:>9.1f} "
+          f"p50={percentile(latencies, 50) * 1000:7.2f}ms p99={percentile(latencies, 99) * 1000:7.2f}ms")
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"Fleet: {len(PLANT_CONFIG)} plants, {sum(PLANT_CONFIG.values())} units, {cycles} cycles")
+    print(f"Scratch database: {SCRATCH_DIR}")
+    with app.app_context():
+        run("per-unit", store_per_unit, cycles)
+        run("bulk", store_bulk, cycles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+parse_esp32_data microbenchmark: regex + if/elif chain (old) vs memoized key resolution
+Run from the repository root:  python benchmarks/bench_parse.py [iterations]
+"""
+
+import os
+import re
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("PLANT_DB_URI", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='plant_bench_'), 'bench.db')}")
+os.environ.setdefault("PLANT_JOBS", "0")
+
+from app07 import PLANT_CONFIG, PLANT_NAMES, PLANT_NAME_TO_ID, parse_esp32_data, resolve_esp32_key
+
+
+def legacy_parse_esp32_data(json_data):
+    """parse_esp32_data before the key cache (kept here for comparison)"""
+    parsed_units = {}
+    pattern = r'([a-zA-Z0-9]+)_u(\d+)_(.+)'
+
+    for key, value in json_data.items():
+        match = re.match(pattern, key)
+        if match:
+            plant_name = match.group(1).lower()
+            unit_id = int(match.group(2))
+            parameter = match.group(3)
+
+            plant_id = PLANT_NAME_TO_ID.get(plant_name)
+            if plant_id is None:
+                continue
+
+            unit_key = (plant_id, unit_id)
+            if unit_key not in parsed_units:
+                parsed_units[unit_key] = {'plant_id': plant_id, 'unit_id': unit_id}
+
+            try:
+                value = float(value)
+                if parameter == 'power':
+                    parsed_units[unit_key]['power'] = value
+                elif parameter == 'current_L1':
+                    parsed_units[unit_key]['current_l1'] = value
+                elif parameter == 'current_L2':
+                    parsed_units[unit_key]['current_l2'] = value
+                elif parameter == 'current_L3':
+                    parsed_units[unit_key]['current_l3'] = value
+                elif parameter == 'voltage_L12':
+                    parsed_units[unit_key]['voltage_l12'] = value
+                elif parameter == 'voltage_L23':
+                    parsed_units[unit_key]['voltage_l23'] = value
+                elif parameter == 'voltage_L13':
+                    parsed_units[unit_key]['voltage_l13'] = value
+                elif parameter == 'energy':
+                    parsed_units[unit_key]['energy'] = value
+                elif parameter == 'runtime':
+                    parsed_units[unit_key]['runtime'] = value
+            except (ValueError, TypeError):
+                continue
+
+    for unit_data in parsed_units.values():
+        currents = [unit_data.get('current_l1'), unit_data.get('current_l2'), unit_data.get('current_l3')]
+        valid_currents = [c for c in currents if c is not None]
+        if valid_currents:
+            unit_data['current_avg'] = sum(valid_currents) / len(valid_currents)
+
+        voltages = [unit_data.get('voltage_l12'), unit_data.get('voltage_l23'), unit_data.get('voltage_l13')]
+        valid_voltages = [v for v in voltages if v is not None]
+        if valid_voltages:
+            unit_data['voltage_avg'] = sum(valid_voltages) / len(valid_voltages)
+
+    return list(parsed_units.values())
+
+
+def fleet_payloads():
+    """One payload per unit, as script03.py sends them, plus a few unknown keys"""
+    payloads = []
+    for plant_id, unit_count in PLANT_CONFIG.items():
+        plant_name = PLANT_NAMES[plant_id].lower()
+        for unit_id in range(1, unit_count + 1):
+            prefix = f"{plant_name}_u{unit_id}"
+            payloads.append({
+                f"{prefix}_power": 1500, f"{prefix}_current_L1": 150, f"{prefix}_current_L2": 151,
+                f"{prefix}_current_L3": 149, f"{prefix}_voltage_L12": 230, f"{prefix}_voltage_L23": 229,
+                f"{prefix}_voltage_L13": 231, f"{prefix}_energy": 1500000, f"{prefix}_runtime": 5000,
+                f"{prefix}_rssi": -67, "fw_version": "1.4.2",
+            })
+    return payloads
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payloads = fleet_payloads()
+
+    # Both parsers must agree before timing them
+    for payload in payloads:
+        assert legacy_parse_esp32_data(payload) == parse_esp32_data(payload)
+
+    def run(parser):
+        for payload in payloads:
+            parser(payload)
+
+    legacy = timeit.timeit(lambda: run(legacy_parse_esp32_data), number=iterations)
+    cached = timeit.timeit(lambda: run(parse_esp32_data), number=iterations)
+    calls = iterations * len(payloads)
+
+    print(f"{len(payloads)} payloads x {iterations} iterations ({calls} parses)")
+    print(f"regex + if/elif : {legacy / calls * 1e6:7.2f} us/payload")
+    print(f"memoized keys   : {cached / calls * 1e6:7.2f} us/payload  ({legacy / cached:.2f}x)")
+    print(f"key cache       : {resolve_esp32_key.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
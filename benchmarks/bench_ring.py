@@ -0,0 +1,79 @@
+"""
+Recent-window read benchmark: the memory-mapped ring buffer vs SQLite.
+Fills the fleet with `hours` of readings at script03.py's cadence (~7.5 s per unit), then
+times the live views' queries both ways.
+
+Run from the repository root:  python benchmarks/bench_ring.py [hours] [repeats]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="plant_bench_")
+os.environ["PLANT_DB_URI"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}?check_same_thread=False"
+os.environ.setdefault("PLANT_ROLLUPS", "0")
+os.environ.setdefault("PLANT_JOBS", "0")
+
+import app07
+from app07 import app, PLANT_CONFIG, build_plant_rows, store_plant_rows, latest_fleet_records, recent_plant_records
+
+CYCLE_SECONDS = 25 * 0.1 + 5   # script03.py: 25 units x 0.1 s, then a 5 s sleep
+
+
+def fill(hours):
+    now = datetime.utcnow()
+    units = [(plant_id, unit_id) for plant_id, count in PLANT_CONFIG.items() for unit_id in range(1, count + 1)]
+    steps = int(hours * 3600 / CYCLE_SECONDS)
+    for first in range(0, steps, 200):
+        parsed = [
+            {'plant_id': plant_id, 'unit_id': unit_id, 'power': 1500.0 + step % 50, 'current_avg': 150.0,
+             'voltage_avg': 230.0, 'energy': 1500000.0 + step, 'runtime': 5000.0 + step,
+             'timestamp': now - timedelta(seconds=(steps - step) * CYCLE_SECONDS)}
+            for step in range(first, min(first + 200, steps))
+            for plant_id, unit_id in units
+        ]
+        store_plant_rows(build_plant_rows(parsed), summarize=False)
+    return steps * len(units)
+
+
+def timed(repeats, fn):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 24
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    ring = app07.telemetry_ring
+    with app.app_context():
+        ring._open()
+        ring.created_ms -= int(hours * 3600 * 1000) + 60000  # as if the ring had been running all along
+        rows = fill(hours)
+        print(f"{rows} readings over {hours}h, scratch database: {SCRATCH_DIR}")
+
+        now = datetime.utcnow()
+        queries = {
+            "fleet latest (2 min)": lambda: latest_fleet_records(now - timedelta(minutes=2)),
+            "plant 9 window (7 h)": lambda: recent_plant_records(9, now - timedelta(hours=7)),
+            "plant 9 window (15 min)": lambda: recent_plant_records(9, now - timedelta(minutes=15)),
+        }
+        for label, query in queries.items():
+            app07.telemetry_ring = ring
+            ring_s = timed(repeats, query)
+            app07.telemetry_ring = None
+            sql_s = timed(repeats, query)
+            print(f"{label:<24} ring={ring_s * 1e6:9.0f}us  sqlite={sql_s * 1e6:9.0f}us  ({sql_s / ring_s:5.1f}x)")
+        app07.telemetry_ring = ring
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Sharded ingest benchmark: aggregate write throughput as the per-plant telemetry tables
+are spread over more database files (PLANT_SHARDS).
+
+Each configuration gets a fresh scratch database and `processes` worker processes, like
+gunicorn's workers. Worker i ingests the plants with (plant_id - 1) % processes == i,
+one plant per transaction of `batch` readings, through store_plant_rows. With one file
+all workers queue for the same write lock; with shards, workers whose plants sit in
+different files commit in parallel. unit_state and the rollup dirty marks still live in
+the main database (set PLANT_UNIT_STATE=0 to take unit_state out of the picture).
+
+Run from the repository root:  python benchmarks/bench_shards.py [seconds] [processes] [batch]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHARD_COUNTS = (0, 1, 2, 4, 8)
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def worker(seconds, index, processes, batch):
+    """Runs inside one process: ingest this worker's plants round-robin until the deadline"""
+    sys.path.insert(0, ROOT)
+    from app07 import app, db, PLANT_CONFIG, build_plant_rows, store_plant_rows
+
+    plants = [plant_id for plant_id in PLANT_CONFIG if (plant_id - 1) % processes == index]
+    results = {'rows': 0, 'latency': [], 'locked': 0, 'errors': 0}
+    deadline = time.time() + seconds
+    start = datetime.utcnow() - timedelta(days=1)
+    step = 0
+
+    with app.app_context():
+        while plants and time.time() < deadline:
+            for plant_id in plants:
+                units = []
+                for reading in range(batch):
+                    step += 1
+                    units.append({
+                        'plant_id': plant_id, 'unit_id': reading % PLANT_CONFIG[plant_id] + 1,
+                        'power': 1500.0 + reading, 'current_l1': 150.0, 'voltage_l12': 230.0,
+                        'energy': 1500000.0 + step, 'runtime': 5000.0 + step,
+                        'timestamp': start + timedelta(milliseconds=step),
+                    })
+                t0 = time.perf_counter()
+                try:
+                    results['rows'] += store_plant_rows(build_plant_rows(units), max_retries=1, summarize=False)
+                    results['latency'].append(time.perf_counter() - t0)
+                except Exception as e:
+                    db.session.rollback()
+                    if 'database is locked' in str(e):
+                        results['locked'] += 1
+                    else:
+                        results['errors'] += 1
+
+    print(json.dumps(results))
+
+
+def run(shards, seconds, processes, batch):
+    scratch_dir = tempfile.mkdtemp(prefix="plant_bench_")
+    env = dict(
+        os.environ,
+        PLANT_DB_URI=f"sqlite:///{os.path.join(scratch_dir, 'bench.db')}?check_same_thread=False",
+        PLANT_SHARDS=str(shards),
+        PLANT_RING="0",
+    )
+    env.setdefault("PLANT_ROLLUPS", "0")
+    env.setdefault("PLANT_JOBS", "0")
+
+    # Create the schema once before the workers race for it
+    subprocess.run([sys.executable, __file__, '--worker', '0', '0', '1', '1'], env=env, check=True, capture_output=True)
+
+    workers = [
+        subprocess.Popen([sys.executable, __file__, '--worker', str(seconds), str(index), str(processes), str(batch)],
+                         env=env, stdout=subprocess.PIPE, text=True)
+        for index in range(processes)
+    ]
+    merged = {'rows': 0, 'latency': [], 'locked': 0, 'errors': 0}
+    for proc in workers:
+        output, _ = proc.communicate()
+        result = json.loads(output.strip().splitlines()[-1])
+        for key, value in result.items():
+            merged[key] += value
+
+    label = f"{shards} shards" if shards else "unsharded"
+    print(f"{label:<10} rows/s={merged['rows'] / seconds:9.0f} commits={len(merged['latency']):<6} "
+          f"p50={percentile(merged['latency'], 50) * 1000:7.2f}ms p99={percentile(merged['latency'], 99) * 1000:8.2f}ms "
+          f"locked={merged['locked']} other_errors={merged['errors']}")
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    print(f"{processes} processes, {batch} readings per transaction, {seconds}s per configuration")
+    for shards in SHARD_COUNTS:
+        run(shards, seconds, processes, batch)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 5 and sys.argv[1] == '--worker':
+        worker(float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
@@ -0,0 +1,119 @@
+"""
+Streaming decompression of gzip/deflate request bodies for the ingest endpoints.
+
+Bodies are inflated incrementally as the parser reads them, and reading stops with
+DecompressedBodyTooLarge once the inflated size passes the configured cap, so a
+small compressed "zip bomb" cannot exhaust a worker's memory.
+"""
+
+import io
+import zlib
+
+READ_CHUNK_SIZE = 64 * 1024
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# Content-Encoding -> zlib wbits
+SUPPORTED_ENCODINGS = {
+    'gzip': GZIP_WBITS,
+    'x-gzip': GZIP_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+
+class ContentEncodingError(Exception):
+    """Base class for request body decoding errors; status_code is the HTTP response code"""
+    status_code = 400
+
+
+class UnsupportedContentEncoding(ContentEncodingError):
+    status_code = 415
+
+
+class InvalidCompressedBody(ContentEncodingError):
+    status_code = 400
+
+
+class DecompressedBodyTooLarge(ContentEncodingError):
+    status_code = 413
+
+
+class DecompressingReader(io.RawIOBase):
+    """Raw reader that inflates a compressed stream on demand, enforcing max_size"""
+
+    def __init__(self, stream, wbits, max_size):
+        self._stream = stream
+        self._wbits = wbits
+        self._decompressor = zlib.decompressobj(wbits)
+        self._max_size = max_size
+        self._produced = 0
+        self._pending = b""
+        self._first_chunk = True
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _inflate(self, data):
+        try:
+            return self._decompressor.decompress(data, READ_CHUNK_SIZE)
+        except zlib.error:
+            # HTTP "deflate" is meant to be zlib-wrapped, but some clients send raw deflate
+            if self._first_chunk and self._wbits == zlib.MAX_WBITS:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                self._first_chunk = False
+                return self._inflate(data)
+            raise InvalidCompressedBody("Malformed compressed request body")
+
+    def _fill(self):
+        """Produce the next piece of inflated output into self._pending"""
+        while not self._pending and not self._eof:
+            if self._decompressor.eof:
+                data = self._decompressor.unused_data or self._stream.read(READ_CHUNK_SIZE)
+                if not data:
+                    self._eof = True
+                    break
+                if self._wbits != GZIP_WBITS:
+                    raise InvalidCompressedBody("Unexpected data after the compressed request body")
+                # Concatenated gzip members (RFC 1952 allows several): inflate the next one
+                self._decompressor = zlib.decompressobj(self._wbits)
+            elif self._decompressor.unconsumed_tail:
+                data = self._decompressor.unconsumed_tail
+            else:
+                data = self._stream.read(READ_CHUNK_SIZE)
+                if not data:
+                    self._eof = True
+                    if not self._decompressor.eof:
+                        raise InvalidCompressedBody("Truncated compressed request body")
+                    break
+
+            self._pending = self._inflate(data)
+            self._first_chunk = False
+
+        self._produced += len(self._pending)
+        if self._produced > self._max_size:
+            raise DecompressedBodyTooLarge(f"Decompressed request body exceeds {self._max_size} bytes")
+
+    def readinto(self, buffer):
+        if not self._pending:
+            self._fill()
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def decoding_stream(stream, content_encoding, max_size):
+    """
+    Wrap a request body stream so it yields decompressed bytes.
+    Returns the stream unchanged when there is no (or identity) Content-Encoding.
+    """
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return stream
+
+    wbits = SUPPORTED_ENCODINGS.get(encoding)
+    if wbits is None:
+        raise UnsupportedContentEncoding(f"Unsupported Content-Encoding: {content_encoding}")
+
+    return io.BufferedReader(DecompressingReader(stream, wbits, max_size), READ_CHUNK_SIZE)
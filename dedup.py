@@ -0,0 +1,160 @@
+"""
+Per-device replay detection for ingest retries.
+
+Devices (and the simulator's Retry adapter) resend a POST after a 5xx or a timeout,
+even when the first attempt was stored. When a reading carries a sequence number
+or message id, DedupWindow remembers the last `size` ids per device in a ring plus
+a set, so a replay is recognised in O(1) without touching the database.
+
+The window lives in process memory: each gunicorn worker keeps its own, and it
+starts empty after a restart. It is only the fast path. The retry of a request that
+another worker stored is caught by MessageLog: the ingest transaction inserts every
+message id into the ingest_message table with INSERT OR IGNORE ... RETURNING, and only
+stores the readings whose id was new. The check and the rows commit together under
+SQLite's write lock, so two workers can never both store the same reading.
+
+Sequence numbers restart from zero when a device reboots. A numeric id more than
+`reset_gap` below the newest one seen for the device is taken as such a restart, not
+as a replay (retries resend one of the last few readings): the device's window and
+its ingest_message rows are cleared. ingest_message rows older than the horizon are
+pruned by a scheduled job.
+"""
+
+import threading
+from collections import deque
+
+import sqlalchemy as sa
+
+from extension import db
+
+# Message ids stored per device, for replay detection across workers and restarts
+INGEST_MESSAGE_TABLE = db.Table(
+    'ingest_message',
+    sa.Column('plant_id', sa.Integer, primary_key=True),
+    sa.Column('unit_id', sa.Integer, primary_key=True),
+    sa.Column('message_id', sa.String(64), primary_key=True),
+    sa.Column('seq', sa.Integer, nullable=True),              # message_id as a number, if it is one
+    sa.Column('received_at', sa.DateTime, nullable=False, index=True),
+    sa.Index('ix_ingest_message_device_seq', 'plant_id', 'unit_id', 'seq'),
+)
+
+
+def sequence_number(message_id):
+    """message_id as an int when it is a sequence number, else None"""
+    # 18 digits always fit SQLite's 64-bit INTEGER
+    if message_id.isascii() and message_id.isdigit() and len(message_id) <= 18:
+        return int(message_id)
+    return None
+
+
+class DedupWindow:
+    def __init__(self, size=1024, reset_gap=100):
+        """
+        size       -- ids remembered per device
+        reset_gap  -- a sequence number this far below the device's newest means it restarted
+        """
+        self.size = size
+        self.reset_gap = reset_gap
+        self._rings = {}
+        self._sets = {}
+        self._newest = {}
+        self._lock = threading.Lock()
+
+        # Counters for monitoring
+        self.duplicates = 0
+        self.resets = 0
+
+    def claim(self, device_key, message_id):
+        """
+        Record message_id for device_key. Returns False if it is already in the
+        window (a replay), True if the caller should store the reading.
+        """
+        with self._lock:
+            seq = sequence_number(message_id)
+            if seq is not None:
+                newest = self._newest.get(device_key)
+                if newest is not None and seq < newest - self.reset_gap:
+                    # The device restarted its sequence: everything remembered is from before
+                    self._sets.pop(device_key, None)
+                    self._rings.pop(device_key, None)
+                    self.resets += 1
+                    newest = None
+                if newest is None or seq > newest:
+                    self._newest[device_key] = seq
+
+            seen = self._sets.get(device_key)
+            if seen is None:
+                seen = self._sets[device_key] = set()
+                self._rings[device_key] = deque()
+
+            if message_id in seen:
+                self.duplicates += 1
+                return False
+
+            ring = self._rings[device_key]
+            if len(ring) >= self.size:
+                seen.discard(ring.popleft())
+            ring.append(message_id)
+            seen.add(message_id)
+            return True
+
+    def release(self, device_key, message_id):
+        """Forget a claimed id again, e.g. when storing the reading failed"""
+        with self._lock:
+            seen = self._sets.get(device_key)
+            if seen is None or message_id not in seen:
+                return
+            seen.discard(message_id)
+            try:
+                self._rings[device_key].remove(message_id)
+            except ValueError:
+                pass
+
+
+class MessageLog:
+    def __init__(self, reset_gap=100):
+        """reset_gap -- as for DedupWindow: a sequence number this far below the newest means a restart"""
+        self.reset_gap = reset_gap
+
+        # Counters for monitoring
+        self.duplicates = 0
+        self.resets = 0
+
+    def claim(self, session, messages, now):
+        """
+        Inside the ingest transaction, record messages [(plant_id, unit_id, message_id), ...].
+        Returns the set of those that were new; the others were stored before (by any worker).
+        """
+        table = INGEST_MESSAGE_TABLE
+        lowest = {}
+        for plant_id, unit_id, message_id in messages:
+            seq = sequence_number(message_id)
+            if seq is not None and seq < lowest.get((plant_id, unit_id), seq + 1):
+                lowest[(plant_id, unit_id)] = seq
+
+        for (plant_id, unit_id), seq in lowest.items():
+            device = sa.and_(table.c.plant_id == plant_id, table.c.unit_id == unit_id)
+            newest = session.execute(sa.select(sa.func.max(table.c.seq)).where(device)).scalar()
+            if newest is not None and seq < newest - self.reset_gap:
+                session.execute(sa.delete(table).where(device))
+                self.resets += 1
+
+        claimed = session.execute(
+            table.insert().prefix_with('OR IGNORE').returning(table.c.plant_id, table.c.unit_id, table.c.message_id),
+            [
+                {'plant_id': plant_id, 'unit_id': unit_id, 'message_id': message_id,
+                 'seq': sequence_number(message_id), 'received_at': now}
+                for plant_id, unit_id, message_id in messages
+            ]
+        ).all()
+        fresh = {tuple(row) for row in claimed}
+        self.duplicates += len(messages) - len(fresh)
+        return fresh
+
+    def prune(self, session, before):
+        """Forget message ids received before `before`; returns the number deleted"""
+        deleted = session.execute(
+            sa.delete(INGEST_MESSAGE_TABLE).where(INGEST_MESSAGE_TABLE.c.received_at < before)
+        ).rowcount
+        session.commit()
+        return deleted
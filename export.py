@@ -0,0 +1,260 @@
+"""
+Day files of raw telemetry, written before retention deletes the rows.
+
+Every expiring plant-day is streamed from the database into one gzip-compressed CSV file
+(<directory>/plant_<id>/<YYYY-MM-DD>.csv.gz): a header of unit_id, timestamp and the
+measurement columns, then one line per reading, oldest first. Rows are read in batches
+from a streaming result and written as they arrive, so memory does not grow with the
+size of the day. Files are written under a temporary name and renamed into place.
+
+manifest.jsonl in the export directory indexes the files: one JSON line per exported
+day with its path, row count, time span, size and SHA-256. The last line for a
+(plant, day) wins, so the manifest is only ever appended to. read_day() streams a day
+back for reloading.
+
+A day can gain rows after its export (a gateway backfilling history). Each manifest line
+records a fingerprint of the database rows it was written from (count, time span and an
+order-independent checksum of the (unit_id, timestamp) keys); a day whose rows no longer
+match it is exported again with merge=True, which rewrites the file with the rows already
+in it merged with the database's. Rows found in both are written once, and rows that
+retention has already deleted are kept. A rewrite that changes neither the file nor the
+fingerprint adds no manifest line.
+"""
+
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+
+class ExportIntegrityError(Exception):
+    """Raised when an export file is missing or does not match its manifest entry"""
+
+
+class _Fingerprint:
+    """Row count, time span and an order-independent checksum of (unit_id, timestamp) keys"""
+
+    def __init__(self):
+        self.rows = 0
+        self.first_timestamp = self.last_timestamp = None
+        self.checksum = 0
+
+    def add(self, unit_id, timestamp):
+        key = f"{unit_id}|{timestamp.isoformat(sep=' ')}".encode()
+        # Summed, not chained: rows with equal timestamps may come back in any order
+        self.checksum = (self.checksum + int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')) % 2 ** 64
+        if self.first_timestamp is None or timestamp < self.first_timestamp:
+            self.first_timestamp = timestamp
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+        self.rows += 1
+
+    def track(self, rows):
+        for row in rows:
+            self.add(row.unit_id, row.timestamp)
+            yield row
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'first_timestamp': self.first_timestamp.isoformat(sep=' ') if self.rows else None,
+            'last_timestamp': self.last_timestamp.isoformat(sep=' ') if self.rows else None,
+            'checksum': f"{self.checksum:016x}",
+        }
+
+
+def source_fingerprint(keys):
+    """Fingerprint of a day's database rows from their (unit_id, timestamp) keys, as export_day records it"""
+    fingerprint = _Fingerprint()
+    for unit_id, timestamp in keys:
+        fingerprint.add(unit_id, timestamp)
+    return fingerprint.as_dict()
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TelemetryExport:
+    def __init__(self, directory, columns, compresslevel=6):
+        """
+        directory      -- root of the plant_<id>/ day files and manifest.jsonl
+        columns        -- measurement columns written after unit_id and timestamp
+        compresslevel  -- gzip level; 6 is zlib's default size/speed trade-off
+        """
+        self.directory = directory
+        self.columns = tuple(columns)
+        self.compresslevel = compresslevel
+        self.Row = namedtuple('ExportedRow', ('unit_id', 'timestamp') + self.columns)
+        self._manifest = None
+        self._manifest_size = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def relative_path(self, plant_id, day):
+        return os.path.join(f"plant_{plant_id}", f"{day.isoformat()}.csv.gz")
+
+    # Manifest -----------------------------------------------------------------------
+
+    def manifest(self):
+        """{(plant_id, day): entry}, re-read whenever the file has grown (another process exported)"""
+        try:
+            size = os.path.getsize(self.manifest_path)
+        except FileNotFoundError:
+            return {}
+        if self._manifest is None or size != self._manifest_size:
+            manifest = {}
+            with open(self.manifest_path, encoding='utf-8') as handle:
+                for line in handle:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    manifest[(entry['plant_id'], date.fromisoformat(entry['day']))] = entry
+            self._manifest, self._manifest_size = manifest, size
+        return self._manifest
+
+    def exported(self, plant_id, day):
+        """Manifest entry of an exported day, or None"""
+        return self.manifest().get((plant_id, day))
+
+    def _append_manifest(self, entry):
+        with open(self.manifest_path, 'a', encoding='utf-8') as handle:
+            handle.write(json.dumps(entry, sort_keys=True) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    # Writes -------------------------------------------------------------------------
+
+    def export_day(self, plant_id, day, rows, merge=False):
+        """
+        Write one plant-day from `rows` (an iterable of rows with unit_id, timestamp and
+        the columns, oldest first) and record it in the manifest. With merge=True, the rows
+        of an existing export of the day are merged in. The manifest entry's 'source' is the
+        source_fingerprint() of `rows`. Returns the entry, or None if there were no rows or
+        neither the merged file nor the fingerprint changed (nothing is written).
+        """
+        source = _Fingerprint()
+        rows = source.track(rows)
+        previous = self.exported(plant_id, day) if merge else None
+        if previous is not None:
+            rows = self._merge(rows, self.read_day(plant_id, day))
+
+        relative_path = self.relative_path(plant_id, day)
+        path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        count = 0
+        first_timestamp = last_timestamp = None
+        try:
+            with os.fdopen(descriptor, 'wb') as raw_file:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=raw_file,
+                                   compresslevel=self.compresslevel, mtime=0) as compressed:
+                    with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as text:
+                        writer = csv.writer(text)
+                        writer.writerow(('unit_id', 'timestamp') + self.columns)
+                        for row in rows:
+                            writer.writerow(
+                                [row.unit_id, row.timestamp.isoformat(sep=' ')]
+                                + [self._format(getattr(row, column)) for column in self.columns]
+                            )
+                            if first_timestamp is None:
+                                first_timestamp = row.timestamp
+                            last_timestamp = row.timestamp
+                            count += 1
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+
+            digest = _file_digest(temporary_path)
+            if count == 0 or (previous is not None and digest == previous['sha256']
+                              and previous.get('source') == source.as_dict()):
+                os.unlink(temporary_path)
+                return None
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+
+        entry = {
+            'plant_id': plant_id,
+            'day': day.isoformat(),
+            'path': relative_path,
+            'rows': count,
+            'first_timestamp': first_timestamp.isoformat(sep=' '),
+            'last_timestamp': last_timestamp.isoformat(sep=' '),
+            'bytes': os.path.getsize(path),
+            'sha256': digest,
+            'source': source.as_dict(),
+            'exported_at': datetime.utcnow().isoformat(sep=' ', timespec='seconds'),
+        }
+        self._append_manifest(entry)
+        return entry
+
+    def _merge(self, rows, exported_rows):
+        """Both streams oldest first; a (unit_id, timestamp) present in both is taken from `rows`"""
+        exported_rows = (
+            self.Row(row['unit_id'], row['timestamp'], *(row.get(column) for column in self.columns))
+            for row in exported_rows
+        )
+        current_timestamp = None
+        units = set()
+        for row in heapq.merge(rows, exported_rows, key=lambda row: row.timestamp):
+            if row.timestamp != current_timestamp:
+                current_timestamp = row.timestamp
+                units.clear()
+            if row.unit_id in units:
+                continue
+            units.add(row.unit_id)
+            yield row
+
+    @staticmethod
+    def _format(value):
+        return '' if value is None else repr(value)
+
+    # Reads --------------------------------------------------------------------------
+
+    def verify(self, plant_id, day):
+        """Check an exported day's file against its manifest entry; raises ExportIntegrityError"""
+        entry = self.exported(plant_id, day)
+        if entry is None:
+            raise ExportIntegrityError(f"Plant {plant_id} has no export for {day}")
+        path = os.path.join(self.directory, entry['path'])
+        if not os.path.exists(path):
+            raise ExportIntegrityError(f"{entry['path']} is missing")
+        if _file_digest(path) != entry['sha256']:
+            raise ExportIntegrityError(f"{entry['path']} does not match its SHA-256 in the manifest")
+        return entry
+
+    def read_day(self, plant_id, day, verify=True):
+        """Readings of an exported plant-day as dicts (unit_id, timestamp, columns), oldest first"""
+        entry = self.verify(plant_id, day) if verify else self.exported(plant_id, day)
+        if entry is None:
+            raise ExportIntegrityError(f"Plant {plant_id} has no export for {day}")
+
+        with gzip.open(os.path.join(self.directory, entry['path']), 'rt', encoding='utf-8', newline='') as text:
+            reader = csv.reader(text)
+            header = next(reader)
+            columns = header[2:]
+            for record in reader:
+                row = {
+                    'unit_id': int(record[0]),
+                    'timestamp': datetime.fromisoformat(record[1]),
+                }
+                for column, value in zip(columns, record[2:]):
+                    row[column] = float(value) if value else None
+                yield row
@@ -1,5 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 import pytz
 
-db = SQLAlchemy()
+from storage import RoutingSession
+
+# RoutingSession sends reads to the reader pool when the read/write split is configured
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 colombo_tz = pytz.timezone("Asia/Colombo")
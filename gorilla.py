@@ -0,0 +1,296 @@
+"""
+Gorilla-style column compression for archived telemetry.
+
+A chunk holds one series of readings (one unit-day in the archive) as independent
+column streams, so a reader decodes only the columns it asks for:
+
+    header    8 bytes   magic b"GC", format version (u8), column count (u8), row count (u32)
+    column    name length (u8), name (utf-8), null mode (u8), stream length (u32), stream
+
+The first column is always 'timestamp' (epoch milliseconds, never null), encoded as
+delta-of-delta: a 64-bit first value, then per reading a variable-length prefix code
+
+    0                          delta unchanged
+    10   + 7 bits              delta-of-delta in [-63, 64]
+    110  + 9 bits              [-255, 256]
+    1110 + 12 bits             [-2047, 2048]
+    1111 + 64 bits             anything else
+
+Value columns are float64, XOR-encoded against the previous value: a 64-bit first value,
+then '0' for an identical value, '10' + the meaningful bits when they fit the previous
+leading/trailing-zero window, or '11' + 5 bits leading zeros + 6 bits (length - 1) + the
+meaningful bits. Slowly changing sensor values cost a few bits each.
+
+Null mode 0: no nulls. 1: a presence bit per row precedes the values of the present rows.
+2: every row is null (empty stream).
+"""
+
+import struct
+
+MAGIC = b"GC"
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct(">2sBBI")
+COLUMN_HEADER = struct.Struct(">BI")
+
+NO_NULLS = 0
+HAS_NULLS = 1
+ALL_NULL = 2
+
+_MASK64 = (1 << 64) - 1
+
+
+class GorillaFormatError(ValueError):
+    """Raised when a chunk is truncated or not in this format"""
+
+
+class BitWriter:
+    def __init__(self):
+        self._buffer = bytearray()
+        self._acc = 0
+        self._bits = 0
+
+    def write(self, value, width):
+        self._acc = (self._acc << width) | value
+        self._bits += width
+        if self._bits >= 64:
+            spare = self._bits & 7
+            self._buffer += (self._acc >> spare).to_bytes(self._bits >> 3, 'big')
+            self._acc &= (1 << spare) - 1
+            self._bits = spare
+
+    def getvalue(self):
+        if self._bits:
+            pad = -self._bits & 7
+            return bytes(self._buffer + (self._acc << pad).to_bytes((self._bits + pad) >> 3, 'big'))
+        return bytes(self._buffer)
+
+
+class BitReader:
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+        self._acc = 0
+        self._bits = 0
+
+    def read(self, width):
+        while self._bits < width:
+            chunk = self._data[self._offset:self._offset + 8]
+            if not chunk:
+                raise GorillaFormatError("Stream truncated")
+            self._offset += len(chunk)
+            self._acc = (self._acc << (len(chunk) << 3)) | int.from_bytes(chunk, 'big')
+            self._bits += len(chunk) << 3
+        self._bits -= width
+        value = self._acc >> self._bits
+        self._acc &= (1 << self._bits) - 1
+        return value
+
+
+# Timestamps ---------------------------------------------------------------------------
+
+def encode_timestamps(timestamps):
+    writer = BitWriter()
+    if not timestamps:
+        return writer.getvalue()
+
+    previous = timestamps[0]
+    previous_delta = 0
+    writer.write(previous & _MASK64, 64)
+    for timestamp in timestamps[1:]:
+        delta = timestamp - previous
+        dod = delta - previous_delta
+        if dod == 0:
+            writer.write(0, 1)
+        elif -63 <= dod <= 64:
+            writer.write(0b10, 2)
+            writer.write(dod + 63, 7)
+        elif -255 <= dod <= 256:
+            writer.write(0b110, 3)
+            writer.write(dod + 255, 9)
+        elif -2047 <= dod <= 2048:
+            writer.write(0b1110, 4)
+            writer.write(dod + 2047, 12)
+        else:
+            writer.write(0b1111, 4)
+            writer.write(dod & _MASK64, 64)
+        previous = timestamp
+        previous_delta = delta
+    return writer.getvalue()
+
+
+def _signed64(value):
+    return value - (1 << 64) if value >> 63 else value
+
+
+def decode_timestamps(stream, count):
+    if not count:
+        return []
+    reader = BitReader(stream)
+    read = reader.read
+
+    previous = _signed64(read(64))
+    previous_delta = 0
+    timestamps = [previous]
+    for _ in range(count - 1):
+        if read(1):
+            if not read(1):
+                previous_delta += read(7) - 63
+            elif not read(1):
+                previous_delta += read(9) - 255
+            elif not read(1):
+                previous_delta += read(12) - 2047
+            else:
+                previous_delta += _signed64(read(64))
+        previous += previous_delta
+        timestamps.append(previous)
+    return timestamps
+
+
+# Floats -------------------------------------------------------------------------------
+
+def encode_floats(values):
+    writer = BitWriter()
+    if not values:
+        return writer.getvalue()
+
+    words = struct.unpack(f">{len(values)}Q", struct.pack(f">{len(values)}d", *values))
+    previous = words[0]
+    writer.write(previous, 64)
+    window_leading = window_trailing = -1
+    for word in words[1:]:
+        xor = word ^ previous
+        previous = word
+        if not xor:
+            writer.write(0, 1)
+            continue
+
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if window_leading >= 0 and leading >= window_leading and trailing >= window_trailing:
+            writer.write(0b10, 2)
+            writer.write(xor >> window_trailing, 64 - window_leading - window_trailing)
+        else:
+            meaningful = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(meaningful - 1, 6)
+            writer.write(xor >> trailing, meaningful)
+            window_leading, window_trailing = leading, trailing
+    return writer.getvalue()
+
+
+def decode_floats(stream, count):
+    if not count:
+        return []
+    reader = BitReader(stream)
+    read = reader.read
+
+    previous = read(64)
+    words = [previous]
+    window_trailing = window_meaningful = 0
+    for _ in range(count - 1):
+        if read(1):
+            if read(1):
+                leading = read(5)
+                window_meaningful = read(6) + 1
+                window_trailing = 64 - leading - window_meaningful
+            previous ^= read(window_meaningful) << window_trailing
+        words.append(previous)
+    return list(struct.unpack(f">{count}d", struct.pack(f">{count}Q", *words)))
+
+
+# Chunks -------------------------------------------------------------------------------
+
+def _encode_column(values):
+    present = [value for value in values if value is not None]
+    if not present:
+        return ALL_NULL, b""
+    if len(present) == len(values):
+        return NO_NULLS, encode_floats([float(value) for value in values])
+
+    writer = BitWriter()
+    for value in values:
+        writer.write(value is not None, 1)
+    bitmap = writer.getvalue()
+    return HAS_NULLS, bitmap + encode_floats([float(value) for value in present])
+
+
+def _decode_column(mode, stream, count):
+    if mode == ALL_NULL:
+        return [None] * count
+    if mode == NO_NULLS:
+        return decode_floats(stream, count)
+    if mode != HAS_NULLS:
+        raise GorillaFormatError(f"Unknown null mode {mode}")
+
+    bitmap_length = (count + 7) >> 3
+    bitmap = int.from_bytes(stream[:bitmap_length], 'big') >> (-count & 7)
+    flags = [(bitmap >> (count - 1 - row)) & 1 for row in range(count)]
+    present = iter(decode_floats(stream[bitmap_length:], sum(flags)))
+    return [next(present) if flag else None for flag in flags]
+
+
+def encode_chunk(timestamps, columns):
+    """
+    timestamps  -- epoch milliseconds (ints), one per reading
+    columns     -- {name: [float or None, ...]} with one value per reading
+    Returns the chunk bytes.
+    """
+    count = len(timestamps)
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(columns) + 1, count)]
+
+    streams = [('timestamp', NO_NULLS, encode_timestamps(timestamps))]
+    for name, values in columns.items():
+        if len(values) != count:
+            raise ValueError(f"Column {name} has {len(values)} values for {count} timestamps")
+        streams.append((name, *_encode_column(values)))
+
+    for name, mode, stream in streams:
+        encoded_name = name.encode('utf-8')
+        parts.append(bytes([len(encoded_name)]) + encoded_name)
+        parts.append(COLUMN_HEADER.pack(mode, len(stream)))
+        parts.append(stream)
+    return b"".join(parts)
+
+
+def decode_chunk(chunk, columns=None):
+    """
+    Decode a chunk into (timestamps, {name: values}). With `columns`, only those value
+    columns are decoded (unknown names are ignored); the others are skipped unread.
+    """
+    view = memoryview(chunk)
+    if len(view) < HEADER.size:
+        raise GorillaFormatError("Chunk shorter than header")
+    magic, version, column_count, count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise GorillaFormatError("Bad magic")
+    if version != FORMAT_VERSION:
+        raise GorillaFormatError(f"Unsupported format version {version}")
+
+    wanted = None if columns is None else set(columns)
+    offset = HEADER.size
+    timestamps = None
+    values = {}
+    for _ in range(column_count):
+        try:
+            name_length = view[offset]
+            name = bytes(view[offset + 1:offset + 1 + name_length]).decode('utf-8')
+            offset += 1 + name_length
+            mode, length = COLUMN_HEADER.unpack_from(view, offset)
+        except (IndexError, struct.error):
+            raise GorillaFormatError("Chunk truncated")
+        offset += COLUMN_HEADER.size
+        stream = view[offset:offset + length]
+        if len(stream) != length:
+            raise GorillaFormatError("Chunk truncated")
+        offset += length
+
+        if timestamps is None:
+            if name != 'timestamp':
+                raise GorillaFormatError("First column must be 'timestamp'")
+            timestamps = decode_timestamps(stream, count)
+        elif wanted is None or name in wanted:
+            values[name] = _decode_column(mode, stream, count)
+
+    return timestamps or [], values
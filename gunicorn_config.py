@@ -1,2 +1,16 @@
 bind = "0.0.0.0:80"
 workers = 2
+
+def post_worker_init(worker):
+    # Background jobs run only in serving workers, never in processes that merely import the app
+    import sys
+    app_module = sys.modules.get("app07")
+    if app_module is not None:
+        app_module.start_background_jobs()
+
+def worker_exit(server, worker):
+    # Commit rows still sitting in the write-behind ingest queue before the worker goes away
+    import sys
+    app_module = sys.modules.get("app07")
+    if app_module is not None:
+        app_module.ingest_queue.stop()
@@ -0,0 +1,281 @@
+"""
+Write-behind ingestion queue with group commit.
+
+/data pushes parsed rows here and returns immediately; a single flusher thread
+drains everything queued within the last flush interval (or up to max_batch_rows)
+and hands it to the storage function as one batch, so many requests share one commit.
+
+The rows were already acknowledged with 202, so a batch that fails to commit is not
+dropped: the flusher retries it with exponential backoff (new rows keep queueing and
+/data turns to 503 once the queue is full). A batch that still fails after the last
+attempt, that is pending at shutdown while the database is failing, or that is still
+queued when stop() times out waiting for the flusher, is appended to a spill file
+(one JSON batch per line) in spill_dir. On start the flusher commits spill files left
+by any worker before it takes new rows; it claims each file with a rename, so two
+workers never replay the same file. Rows are dropped only when there is
+no spill_dir or the spill write fails, and that is logged as an error.
+"""
+
+import fcntl
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+
+SPILL_SUFFIX = '.jsonl'
+REPLAY_SUFFIX = '.replaying'
+
+
+class IngestQueueFull(Exception):
+    """Raised when the queue is at capacity and the request should be retried later"""
+
+
+class IngestQueue:
+    def __init__(self, store, max_rows=10000, flush_interval=0.05, max_batch_rows=500,
+                 max_attempts=5, retry_delay=0.5, max_retry_delay=30.0, spill_dir=None):
+        """
+        store            -- callable taking {plant_id: [row, ...]} and committing it in one transaction
+        max_rows         -- bound on queued rows; put() raises IngestQueueFull above it
+        flush_interval   -- seconds to wait for more rows before committing a batch
+        max_batch_rows   -- commit as soon as this many rows are collected
+        max_attempts     -- commits tried per batch before it is spilled
+        retry_delay      -- seconds before the first retry, doubled after each failure...
+        max_retry_delay  -- ...up to this
+        spill_dir        -- directory for batches that could not be committed (None: drop them)
+        """
+        self.store = store
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.max_batch_rows = max_batch_rows
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.spill_dir = spill_dir
+        self.spill_path = None
+        if spill_dir is not None:
+            self.spill_path = os.path.join(spill_dir, f"spill-{socket.gethostname()}-{os.getpid()}{SPILL_SUFFIX}")
+
+        self._queue = queue.Queue()
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Counters for monitoring
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.retried_batches = 0
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        self.failed_rows = 0      # dropped: no spill_dir, or the spill write failed
+
+    @property
+    def pending_rows(self):
+        return self._pending_rows
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        if self.spill_dir is not None:
+            # After a fork the worker needs its own spill file
+            self.spill_path = os.path.join(self.spill_dir, f"spill-{socket.gethostname()}-{os.getpid()}{SPILL_SUFFIX}")
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+
+    def put(self, rows_by_plant):
+        """Queue one request's rows; returns the number of rows accepted"""
+        row_count = sum(len(rows) for rows in rows_by_plant.values())
+        if row_count == 0:
+            return 0
+
+        with self._lock:
+            if self._pending_rows + row_count > self.max_rows:
+                raise IngestQueueFull(f"Ingest queue full ({self._pending_rows} rows pending)")
+            self._pending_rows += row_count
+
+        self._queue.put((rows_by_plant, row_count))
+        return row_count
+
+    def stop(self, timeout=10):
+        """Stop the flusher and commit everything still queued (graceful shutdown)"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still inside a commit: don't race it, spill whatever it has not taken yet
+                self._spill_pending()
+                return
+            self._thread = None
+        # The flusher never started: commit what is queued from the caller's thread
+        while not self._queue.empty():
+            self._flush(self._drain(block=False))
+
+    def _drain(self, block=True):
+        """Collect queued items until the batch is full or the flush interval expires"""
+        batch = {}
+        batch_rows = 0
+        deadline = time.monotonic() + self.flush_interval
+
+        while batch_rows < self.max_batch_rows:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    rows_by_plant, row_count = self._queue.get(timeout=timeout)
+                else:
+                    rows_by_plant, row_count = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            for plant_id, rows in rows_by_plant.items():
+                batch.setdefault(plant_id, []).extend(rows)
+            batch_rows += row_count
+
+        return batch
+
+    def _flush(self, batch):
+        row_count = sum(len(rows) for rows in batch.values())
+        if row_count == 0:
+            return
+
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    self.store(batch)
+                except Exception as e:
+                    print(f"[{datetime.now()}] Error flushing ingest batch ({row_count} rows, "
+                          f"attempt {attempt}/{self.max_attempts}): {str(e)}")
+                    if attempt == self.max_attempts:
+                        break
+                    self.retried_batches += 1
+                    delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempt - 1))
+                    # Shutting down: don't hold the worker up, spill what is left
+                    if self._stop_event.wait(delay):
+                        break
+                else:
+                    self.flushed_rows += row_count
+                    self.flushed_batches += 1
+                    return
+            self._spill(batch, row_count)
+        finally:
+            with self._lock:
+                self._pending_rows -= row_count
+
+    # Spill files ----------------------------------------------------------------------
+
+    def _spill_pending(self):
+        """Spill everything still queued; the lock holds off put() until the queue is empty"""
+        with self._lock:
+            while True:
+                batch = self._drain(block=False)
+                row_count = sum(len(rows) for rows in batch.values())
+                if row_count == 0:
+                    return
+                self._spill(batch, row_count)
+                self._pending_rows -= row_count
+
+    def _spill(self, batch, row_count):
+        if self.spill_path is None:
+            self.failed_rows += row_count
+            print(f"[{datetime.now()}] ERROR: dropped {row_count} acknowledged ingest rows (no spill directory)")
+            return
+
+        line = json.dumps({str(plant_id): rows for plant_id, rows in batch.items()}, default=_encode_value)
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            while True:
+                handle = open(self.spill_path, 'a', encoding='utf-8')
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                # A replaying worker may have renamed the file between our open and flock
+                try:
+                    same_file = os.fstat(handle.fileno()).st_ino == os.stat(self.spill_path).st_ino
+                except FileNotFoundError:
+                    same_file = False
+                if same_file:
+                    break
+                handle.close()
+            with handle:
+                handle.write(line + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+        except Exception as e:
+            self.failed_rows += row_count
+            print(f"[{datetime.now()}] ERROR: dropped {row_count} acknowledged ingest rows, "
+                  f"spill to {self.spill_path} failed: {str(e)}")
+            return
+
+        self.spilled_rows += row_count
+        print(f"[{datetime.now()}] ERROR: spilled {row_count} ingest rows to {self.spill_path}; "
+              f"they are committed when a flusher next starts")
+
+    def replay_spills(self):
+        """
+        Commit every batch in the spill files (ours and other workers'); called by the
+        flusher before it takes new rows. A file whose batches fail to commit is put back.
+        """
+        if self.spill_dir is None or not os.path.isdir(self.spill_dir):
+            return
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith(SPILL_SUFFIX):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            claimed = path + REPLAY_SUFFIX
+            with open(path, 'a') as handle:
+                # Wait out a spill in progress, then claim the file; a loser of the rename race skips it
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    os.rename(path, claimed)
+                except FileNotFoundError:
+                    continue
+            self._replay_file(claimed, path)
+
+    def _replay_file(self, claimed, path):
+        with open(claimed, encoding='utf-8') as handle:
+            lines = [line for line in handle if line.strip()]
+        for index, line in enumerate(lines):
+            batch = {
+                int(plant_id): [_decode_row(row) for row in rows]
+                for plant_id, rows in json.loads(line).items()
+            }
+            row_count = sum(len(rows) for rows in batch.values())
+            try:
+                self.store(batch)
+            except Exception as e:
+                # Keep this batch and the rest for the next start
+                print(f"[{datetime.now()}] Error replaying ingest spill {claimed}: {str(e)}")
+                with open(path, 'a', encoding='utf-8') as rest:
+                    fcntl.flock(rest, fcntl.LOCK_EX)
+                    rest.writelines(lines[index:])
+                    rest.flush()
+                    os.fsync(rest.fileno())
+                break
+            self.replayed_rows += row_count
+        else:
+            print(f"✓ Replayed ingest spill {os.path.basename(path)} ({len(lines)} batches)")
+        os.unlink(claimed)
+
+    def _run(self):
+        try:
+            self.replay_spills()
+        except Exception as e:
+            print(f"[{datetime.now()}] Error replaying ingest spills: {str(e)}")
+        while not self._stop_event.is_set():
+            self._flush(self._drain())
+        # Stopping: commit what was queued before stop() (a failing batch spills at once)
+        while not self._queue.empty():
+            self._flush(self._drain(block=False))
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot spill {type(value).__name__} values")
+
+
+def _decode_row(row):
+    if row.get('timestamp') is not None:
+        row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return row
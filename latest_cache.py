@@ -0,0 +1,109 @@
+"""
+In-process cache of every unit's latest reading for the snapshot views.
+
+The dashboards poll every few seconds from every open tab, and each poll wants the
+newest reading of each unit. With this cache those polls are answered from a dict.
+The ingest path updates it after each commit, so rows stored by this worker show up
+at once. Rows stored by other gunicorn workers arrive through a reload from the shared
+store (unit_state, the ring buffer or telemetry), at most once per refresh interval.
+The database work per worker is then fixed by that interval and no longer grows with
+the number of browser tabs.
+
+A reload never replaces a reading with an older one, so a reload that raced with an
+ingest commit cannot roll a unit back.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+
+class LatestReadingCache:
+    def __init__(self, load, columns, refresh_interval=1.0):
+        """
+        load              -- callable returning {(plant_id, unit_id): reading} from the shared
+                             store; readings need a timestamp and the measurement columns
+        columns           -- measurement columns kept per reading
+        refresh_interval  -- seconds a reload stays fresh before the next read triggers another
+        """
+        self.load = load
+        self.columns = tuple(columns)
+        self.refresh_interval = refresh_interval
+        self.Reading = namedtuple('LatestReading', ('plant_id', 'unit_id', 'timestamp') + self.columns)
+
+        self._plants = {}              # {plant_id: {unit_id: Reading}}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = None
+
+        # Counters for monitoring
+        self.reads = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @property
+    def unit_count(self):
+        return sum(len(units) for units in self._plants.values())
+
+    def _put(self, plant_id, unit_id, timestamp, values):
+        units = self._plants.setdefault(plant_id, {})
+        current = units.get(unit_id)
+        if current is None or timestamp >= current.timestamp:
+            units[unit_id] = self.Reading(plant_id, unit_id, timestamp, *values)
+
+    # Writes -------------------------------------------------------------------------
+
+    def update(self, plant_id, rows):
+        """Take committed ingest rows (dicts with unit_id, timestamp and the columns)"""
+        with self._lock:
+            for row in rows:
+                self._put(plant_id, row['unit_id'], row['timestamp'],
+                          [row.get(column) for column in self.columns])
+
+    def refresh(self):
+        """Reload from the shared store now; call inside an app context"""
+        loaded = self.load()
+        with self._lock:
+            for (plant_id, unit_id), reading in loaded.items():
+                self._put(plant_id, unit_id, reading.timestamp,
+                          [getattr(reading, column) for column in self.columns])
+        self._refreshed_at = time.monotonic()
+        self.refreshes += 1
+
+    def _refresh_if_stale(self):
+        if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        # One thread reloads; the others answer from what is cached meanwhile
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            self.refresh_errors += 1
+            self._refreshed_at = time.monotonic()   # retry after an interval, not on every read
+            print(f"Error refreshing latest-reading cache: {str(e)}")
+        finally:
+            self._refresh_lock.release()
+
+    # Reads --------------------------------------------------------------------------
+
+    def plant(self, plant_id, since):
+        """{unit_id: latest reading at or after `since`} for one plant"""
+        self._refresh_if_stale()
+        self.reads += 1
+        return {
+            unit_id: reading
+            for unit_id, reading in list(self._plants.get(plant_id, {}).items())
+            if reading.timestamp >= since
+        }
+
+    def fleet(self, since):
+        """{(plant_id, unit_id): latest reading at or after `since`} for every cached unit"""
+        self._refresh_if_stale()
+        self.reads += 1
+        return {
+            (plant_id, unit_id): reading
+            for plant_id, units in list(self._plants.items())
+            for unit_id, reading in list(units.items())
+            if reading.timestamp >= since
+        }
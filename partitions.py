@@ -0,0 +1,235 @@
+"""
+Daily time partitions for plant telemetry.
+
+With partitioning enabled, plant_<NAME>_data is only the template: readings are stored in
+one table per plant per UTC day, plant_<NAME>_data_YYYYMMDD, with the same columns and
+indexes. Inserts are routed to the partition of each row's timestamp, range queries only
+touch partitions overlapping the range (partition pruning), and retention drops whole
+partitions instead of deleting rows one by one.
+
+Executors are anything with .execute() (a Session or Connection). Partition DDL goes
+through session.connection(), i.e. the writer.
+"""
+
+import threading
+from datetime import datetime, timedelta, time as dt_time
+
+import sqlalchemy as sa
+
+SQLITE_MASTER = sa.table('sqlite_master', sa.column('type'), sa.column('name'))
+
+
+class TelemetryPartitions:
+    def __init__(self, base_tables, index_columns):
+        """
+        base_tables    -- {plant_id: Table} template tables (plant_<NAME>_data)
+        index_columns  -- ((name suffix, (column, ...)), ...) indexes created on every partition
+        """
+        self.base_tables = base_tables
+        self.index_columns = index_columns
+        self.metadata = sa.MetaData()
+
+        self._tables = {}         # (plant_id, day) -> Table object
+        self._existing = set()    # (plant_id, day) known to exist in the database
+        self._schema_version = None   # PRAGMA schema_version _existing was built under
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def day_of(timestamp):
+        return timestamp.date()
+
+    def partition_name(self, plant_id, day):
+        return f"{self.base_tables[plant_id].name}_{day:%Y%m%d}"
+
+    def table(self, plant_id, day):
+        """Table object for a partition (it may not exist in the database yet)"""
+        key = (plant_id, day)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                base = self.base_tables[plant_id]
+                name = self.partition_name(plant_id, day)
+                columns = [
+                    sa.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                    for column in base.columns
+                ]
+                indexes = [
+                    sa.Index(f"ix_{name}_{suffix}", *index_columns)
+                    for suffix, index_columns in self.index_columns
+                ]
+                table = self._tables[key] = sa.Table(name, self.metadata, *columns, *indexes)
+            return table
+
+    # Discovery ----------------------------------------------------------------------
+
+    def _revalidate(self, executor):
+        """
+        Forget the known partitions once the schema changed: another worker's retention
+        may have dropped some. SQLite bumps schema_version on every CREATE and DROP.
+        """
+        version = executor.execute(sa.text("PRAGMA schema_version")).scalar()
+        with self._lock:
+            if version != self._schema_version:
+                self._existing.clear()
+                self._schema_version = version
+
+    def existing_days(self, executor, plant_id, days):
+        """
+        Subset of `days` whose partition exists. Known partitions are cached; unknown
+        ones are looked up in sqlite_master (another worker may have created them).
+        """
+        self._revalidate(executor)
+        days = list(days)
+        missing = [day for day in days if (plant_id, day) not in self._existing]
+        if missing:
+            names = {self.partition_name(plant_id, day): day for day in missing}
+            found = executor.execute(
+                sa.select(SQLITE_MASTER.c.name)
+                .where(SQLITE_MASTER.c.type == 'table')
+                .where(SQLITE_MASTER.c.name.in_(list(names)))
+            ).scalars()
+            for name in found:
+                self._existing.add((plant_id, names[name]))
+        return [day for day in days if (plant_id, day) in self._existing]
+
+    def all_days(self, executor, plant_id):
+        """Every partition day of a plant currently in the database, oldest first"""
+        prefix = f"{self.base_tables[plant_id].name}_"
+        days = []
+        names = executor.execute(
+            sa.select(SQLITE_MASTER.c.name)
+            .where(SQLITE_MASTER.c.type == 'table')
+            .where(SQLITE_MASTER.c.name.like(f"{prefix}%"))
+        ).scalars()
+        for name in names:
+            suffix = name[len(prefix):]
+            if len(suffix) != 8 or not suffix.isdigit():
+                continue
+            day = datetime.strptime(suffix, "%Y%m%d").date()
+            self._existing.add((plant_id, day))
+            days.append(day)
+        return sorted(days)
+
+    def ensure(self, session, plant_id, day):
+        """Create the partition for (plant_id, day) if needed; returns its Table"""
+        table = self.table(plant_id, day)
+        self._revalidate(session)
+        if (plant_id, day) not in self._existing:
+            connection = session.connection()
+            try:
+                table.create(connection, checkfirst=True)
+            except sa.exc.OperationalError as e:
+                # Another worker created it between the check and the CREATE
+                if 'already exists' not in str(e):
+                    raise
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+            self._existing.add((plant_id, day))
+        return table
+
+    # Writes -------------------------------------------------------------------------
+
+    def insert(self, session, plant_id, rows, returning=False):
+        """
+        Insert rows into their day partitions (one executemany per partition).
+        Returns the new ids in row order when returning=True, otherwise the row count.
+        """
+        by_day = {}
+        for position, row in enumerate(rows):
+            by_day.setdefault(self.day_of(row['timestamp']), []).append(position)
+
+        ids = [None] * len(rows)
+        for day, positions in by_day.items():
+            table = self.ensure(session, plant_id, day)
+            day_rows = [rows[position] for position in positions]
+            if returning:
+                result = session.execute(
+                    table.insert().returning(table.c.id, sort_by_parameter_order=True),
+                    day_rows
+                )
+                for position, record_id in zip(positions, result.scalars()):
+                    ids[position] = record_id
+            else:
+                session.execute(table.insert(), day_rows)
+
+        return ids if returning else len(rows)
+
+    # Reads --------------------------------------------------------------------------
+
+    def days_between(self, start, end):
+        day = start.date()
+        while day <= end.date():
+            yield day
+            day += timedelta(days=1)
+
+    def select_range(self, executor, plant_id, start, end=None, unit_id=None):
+        """
+        Statement selecting a plant's readings with start <= timestamp (< end), oldest
+        first, touching only the partitions that overlap the range. None if there are none.
+        """
+        if end is None:
+            end = datetime.utcnow()
+
+        selects = []
+        for day in self.existing_days(executor, plant_id, self.days_between(start, end)):
+            table = self.table(plant_id, day)
+            query = sa.select(table)
+            # Bounds are only needed on the partitions the range cuts through
+            if day == start.date():
+                query = query.where(table.c.timestamp >= start)
+            if day == end.date():
+                query = query.where(table.c.timestamp < end)
+            if unit_id is not None:
+                query = query.where(table.c.unit_id == unit_id)
+            selects.append(query)
+
+        if not selects:
+            return None
+        if len(selects) == 1:
+            return selects[0].order_by(selects[0].selected_columns.timestamp.asc())
+        return sa.union_all(*selects).order_by(sa.literal_column('timestamp').asc())
+
+    def rows_since(self, executor, plant_id, start):
+        statement = self.select_range(executor, plant_id, start, datetime.utcnow() + timedelta(days=1))
+        if statement is None:
+            return []
+        return executor.execute(statement).all()
+
+    def latest(self, executor, plant_id, unit_id, since):
+        """Most recent reading of a unit at or after `since`, newest partition first"""
+        days = self.existing_days(executor, plant_id, self.days_between(since, datetime.utcnow()))
+        for day in reversed(days):
+            table = self.table(plant_id, day)
+            row = executor.execute(
+                sa.select(table)
+                .where(table.c.unit_id == unit_id)
+                .where(table.c.timestamp >= since)
+                .order_by(table.c.timestamp.desc())
+                .limit(1)
+            ).first()
+            if row is not None:
+                return row
+        return None
+
+    # Retention ----------------------------------------------------------------------
+
+    def drop_before(self, session, plant_id, cutoff):
+        """
+        Enforce retention: drop every partition entirely older than cutoff (constant
+        time per partition) and trim the one partition the cutoff falls inside.
+        Returns (dropped partition names, rows deleted from the boundary partition).
+        """
+        dropped = []
+        for day in self.all_days(session, plant_id):
+            if day < cutoff.date():
+                table = self.table(plant_id, day)
+                table.drop(session.connection(), checkfirst=True)
+                self._existing.discard((plant_id, day))
+                dropped.append(table.name)
+
+        trimmed = 0
+        if self.existing_days(session, plant_id, [cutoff.date()]) and cutoff.time() != dt_time(0):
+            table = self.table(plant_id, cutoff.date())
+            trimmed = session.execute(table.delete().where(table.c.timestamp < cutoff)).rowcount
+
+        return dropped, trimmed
@@ -0,0 +1,210 @@
+"""
+Chunked, time-budgeted deletion of expired telemetry.
+
+A single DELETE of every expired row holds SQLite's write lock for as long as it runs,
+and ingest waits behind it. The retention engine deletes the oldest expired rows in
+chunks instead: each chunk is one short transaction that removes the rows up to the
+timestamp of the N-th oldest expired row (an index range, so it never scans the table),
+then commits and sleeps briefly so waiting writers get the lock. N adapts so a chunk
+takes about `time_budget` seconds: halved after a slow chunk, doubled after a fast one.
+
+Deleted rows leave free pages inside the file. With auto_vacuum=INCREMENTAL (set on new
+databases by storage.py; existing ones need a one-off VACUUM) reclaim() hands them back
+to the filesystem with PRAGMA incremental_vacuum, also in bounded steps.
+
+How long each plant keeps each resolution tier (raw readings, the 1m/15m/1h rollups and
+the compressed archive) comes from RetentionPolicies: configured defaults, per-plant
+overrides from the config, and rows of the retention_policy table on top of both.
+"""
+
+import time
+from datetime import timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extension import db
+
+RETENTION_TIERS = ('raw', '1m', '15m', '1h', 'archive')
+
+# plant_id of the fleet-wide overrides
+ALL_PLANTS = 0
+
+# Overrides set at runtime ('flask --app app07 set-retention'); plant_id 0 applies to every
+# plant, days NULL keeps the tier forever. A plant's own row wins over the fleet-wide one.
+RETENTION_POLICY_TABLE = db.Table(
+    'retention_policy',
+    sa.Column('plant_id', sa.Integer, primary_key=True),
+    sa.Column('tier', sa.String(16), primary_key=True),
+    sa.Column('days', sa.Integer, nullable=True),
+)
+
+
+def validate_retention(tier, days):
+    if tier not in RETENTION_TIERS:
+        raise ValueError(f"Unknown retention tier {tier!r} (expected one of {', '.join(RETENTION_TIERS)})")
+    if days is None:
+        if tier == 'raw':
+            raise ValueError("Raw telemetry needs a retention period")
+    elif not isinstance(days, int) or days < 1:
+        raise ValueError(f"Retention of {tier} must be a whole number of days >= 1, or None to keep it")
+
+
+class RetentionPolicies:
+    def __init__(self, default, plants=None, refresh_interval=60.0):
+        """
+        default           -- {tier: days or None} for every plant; must cover RETENTION_TIERS
+        plants            -- {plant_id: {tier: days or None}} configured per-plant overrides
+        refresh_interval  -- seconds a loaded copy of retention_policy is reused by readers
+        """
+        missing = [tier for tier in RETENTION_TIERS if tier not in default]
+        if missing:
+            raise ValueError(f"Retention policy has no period for {', '.join(missing)}")
+        for policy in [default] + list((plants or {}).values()):
+            for tier, days in policy.items():
+                validate_retention(tier, days)
+        self.default = dict(default)
+        self.plants = {plant_id: dict(policy) for plant_id, policy in (plants or {}).items()}
+        self.refresh_interval = refresh_interval
+        self._stored = {}
+        self._loaded_at = None
+
+    def load(self, executor):
+        """Re-read the retention_policy table"""
+        stored = {}
+        for row in executor.execute(sa.select(RETENTION_POLICY_TABLE)):
+            stored.setdefault(row.plant_id, {})[row.tier] = row.days
+        self._stored = stored
+        self._loaded_at = time.monotonic()
+
+    def _refresh(self, executor):
+        if executor is not None and (self._loaded_at is None
+                                     or time.monotonic() - self._loaded_at >= self.refresh_interval):
+            self.load(executor)
+
+    def policy(self, plant_id, executor=None):
+        """{tier: days or None} in force for the plant"""
+        self._refresh(executor)
+        policy = dict(self.default)
+        for layer in (self.plants.get(plant_id), self._stored.get(ALL_PLANTS), self._stored.get(plant_id)):
+            policy.update(layer or {})
+        return policy
+
+    def cutoff(self, plant_id, tier, now, executor=None):
+        """Oldest timestamp the plant keeps in `tier`, or None if the tier is kept forever"""
+        days = self.policy(plant_id, executor)[tier]
+        return None if days is None else now - timedelta(days=days)
+
+    def set(self, session, plant_id, tier, days):
+        """Store an override (plant_id ALL_PLANTS for every plant) and commit it"""
+        validate_retention(tier, days)
+        statement = sqlite_insert(RETENTION_POLICY_TABLE).values(plant_id=plant_id, tier=tier, days=days)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['plant_id', 'tier'], set_={'days': statement.excluded.days}
+        ))
+        session.commit()
+        self.load(session)
+
+    def clear(self, session, plant_id, tier):
+        """Drop a stored override so the configured period applies again; returns True if one existed"""
+        removed = session.execute(
+            RETENTION_POLICY_TABLE.delete()
+            .where(RETENTION_POLICY_TABLE.c.plant_id == plant_id)
+            .where(RETENTION_POLICY_TABLE.c.tier == tier)
+        ).rowcount
+        session.commit()
+        self.load(session)
+        return bool(removed)
+
+
+class RetentionEngine:
+    def __init__(self, chunk_rows=5000, time_budget=0.25, pause=0.05,
+                 min_chunk_rows=500, max_chunk_rows=100000, report=print, report_every=10.0):
+        """
+        chunk_rows      -- rows deleted by the first chunk of each purge
+        time_budget     -- target seconds per chunk (the longest ingest should wait)
+        pause           -- seconds slept between chunks
+        report          -- called with a progress line at most every `report_every` seconds
+        """
+        self.chunk_rows = chunk_rows
+        self.time_budget = time_budget
+        self.pause = pause
+        self.min_chunk_rows = min_chunk_rows
+        self.max_chunk_rows = max_chunk_rows
+        self.report = report
+        self.report_every = report_every
+
+    def purge(self, session, table, cutoff, *criteria, column='timestamp', label=None):
+        """
+        Delete rows of `table` with column < cutoff (and matching `criteria`), oldest
+        first, committing after every chunk. Returns the number of rows deleted.
+        """
+        column = table.c[column]
+        label = label or table.name
+        expired = sa.and_(column < cutoff, *criteria)
+        chunk_rows = self.chunk_rows
+        deleted = chunks = 0
+        started = last_report = time.monotonic()
+
+        while True:
+            # Upper edge of this chunk: the timestamp of the chunk_rows-th oldest expired row
+            boundary = session.execute(
+                sa.select(column).where(expired).order_by(column).offset(chunk_rows - 1).limit(1)
+            ).scalar()
+
+            chunk_started = time.monotonic()
+            if boundary is None:
+                # Fewer than chunk_rows left: the final chunk takes the rest
+                count = session.execute(table.delete().where(expired)).rowcount
+            else:
+                count = session.execute(table.delete().where(expired).where(column <= boundary)).rowcount
+            session.commit()
+            elapsed = time.monotonic() - chunk_started
+
+            deleted += count
+            chunks += 1
+            if boundary is None:
+                break
+
+            if elapsed > self.time_budget:
+                chunk_rows = max(self.min_chunk_rows, chunk_rows // 2)
+            elif elapsed < self.time_budget / 2:
+                chunk_rows = min(self.max_chunk_rows, chunk_rows * 2)
+
+            now = time.monotonic()
+            if now - last_report >= self.report_every:
+                self.report(f"    … {label}: {deleted} deleted in {chunks} chunks "
+                            f"({deleted / (now - started):.0f} rows/s, chunk {chunk_rows} rows)")
+                last_report = now
+            time.sleep(self.pause)
+
+        return deleted
+
+    def reclaim(self, engine, pages_per_step=2000, label=None):
+        """
+        Return free pages to the filesystem in steps of `pages_per_step`, releasing the
+        connection between steps. Returns the number of pages freed, or None if the
+        database is not in incremental auto_vacuum mode.
+        """
+        freed = 0
+        while True:
+            with engine.connect() as connection:
+                if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+                    return None
+                free = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+                if free:
+                    # incremental_vacuum frees one page per step of the statement and pysqlite's
+                    # execute() steps it only once; executescript() runs it to completion
+                    connection.connection.driver_connection.executescript(
+                        f"PRAGMA incremental_vacuum({pages_per_step})"
+                    )
+                    remaining = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+                connection.commit()
+            if not free or remaining >= free:
+                break
+            freed += free - remaining
+            time.sleep(self.pause)
+
+        if freed:
+            self.report(f"    … {label or engine.url.database}: reclaimed {freed} free pages")
+        return freed
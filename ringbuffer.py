@@ -0,0 +1,269 @@
+"""
+Memory-mapped ring buffer of recent telemetry, shared by every worker process.
+
+One file holds a fixed-capacity ring per unit. Every gunicorn worker maps the same
+file: ingest appends each committed reading to its unit's ring, and the live views
+read the latest reading or a recent window straight from memory, without SQL.
+
+File layout, little-endian:
+
+    header    64 bytes   magic b"PMRING", version (u16), record size (u16), capacity (u32),
+                         layout checksum (u32), created (epoch ms, i64), padding
+    slot      64 bytes   per unit, in `units` order: head (u64, records ever appended),
+                         evicted_max (i64), latest_seq (u64), latest_ms (i64),
+                         ordered_from (u64), padding
+              capacity x record   epoch ms (i64), then the fields in order: float32 for
+                         instantaneous values, float64 for counters (energy, runtime),
+                         NaN for missing values
+
+Record `seq` (0, 1, 2, ...) lives at index seq % capacity. Readings usually arrive in
+time order; ordered_from is the first seq after the last out-of-order append, so the
+records from there to head are sorted and range reads binary-search them.
+
+Writers take an exclusive flock on the file and readers a shared one, plus a
+process-local lock because flock is per open file. The ring answers a query only
+if it covers the range: it holds everything newer than when the file was created,
+the newest evicted record and `window`. Callers fall back to SQL otherwise, for
+example right after a restart with a new file. A committed reading that could not be
+appended counts as evicted (invalidate()), so the ring never claims to cover it.
+"""
+
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+MAGIC = b"PMRING"
+FORMAT_VERSION = 1
+
+FILE_HEADER = struct.Struct("<6sHHIIq")
+FILE_HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct("<QqQqQ")
+SLOT_HEADER_SIZE = 64
+TIMESTAMP = struct.Struct("<q")
+
+NO_TIMESTAMP = -(1 << 63)
+EPOCH = datetime(1970, 1, 1)
+ONE_MS = timedelta(milliseconds=1)
+
+
+def to_epoch_ms(timestamp):
+    return (timestamp - EPOCH) // ONE_MS
+
+
+class TelemetryRing:
+    def __init__(self, path, units, fields, counter_fields=(), capacity=17280, window=timedelta(hours=24)):
+        """
+        path            -- ring file, created (sparse) or re-initialized if its layout changed
+        units           -- (plant_id, unit_id) pairs, one ring each
+        fields          -- measurement columns stored per record
+        counter_fields  -- those of `fields` stored as float64 (large monotonic counters)
+        capacity        -- records per unit; size it so `window` fits at the reporting rate
+        window          -- readings older than this are not appended or served
+        """
+        self.path = path
+        self.units = list(units)
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self.window_ms = window // ONE_MS
+
+        self.record = struct.Struct("<q" + "".join('d' if field in counter_fields else 'f' for field in self.fields))
+        self.Record = namedtuple('RingRecord', ('unit_id', 'timestamp') + self.fields)
+        self.layout = zlib.crc32(repr((self.units, self.fields, self.record.format)).encode())
+
+        slot_size = SLOT_HEADER_SIZE + capacity * self.record.size
+        self._slots = {unit: FILE_HEADER_SIZE + i * slot_size for i, unit in enumerate(self.units)}
+        self.size = FILE_HEADER_SIZE + len(self.units) * slot_size
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self.created_ms = None
+        self.disabled = False      # set when even invalidate() failed: this process stops serving
+
+    # File ---------------------------------------------------------------------------
+
+    def _open(self):
+        """Map the file in this process (again after a fork: flock must not be shared)"""
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, FILE_HEADER.size, 0)
+            if len(header) < FILE_HEADER.size or os.fstat(fd).st_size != self.size or \
+                    FILE_HEADER.unpack(header)[:5] != (MAGIC, FORMAT_VERSION, self.record.size, self.capacity, self.layout):
+                # New file or a different layout: start empty (sparse until written)
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                created = int(time.time() * 1000)
+                os.pwrite(fd, FILE_HEADER.pack(MAGIC, FORMAT_VERSION, self.record.size, self.capacity,
+                                               self.layout, created), 0)
+                empty_slot = SLOT_HEADER.pack(0, NO_TIMESTAMP, 0, NO_TIMESTAMP, 0)
+                for offset in self._slots.values():
+                    os.pwrite(fd, empty_slot, offset)
+            else:
+                created = FILE_HEADER.unpack(header)[5]
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+        self._fd = fd
+        self._map = mmap.mmap(fd, self.size)
+        self.created_ms = created
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None and self._pid == os.getpid():
+                self._map.close()
+                os.close(self._fd)
+            self._pid = self._fd = self._map = None
+
+    def _record_offset(self, slot, seq):
+        return slot + SLOT_HEADER_SIZE + (seq % self.capacity) * self.record.size
+
+    # Writes -------------------------------------------------------------------------
+
+    def append_rows(self, plant_id, rows, now=None):
+        """Append a plant's stored rows (dicts with unit_id, timestamp and the fields)"""
+        if now is None:
+            now = datetime.utcnow()
+        oldest_ms = to_epoch_ms(now) - self.window_ms
+
+        by_unit = {}
+        for row in rows:
+            timestamp_ms = to_epoch_ms(row['timestamp'])
+            if timestamp_ms >= oldest_ms and (plant_id, row['unit_id']) in self._slots:
+                values = [math.nan if row.get(field) is None else row[field] for field in self.fields]
+                by_unit.setdefault(row['unit_id'], []).append((timestamp_ms, values))
+        if not by_unit:
+            return
+
+        with self._locked(exclusive=True) as ring:
+            for unit_id, records in by_unit.items():
+                slot = self._slots[(plant_id, unit_id)]
+                head, evicted_max, latest_seq, latest_ms, ordered_from = SLOT_HEADER.unpack_from(ring, slot)
+                for timestamp_ms, values in records:
+                    offset = self._record_offset(slot, head)
+                    if head >= self.capacity:
+                        evicted_max = max(evicted_max, TIMESTAMP.unpack_from(ring, offset)[0])
+                    self.record.pack_into(ring, offset, timestamp_ms, *values)
+                    if timestamp_ms >= latest_ms:
+                        latest_seq, latest_ms = head, timestamp_ms
+                    else:
+                        ordered_from = head + 1
+                    head += 1
+                SLOT_HEADER.pack_into(ring, slot, head, evicted_max, latest_seq, latest_ms, ordered_from)
+
+    def invalidate(self, plant_id, rows):
+        """
+        Give up coverage of stored rows that append_rows() failed to write: each unit's
+        evicted_max moves up to the newest of its rows, so reads of a range holding them
+        go to SQL. If that fails too, this process no longer serves reads from the ring.
+        """
+        newest = {}
+        for row in rows:
+            if (plant_id, row['unit_id']) in self._slots:
+                timestamp_ms = to_epoch_ms(row['timestamp'])
+                newest[row['unit_id']] = max(newest.get(row['unit_id'], timestamp_ms), timestamp_ms)
+        try:
+            with self._locked(exclusive=True) as ring:
+                for unit_id, timestamp_ms in newest.items():
+                    slot = self._slots[(plant_id, unit_id)]
+                    head, evicted_max, latest_seq, latest_ms, ordered_from = SLOT_HEADER.unpack_from(ring, slot)
+                    SLOT_HEADER.pack_into(ring, slot, head, max(evicted_max, timestamp_ms),
+                                          latest_seq, latest_ms, ordered_from)
+        except Exception:
+            self.disabled = True
+            raise
+
+    # Reads --------------------------------------------------------------------------
+
+    def covers(self, plant_id, unit_id, since, now=None):
+        """True if every reading of the unit at or after `since` is in the ring"""
+        slot = self._slots.get((plant_id, unit_id))
+        if slot is None or self.disabled:
+            return False
+        if now is None:
+            now = datetime.utcnow()
+        since_ms = to_epoch_ms(since)
+        with self._locked(exclusive=False) as ring:
+            evicted_max = SLOT_HEADER.unpack_from(ring, slot)[1]
+        return since_ms >= self.created_ms and since_ms > evicted_max and \
+            since_ms >= to_epoch_ms(now) - self.window_ms
+
+    def _to_record(self, unit_id, values):
+        timestamp_ms, *fields = values
+        return self.Record(unit_id, EPOCH + timestamp_ms * ONE_MS,
+                           *(None if value != value else value for value in fields))
+
+    def latest(self, plant_id, unit_id, since):
+        """Newest reading of the unit at or after `since`, or None"""
+        slot = self._slots[(plant_id, unit_id)]
+        since_ms = to_epoch_ms(since)
+        with self._locked(exclusive=False) as ring:
+            head, evicted_max, latest_seq, latest_ms, ordered_from = SLOT_HEADER.unpack_from(ring, slot)
+            if latest_ms < since_ms:
+                return None
+            if latest_seq + self.capacity >= head:
+                return self._to_record(unit_id, self.record.unpack_from(ring, self._record_offset(slot, latest_seq)))
+        # The newest reading was pushed out by later, older ones: scan what is left
+        records = self.records(plant_id, unit_id, since)
+        return max(records, key=lambda record: record.timestamp) if records else None
+
+    def records(self, plant_id, unit_id, since, until=None):
+        """Readings of the unit with since <= timestamp < until, oldest first"""
+        slot = self._slots[(plant_id, unit_id)]
+        since_ms = to_epoch_ms(since)
+        until_ms = to_epoch_ms(until) if until is not None else None
+
+        with self._locked(exclusive=False) as ring:
+            head, evicted_max, latest_seq, latest_ms, ordered_from = SLOT_HEADER.unpack_from(ring, slot)
+            first = max(0, head - self.capacity)
+            ordered_from = max(ordered_from, first)
+
+            # Binary search the sorted suffix for the first record at or after `since`
+            start = bisect_left(
+                range(ordered_from, head), since_ms,
+                key=lambda seq: TIMESTAMP.unpack_from(ring, self._record_offset(slot, seq))[0]
+            ) + ordered_from
+            if start > ordered_from:
+                first = start   # everything before the sorted suffix is older still
+
+            raw = b"".join(self._spans(ring, slot, first, head))
+
+        records = []
+        for values in self.record.iter_unpack(raw):
+            if values[0] >= since_ms and (until_ms is None or values[0] < until_ms):
+                records.append(self._to_record(unit_id, values))
+        if first < ordered_from:
+            records.sort(key=lambda record: record.timestamp)
+        return records
+
+    def _spans(self, ring, slot, first, end):
+        """Raw bytes of records [first, end), split where the ring wraps"""
+        while first < end:
+            index = first % self.capacity
+            count = min(end - first, self.capacity - index)
+            offset = slot + SLOT_HEADER_SIZE + index * self.record.size
+            yield ring[offset:offset + count * self.record.size]
+            first += count
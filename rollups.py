@@ -0,0 +1,329 @@
+"""
+Continuous rollups of plant telemetry at 1-minute, 15-minute and hourly resolution.
+
+A rollup row summarizes one unit over one bucket: count, sum, min, max and last value
+of power, current_avg, voltage_avg, energy and runtime (plus the timestamp of the last
+reading). The ingest path does not aggregate anything. A catch-up job recomputes
+the 1m rollups from raw telemetry up to a watermark that trails the clock by `lag`,
+and derives the 15m and 1h rollups from the 1m ones. Rows stored behind the
+watermark (reconnect flushes, backfills) mark their minutes dirty, and the job
+recomputes those.
+
+Readers combine rollups below the watermark with raw readings above it, so results
+stay current even when the job falls behind.
+
+Buckets are only recomputed where raw retention still holds every reading: a late row in
+a minute whose raw rows are already deleted leaves that minute's stored rollups as they are.
+
+Raw telemetry is read through the `read_raw` callable, so this module does not
+depend on the storage layout (per-plant, partitioned or unified).
+"""
+
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extension import db
+
+ROLLUP_FIELDS = ('power', 'current_avg', 'voltage_avg', 'energy', 'runtime')
+
+ROLLUP_RESOLUTIONS = {
+    '1m': timedelta(minutes=1),
+    '15m': timedelta(minutes=15),
+    '1h': timedelta(hours=1),
+}
+
+EPOCH = datetime(1970, 1, 1)
+WATERMARK_NAME = 'telemetry'
+
+
+def floor_time(timestamp, step):
+    return timestamp - (timestamp - EPOCH) % step
+
+
+def ceil_time(timestamp, step):
+    floored = floor_time(timestamp, step)
+    return floored if floored == timestamp else floored + step
+
+
+def _rollup_table(resolution):
+    # (plant_id, bucket, unit_id): a plant's time range is one contiguous primary key range
+    columns = [
+        sa.Column('plant_id', sa.Integer, primary_key=True),
+        sa.Column('bucket', sa.DateTime, primary_key=True),
+        sa.Column('unit_id', sa.Integer, primary_key=True),
+        sa.Column('last_timestamp', sa.DateTime, nullable=False),
+    ]
+    for field in ROLLUP_FIELDS:
+        columns += [
+            sa.Column(f'{field}_count', sa.Integer, nullable=False),
+            sa.Column(f'{field}_sum', sa.Float, nullable=True),
+            sa.Column(f'{field}_min', sa.Float, nullable=True),
+            sa.Column(f'{field}_max', sa.Float, nullable=True),
+            sa.Column(f'{field}_last', sa.Float, nullable=True),
+        ]
+    return db.Table(f'telemetry_rollup_{resolution}', *columns, sqlite_with_rowid=False)
+
+
+ROLLUP_TABLES = {resolution: _rollup_table(resolution) for resolution in ROLLUP_RESOLUTIONS}
+
+# Watermark of the catch-up job: every 1m bucket before it has been rolled up
+ROLLUP_STATE = db.Table(
+    'telemetry_rollup_state',
+    sa.Column('name', sa.String(32), primary_key=True),
+    sa.Column('watermark', sa.DateTime, nullable=False),
+)
+
+# Minutes that received rows after (or while) they were rolled up
+ROLLUP_DIRTY = db.Table(
+    'telemetry_rollup_dirty',
+    sa.Column('plant_id', sa.Integer, primary_key=True),
+    sa.Column('bucket', sa.DateTime, primary_key=True),
+    sqlite_with_rowid=False,
+)
+
+
+# Aggregation ------------------------------------------------------------------------
+# Inputs must arrive oldest first: the last value is simply the last one merged.
+
+def new_aggregate(plant_id, unit_id, bucket):
+    aggregate = {'plant_id': plant_id, 'bucket': bucket, 'unit_id': unit_id, 'last_timestamp': None}
+    for field in ROLLUP_FIELDS:
+        aggregate[f'{field}_count'] = 0
+        aggregate[f'{field}_sum'] = None
+        aggregate[f'{field}_min'] = None
+        aggregate[f'{field}_max'] = None
+        aggregate[f'{field}_last'] = None
+    return aggregate
+
+
+def _combine(aggregate, field, count, total, low, high, last):
+    if aggregate[f'{field}_count']:
+        aggregate[f'{field}_sum'] += total
+        aggregate[f'{field}_min'] = min(aggregate[f'{field}_min'], low)
+        aggregate[f'{field}_max'] = max(aggregate[f'{field}_max'], high)
+    else:
+        aggregate[f'{field}_sum'] = total
+        aggregate[f'{field}_min'] = low
+        aggregate[f'{field}_max'] = high
+    aggregate[f'{field}_count'] += count
+    aggregate[f'{field}_last'] = last
+
+
+def add_reading(aggregate, reading):
+    """Merge one raw reading (a row or model object with the measurement attributes)"""
+    for field in ROLLUP_FIELDS:
+        value = getattr(reading, field)
+        if value is not None:
+            _combine(aggregate, field, 1, value, value, value, value)
+    if aggregate['last_timestamp'] is None or reading.timestamp > aggregate['last_timestamp']:
+        aggregate['last_timestamp'] = reading.timestamp
+
+
+def add_rollup(aggregate, rollup):
+    """Merge a finer rollup row (a mapping)"""
+    for field in ROLLUP_FIELDS:
+        if rollup[f'{field}_count']:
+            _combine(
+                aggregate, field, rollup[f'{field}_count'], rollup[f'{field}_sum'],
+                rollup[f'{field}_min'], rollup[f'{field}_max'], rollup[f'{field}_last']
+            )
+    if aggregate['last_timestamp'] is None or rollup['last_timestamp'] > aggregate['last_timestamp']:
+        aggregate['last_timestamp'] = rollup['last_timestamp']
+
+
+def aggregate_readings(plant_id, readings, step):
+    """Raw readings (oldest first) -> {(bucket, unit_id): aggregate}"""
+    aggregates = {}
+    for reading in readings:
+        bucket = floor_time(reading.timestamp, step)
+        key = (bucket, reading.unit_id)
+        aggregate = aggregates.get(key)
+        if aggregate is None:
+            aggregate = aggregates[key] = new_aggregate(plant_id, reading.unit_id, bucket)
+        add_reading(aggregate, reading)
+    return aggregates
+
+
+class TelemetryRollups:
+    def __init__(self, read_raw, plant_ids, read_recent=None, lag=timedelta(minutes=2),
+                 chunk=timedelta(hours=1), initial_lookback=timedelta(days=7), raw_start=None):
+        """
+        read_raw          -- (plant_id, start, end) -> raw readings with start <= timestamp < end, oldest first
+        read_recent       -- same signature, used for the raw tail of reads (e.g. a faster recent-data
+                             source); rollups themselves are always recomputed from read_raw
+        raw_start         -- (plant_id) -> time from which raw telemetry is complete (the raw retention
+                             cutoff); earlier buckets are never recomputed. None: no limit
+        plant_ids         -- plants rolled up by the catch-up job
+        lag               -- how far the watermark trails the clock (readings still in flight)
+        chunk             -- catch-up range rolled up per transaction
+        initial_lookback  -- where the first catch-up starts (raw retention)
+        """
+        self.read_raw = read_raw
+        self.read_recent = read_recent or read_raw
+        self.plant_ids = list(plant_ids)
+        self.lag = lag
+        self.chunk = chunk
+        self.initial_lookback = initial_lookback
+        self.raw_start = raw_start
+        self.tables = ROLLUP_TABLES
+
+    # Watermark ----------------------------------------------------------------------
+
+    def watermark(self, executor):
+        return executor.execute(
+            sa.select(ROLLUP_STATE.c.watermark).where(ROLLUP_STATE.c.name == WATERMARK_NAME)
+        ).scalar()
+
+    def _set_watermark(self, session, watermark):
+        statement = sqlite_insert(ROLLUP_STATE).values(name=WATERMARK_NAME, watermark=watermark)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[ROLLUP_STATE.c.name],
+            set_={'watermark': statement.excluded.watermark}
+        ))
+
+    def reset(self, session):
+        """Forget the watermark; the next catch_up() rebuilds from initial_lookback"""
+        session.execute(ROLLUP_STATE.delete().where(ROLLUP_STATE.c.name == WATERMARK_NAME))
+        session.commit()
+
+    # Writes -------------------------------------------------------------------------
+
+    def mark_late(self, session, plant_id, rows, now=None):
+        """
+        Ingest hook: record the minutes of rows old enough that the catch-up job may
+        already have rolled them up. Live readings are newer and cost one comparison each.
+        """
+        if now is None:
+            now = datetime.utcnow()
+        threshold = now - self.lag / 2
+        step = ROLLUP_RESOLUTIONS['1m']
+        minutes = {floor_time(row['timestamp'], step) for row in rows if row['timestamp'] < threshold}
+        if minutes:
+            session.execute(
+                sqlite_insert(ROLLUP_DIRTY).on_conflict_do_nothing(),
+                [{'plant_id': plant_id, 'bucket': minute} for minute in sorted(minutes)]
+            )
+
+    def _replace(self, session, resolution, plant_id, start, end, aggregates):
+        table = self.tables[resolution]
+        session.execute(
+            table.delete()
+            .where(table.c.plant_id == plant_id)
+            .where(table.c.bucket >= start)
+            .where(table.c.bucket < end)
+        )
+        if aggregates:
+            session.execute(table.insert(), list(aggregates))
+
+    def recompute(self, session, plant_id, start, end):
+        """
+        Rebuild every resolution of a plant's rollups for the buckets overlapping [start, end),
+        from the first whole minute raw retention still holds.
+        """
+        step = ROLLUP_RESOLUTIONS['1m']
+        start, end = floor_time(start, step), ceil_time(end, step)
+        if self.raw_start is not None:
+            start = max(start, ceil_time(self.raw_start(plant_id), step))
+            if start >= end:
+                return
+        aggregates = aggregate_readings(plant_id, self.read_raw(plant_id, start, end), step)
+        self._replace(session, '1m', plant_id, start, end, aggregates.values())
+
+        fine = self.tables['1m']
+        for resolution in ('15m', '1h'):
+            step = ROLLUP_RESOLUTIONS[resolution]
+            coarse_start, coarse_end = floor_time(start, step), ceil_time(end, step)
+            rollups = session.execute(
+                sa.select(fine)
+                .where(fine.c.plant_id == plant_id)
+                .where(fine.c.bucket >= coarse_start)
+                .where(fine.c.bucket < coarse_end)
+                .order_by(fine.c.bucket)
+            ).mappings()
+
+            aggregates = {}
+            for rollup in rollups:
+                bucket = floor_time(rollup['bucket'], step)
+                key = (bucket, rollup['unit_id'])
+                aggregate = aggregates.get(key)
+                if aggregate is None:
+                    aggregate = aggregates[key] = new_aggregate(plant_id, rollup['unit_id'], bucket)
+                add_rollup(aggregate, rollup)
+            self._replace(session, resolution, plant_id, coarse_start, coarse_end, aggregates.values())
+
+    # Jobs ---------------------------------------------------------------------------
+    # Both write before reading raw telemetry, so the transaction holds the write lock
+    # and no ingest commit can slip between the read and the watermark/dirty update.
+
+    def catch_up(self, session, now=None):
+        """Advance the watermark to now - lag, one committed chunk at a time; returns it"""
+        if now is None:
+            now = datetime.utcnow()
+        target = floor_time(now - self.lag, ROLLUP_RESOLUTIONS['1m'])
+
+        watermark = self.watermark(session)
+        if watermark is None:
+            watermark = floor_time(now - self.initial_lookback, ROLLUP_RESOLUTIONS['1h'])
+
+        while watermark < target:
+            chunk_end = min(watermark + self.chunk, target)
+            self._set_watermark(session, chunk_end)
+            for plant_id in self.plant_ids:
+                self.recompute(session, plant_id, watermark, chunk_end)
+            session.commit()
+            watermark = chunk_end
+        return watermark
+
+    def process_dirty(self, session):
+        """Recompute the minutes marked by mark_late(), merged into ranges; returns how many"""
+        step = ROLLUP_RESOLUTIONS['1m']
+        dirty = sorted(session.execute(
+            ROLLUP_DIRTY.delete().returning(ROLLUP_DIRTY.c.plant_id, ROLLUP_DIRTY.c.bucket)
+        ).all())
+        if not dirty:
+            session.commit()
+            return 0
+
+        ranges = []
+        for plant_id, bucket in dirty:
+            if ranges and ranges[-1][0] == plant_id and ranges[-1][2] == bucket:
+                ranges[-1][2] = bucket + step
+            else:
+                ranges.append([plant_id, bucket, bucket + step])
+
+        for plant_id, start, end in ranges:
+            self.recompute(session, plant_id, start, end)
+        session.commit()
+        return len(dirty)
+
+    # Reads --------------------------------------------------------------------------
+
+    def series(self, session, plant_id, resolution, start, end=None):
+        """
+        Rollups of a plant at `resolution` for the buckets overlapping [start, end), oldest
+        first: stored rollups below the watermark, raw readings aggregated on the fly above it.
+        """
+        if end is None:
+            end = datetime.utcnow()
+        step = ROLLUP_RESOLUTIONS[resolution]
+        table = self.tables[resolution]
+        start = floor_time(start, step)
+
+        watermark = self.watermark(session)
+        split = start if watermark is None else min(max(floor_time(watermark, step), start), end)
+
+        results = []
+        if split > start:
+            results.extend(dict(row) for row in session.execute(
+                sa.select(table)
+                .where(table.c.plant_id == plant_id)
+                .where(table.c.bucket >= start)
+                .where(table.c.bucket < split)
+                .order_by(table.c.bucket, table.c.unit_id)
+            ).mappings())
+        if split < end:
+            tail = aggregate_readings(plant_id, self.read_recent(plant_id, split, end), step)
+            results.extend(tail[key] for key in sorted(tail))
+        return results
@@ -0,0 +1,310 @@
+"""
+Background jobs that run once across every worker process.
+
+gunicorn starts several copies of the app, and a thread started at import would run
+each job once per worker. Here every worker starts a scheduler, but only the one that
+holds an exclusive flock() on a lock file beside the database runs jobs; the others
+retry the lock every poll interval. The OS drops the lock when its holder exits (even
+on a crash), so a standby worker takes over within one poll interval.
+
+Jobs have cron-style schedules and run one at a time on the leader's scheduler thread,
+so a long retention pass never overlaps a rollup catch-up on the single writer. A run
+missed while no worker was leader, or while another job was running, happens once as
+soon as possible. The leader records every job's last run and next run in the
+scheduled_job table, which any worker can serve as a status view. A new leader (after a
+restart or a failover) picks up the recorded next runs, so a due run is not lost
+to the change of leader.
+"""
+
+import fcntl
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extension import db
+
+# Last known state of each job, written by whichever worker was leader at the time
+SCHEDULED_JOB_TABLE = db.Table(
+    'scheduled_job',
+    sa.Column('name', sa.String(64), primary_key=True),
+    sa.Column('schedule', sa.String(64), nullable=False),
+    sa.Column('status', sa.String(16), nullable=False),       # scheduled, running, ok, failed
+    sa.Column('leader', sa.String(128), nullable=True),       # host:pid of the worker that ran it
+    sa.Column('last_started', sa.DateTime, nullable=True),
+    sa.Column('last_finished', sa.DateTime, nullable=True),
+    sa.Column('last_duration', sa.Float, nullable=True),      # seconds
+    sa.Column('last_error', sa.Text, nullable=True),
+    sa.Column('next_run', sa.DateTime, nullable=True),
+    sa.Column('runs', sa.Integer, nullable=False, default=0),
+    sa.Column('failures', sa.Integer, nullable=False, default=0),
+)
+
+_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),     # 0 and 7 are both Sunday, as in cron
+)
+
+
+def _parse_field(text, low, high, name):
+    values = set()
+    for part in text.split(','):
+        span, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if span == '*':
+            first, last = low, high
+        elif '-' in span:
+            first, last = (int(value) for value in span.split('-', 1))
+        else:
+            first = int(span)
+            last = high if step > 1 else first
+        if step < 1 or first < low or last > high or first > last:
+            raise ValueError(f"Invalid cron {name} field: {text!r}")
+        values.update(range(first, last + 1, step))
+    if name == 'weekday':
+        values = {value % 7 for value in values}
+    return frozenset(values)
+
+
+class CronSchedule:
+    """
+    Five-field cron expression (minute hour day month weekday) with *, */n, a-b, a-b/n
+    and comma lists. As in cron, a restricted day and weekday match if either matches.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(text, low, high, name) for text, (name, low, high) in zip(fields, _FIELDS)
+        )
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """First matching minute strictly after `moment` (naive wall-clock time)"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+    def __str__(self):
+        return self.expression
+
+
+class ScheduledJob:
+    def __init__(self, name, schedule, function):
+        self.name = name
+        self.schedule = schedule
+        self.function = function
+        self.next_run = None
+
+
+class JobScheduler:
+    def __init__(self, app, lock_path=None, timezone=None, poll_interval=5.0):
+        """
+        app            -- Flask app; jobs run inside its app context
+        lock_path      -- file whose flock() elects the leader; None (in-memory databases)
+                          makes this process the leader unconditionally
+        timezone       -- pytz/tzinfo the cron schedules are read in (naive UTC if None)
+        poll_interval  -- seconds between due-job checks and, on standby, lock attempts
+        """
+        self.app = app
+        self.lock_path = lock_path
+        self.timezone = timezone
+        self.poll_interval = poll_interval
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+        self.jobs = {}
+        self._lock_file = None
+        self._leader = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return self._leader
+
+    def add(self, name, schedule, function):
+        """Register `function` (no arguments) to run on the cron `schedule`"""
+        self.jobs[name] = ScheduledJob(name, CronSchedule(schedule), function)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="job-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._release()
+
+    def status(self):
+        """Every job's row from scheduled_job, as dicts (call inside an app context)"""
+        rows = db.session.execute(
+            sa.select(SCHEDULED_JOB_TABLE).order_by(SCHEDULED_JOB_TABLE.c.name)
+        ).mappings().all()
+        return [dict(row) for row in rows]
+
+    def _local_now(self):
+        if self.timezone is None:
+            return datetime.utcnow()
+        return datetime.now(self.timezone).replace(tzinfo=None)
+
+    def _to_utc(self, local):
+        if self.timezone is None:
+            return local
+        localize = getattr(self.timezone, 'localize', None)
+        aware = localize(local) if localize else local.replace(tzinfo=self.timezone)
+        return aware.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+    def _from_utc(self, utc):
+        if self.timezone is None:
+            return utc
+        aware = utc.replace(tzinfo=dt_timezone.utc).astimezone(self.timezone)
+        return aware.replace(tzinfo=None)
+
+    def _try_acquire(self):
+        if self.lock_path is None:
+            return True
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # For operators: who holds the lock
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{self.worker}\n")
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def _release(self):
+        self._leader = False
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                if not self._leader and self._try_acquire():
+                    self._become_leader()
+
+                if self._leader:
+                    for job in self.jobs.values():
+                        if self._stop_event.is_set():
+                            break
+                        if self._local_now() >= job.next_run:
+                            self._run_job(job)
+            except Exception as e:
+                # e.g. the lock file became unreadable: keep the thread alive and retry next poll
+                print(f"Error in job scheduler: {e.__class__.__name__}: {e}")
+                if not self._leader:
+                    # Failed between taking the lock and becoming leader: let go so the next try starts clean
+                    self._release()
+
+            self._stop_event.wait(self.poll_interval)
+
+    def _become_leader(self):
+        print(f"✓ Job scheduler: {self.worker} is leader for {len(self.jobs)} jobs")
+        now = self._local_now()
+        recorded = self._recorded_next_runs()
+        for job in self.jobs.values():
+            # A recorded next run in the past was missed while no one (or a dead leader) ran it
+            job.next_run = recorded.get((job.name, str(job.schedule))) or job.schedule.next_after(now)
+            self._record(job)
+        self._leader = True
+
+    def _recorded_next_runs(self):
+        """{(name, schedule): local next_run} from scheduled_job; empty if it cannot be read"""
+        try:
+            with self.app.app_context():
+                rows = db.session.execute(sa.select(
+                    SCHEDULED_JOB_TABLE.c.name, SCHEDULED_JOB_TABLE.c.schedule, SCHEDULED_JOB_TABLE.c.next_run
+                )).all()
+                db.session.remove()
+        except Exception as e:
+            print(f"Error reading scheduled job state: {str(e)}")
+            return {}
+        # A row whose schedule was since edited is ignored: its next run came from the old expression
+        return {(name, schedule): self._from_utc(next_run) for name, schedule, next_run in rows if next_run}
+
+    def _run_job(self, job):
+        started = time.monotonic()
+        self._record(job, status='running', last_started=datetime.utcnow(), last_error=None)
+        error = None
+        try:
+            with self.app.app_context():
+                job.function()
+                db.session.remove()
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+            print(f"Error during scheduled job {job.name}: {error}")
+            traceback.print_exc()
+            with self.app.app_context():
+                db.session.rollback()
+                db.session.remove()
+
+        # Missed runs collapse into this one: the next run is the next match after now
+        job.next_run = job.schedule.next_after(self._local_now())
+        values = dict(
+            status='failed' if error else 'ok',
+            last_finished=datetime.utcnow(),
+            last_duration=time.monotonic() - started,
+            last_error=error,
+            runs=SCHEDULED_JOB_TABLE.c.runs + 1,
+        )
+        if error:
+            values['failures'] = SCHEDULED_JOB_TABLE.c.failures + 1
+        self._record(job, **values)
+
+    def _record(self, job, **values):
+        """Upsert the job's status row; a status write failing never stops the scheduler"""
+        values = dict(values, schedule=str(job.schedule), leader=self.worker,
+                      next_run=self._to_utc(job.next_run))
+        # First sight of the job: counters start from zero (or one, for this run)
+        inserted = dict(values, name=job.name, status=values.get('status', 'scheduled'),
+                        runs=int('runs' in values), failures=int('failures' in values))
+        statement = sqlite_insert(SCHEDULED_JOB_TABLE).values(**inserted)
+        try:
+            with self.app.app_context():
+                db.session.execute(statement.on_conflict_do_update(index_elements=['name'], set_=values))
+                db.session.commit()
+                db.session.remove()
+        except Exception as e:
+            print(f"Error recording scheduled job {job.name}: {str(e)}")
@@ -1,3 +1,4 @@
+import json
 import requests
 import random
 import time
@@ -16,6 +17,11 @@ session.mount("http://", adapter)
 session.mount("https://", adapter)
 
 URL = "http://127.0.0.1:5000/data"
+BULK_URL = "http://127.0.0.1:5000/data/bulk"
+LEAN_ACK = True  # ask /data for the stored count only, not the per-record echo
+# Prefix for message ids so a restarted simulator is not mistaken for replays
+RUN_ID = "%08x" % random.getrandbits(32)
+BULK_MODE = False  # True: send every unit of a cycle as one NDJSON request to /data/bulk
 #URL = "https://ineffaceably-unguarded-evelina.ngrok-free.dev/data"
 PLANT_NAMES = {
     1: "pta", 2: "bgd", 3: "tha", 4: "klp", 5: "gru",
@@ -30,7 +36,8 @@ PLANT_CONFIG = {
 
 def send_data(data, attempt=1, max_attempts=3):
     try:
-        response = session.post(URL, json=data, headers={'Content-Type': 'application/json'}, timeout=10)
+        url = URL + "?ack=lean" if LEAN_ACK else URL
+        response = session.post(url, json=data, headers={'Content-Type': 'application/json'}, timeout=10)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -40,6 +47,16 @@ def send_data(data, attempt=1, max_attempts=3):
         else:
             return {"status": "error", "message": str(e)}
 
+def send_bulk(records):
+    """Send a list of ESP32-style dicts as one newline-delimited JSON body"""
+    body = "\n".join(json.dumps(record) for record in records)
+    try:
+        response = session.post(BULK_URL, data=body, headers={'Content-Type': 'application/x-ndjson'}, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        return {"status": "error", "message": str(e)}
+
 def generate_esp32_json(plant_name, unit_id):
     """Generate ESP32-style JSON for one unit without calculating power"""
     return {
@@ -68,11 +85,25 @@ def main():
     sample_count = 0
     try:
         while True:
+            if BULK_MODE:
+                records = [
+                    generate_esp32_json(plant_name, unit_id)
+                    for plant_id, plant_name in PLANT_NAMES.items()
+                    for unit_id in range(1, PLANT_CONFIG[plant_id] + 1)
+                ]
+                sample_count += len(records)
+                response = send_bulk(records)
+                print(f"\n📦 Bulk cycle: {len(records)} units -> "
+                      f"accepted {response.get('accepted', 0)}, rejected {response.get('rejected', 0)}")
+                time.sleep(5)
+                continue
+
             for plant_id, unit_count in PLANT_CONFIG.items():
                 plant_name = PLANT_NAMES[plant_id]
 
                 for unit_id in range(1, unit_count + 1):
                     data = generate_esp32_json(plant_name, unit_id)
+                    data["msg_id"] = f"{RUN_ID}-{sample_count}"  # lets the server drop retried duplicates
                     sample_count += 1
 
                     print(f"\n📊 Sample #{sample_count}")
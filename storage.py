@@ -0,0 +1,158 @@
+"""
+SQLite reader/writer split.
+
+The default Flask-SQLAlchemy engine is the writer: a pool of exactly one connection,
+so every write in the process is serialized through it, with tuned pragmas and the
+database switched to WAL. A second engine (bind key READER_BIND_KEY) holds a pool of
+query-only connections. In WAL mode those readers never block the writer and the
+writer never blocks them.
+
+RoutingSession sends plain SELECTs to the reader pool and everything else (INSERT,
+UPDATE, DELETE, flushes, DDL) to the writer. Once a transaction has written, its
+reads also go to the writer so they see their own uncommitted changes.
+
+Optionally, tables can be sharded into further database files (bind keys shard1..N),
+each with its own single-connection writer, so writes to different shards do not wait
+for one another's lock. Sharded tables carry their bind key as schema name: the shard's
+own engine translates it back to "main", and every reader connection ATTACHes all the
+shard files under those names, so any read, including one statement spanning every
+shard, runs on the reader pool.
+"""
+
+import os
+import sqlite3
+
+import sqlalchemy as sa
+from flask_sqlalchemy.session import Session
+
+READER_BIND_KEY = 'reader'
+
+WRITER_PRAGMAS = (
+    ('auto_vacuum', 'INCREMENTAL'), # takes effect on new files (or after VACUUM): see retention.py
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),     # WAL + NORMAL: durable across app crashes, fsync at checkpoints
+    ('cache_size', -64000),        # ~64 MB page cache
+    ('mmap_size', 268435456),      # 256 MB memory-mapped I/O
+    ('busy_timeout', 30000),
+    ('temp_store', 'MEMORY'),
+)
+
+READER_PRAGMAS = (
+    ('cache_size', -32000),
+    ('mmap_size', 268435456),
+    ('busy_timeout', 30000),
+    ('query_only', 'ON'),
+)
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def read_write_split_config(database_uri, engine_options, reader_pool_size=8):
+    """
+    Config entries for the split: returns (writer engine options, SQLALCHEMY_BINDS).
+    The writer pool is capped at one connection, the readers get their own pool.
+    """
+    writer_options = dict(engine_options, pool_size=1, max_overflow=0)
+    binds = {
+        READER_BIND_KEY: dict(
+            engine_options,
+            url=database_uri,
+            pool_size=reader_pool_size,
+            max_overflow=reader_pool_size,
+        )
+    }
+    return writer_options, binds
+
+
+SHARD_BIND_PREFIX = 'shard'
+
+
+def shard_key(plant_id, shard_count):
+    """Bind key (and schema name) of the shard holding a plant: plants are dealt round-robin"""
+    return f"{SHARD_BIND_PREFIX}{(plant_id - 1) % shard_count + 1}"
+
+
+def shard_binds(database_uri, shard_count, engine_options):
+    """
+    SQLALCHEMY_BINDS entries for shard1..shard<shard_count>: files named after the main
+    database (plant_monitoring-shard1.db, ...), each with a writer pool of one connection.
+    """
+    url = sa.engine.make_url(database_uri)
+    if not url.database or url.database == ':memory:':
+        raise ValueError("Sharding needs a file-backed SQLite database")
+    attach_limit = sqlite3.connect(':memory:').getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if shard_count > attach_limit:
+        raise ValueError(f"{shard_count} shards exceed SQLite's limit of {attach_limit} attached databases")
+
+    root, extension = os.path.splitext(url.database)
+    binds = {}
+    for number in range(1, shard_count + 1):
+        key = f"{SHARD_BIND_PREFIX}{number}"
+        binds[key] = dict(
+            engine_options,
+            url=url.set(database=f"{root}-{key}{extension or '.db'}").render_as_string(hide_password=False),
+            pool_size=1,
+            max_overflow=0,
+            execution_options={'schema_translate_map': {key: None}},
+        )
+    return binds
+
+
+def _attach_listener(attachments):
+    def attach_shards(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, path in attachments:
+                cursor.execute("ATTACH DATABASE ? AS " + name, (path,))
+        finally:
+            cursor.close()
+    return attach_shards
+
+
+def read_engine(db):
+    """Engine for reads that may span shards: the reader pool, or the writer without the split"""
+    return db.engines.get(READER_BIND_KEY, db.engine)
+
+
+def configure_engines(db):
+    """Attach pragma listeners; call inside an app context right after db.init_app()"""
+    sa.event.listen(db.engine, 'connect', _pragma_listener(WRITER_PRAGMAS))
+    reader = db.engines.get(READER_BIND_KEY)
+    if reader is not None:
+        sa.event.listen(reader, 'connect', _pragma_listener(READER_PRAGMAS))
+
+    shards = sorted(key for key in db.engines if key and key.startswith(SHARD_BIND_PREFIX))
+    for key in shards:
+        sa.event.listen(db.engines[key], 'connect', _pragma_listener(WRITER_PRAGMAS))
+    if shards:
+        sa.event.listen(read_engine(db), 'connect',
+                        _attach_listener([(key, db.engines[key].url.database) for key in shards]))
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            is_read = isinstance(clause, (sa.Select, sa.CompoundSelect)) and not self._flushing
+            if is_read and not self.info.get('wrote'):
+                reader = self._db.engines.get(READER_BIND_KEY)
+                if reader is not None:
+                    return reader
+            elif not is_read:
+                self.info['wrote'] = True
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@sa.event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_write_flag(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
@@ -0,0 +1,120 @@
+"""
+Compact binary telemetry format for /data/bin (cellular-connected units).
+
+Batch layout (version 2), little-endian, no padding:
+
+    header   8 bytes   magic b"PM", format version (u8), flags (u8, reserved = 0),
+                       base time (u32, Unix seconds UTC)
+    record  44 bytes   plant_id (u8), unit_id (u8), presence bitmask (u16),
+                       time offset (u32, milliseconds after the base time),
+                       9 x float32 in MEASUREMENT_FIELDS order
+
+Bit i of the presence mask is set when MEASUREMENT_FIELDS[i] carries a value;
+absent fields are ignored whatever their bytes contain. A time offset of 0xFFFFFFFF
+means the reading has no timestamp, and the server's receive time is used. One batch
+spans at most ~49 days from its base time.
+
+Version 1 batches (4-byte header, 40-byte records without the time offset) from units
+not yet updated are still accepted; their readings get the receive time.
+"""
+
+import struct
+from datetime import datetime, timedelta
+
+MAGIC = b"PM"
+FORMAT_VERSION = 2
+
+HEADER_PREFIX = struct.Struct("<2sBB")
+HEADER = struct.Struct("<2sBBI")
+RECORD = struct.Struct("<BBHI9f")
+RECORD_V1 = struct.Struct("<BBH9f")
+
+NO_TIMESTAMP = 0xFFFFFFFF
+EPOCH = datetime(1970, 1, 1)
+
+# Same columns the ESP32 JSON keys map to, in wire order
+MEASUREMENT_FIELDS = (
+    'power',
+    'current_l1', 'current_l2', 'current_l3',
+    'voltage_l12', 'voltage_l23', 'voltage_l13',
+    'energy', 'runtime',
+)
+
+ALL_FIELDS_MASK = (1 << len(MEASUREMENT_FIELDS)) - 1
+
+
+class BinaryFormatError(ValueError):
+    """Raised when a /data/bin body is not a valid batch"""
+
+
+def decode_batch(body):
+    """
+    Decode a batch into parsed-unit dicts ({'plant_id', 'unit_id', <column>: value}).
+    Records are unpacked straight from a memoryview of the body, without slicing copies.
+    """
+    view = memoryview(body)
+    if len(view) < HEADER_PREFIX.size:
+        raise BinaryFormatError("Body shorter than header")
+
+    magic, version, flags = HEADER_PREFIX.unpack_from(view)
+    if magic != MAGIC:
+        raise BinaryFormatError("Bad magic")
+    if version == 1:
+        return _decode_records(view[HEADER_PREFIX.size:], RECORD_V1, None)
+    if version != FORMAT_VERSION:
+        raise BinaryFormatError(f"Unsupported format version {version}")
+
+    if len(view) < HEADER.size:
+        raise BinaryFormatError("Body shorter than header")
+    base_time = EPOCH + timedelta(seconds=HEADER.unpack_from(view)[3])
+    return _decode_records(view[HEADER.size:], RECORD, base_time)
+
+
+def _decode_records(records, record, base_time):
+    if len(records) % record.size:
+        raise BinaryFormatError(f"Body length is not a multiple of the {record.size}-byte record size")
+
+    parsed_units = []
+    for plant_id, unit_id, mask, *values in record.iter_unpack(records):
+        unit_data = {'plant_id': plant_id, 'unit_id': unit_id}
+        if base_time is not None:
+            offset = values.pop(0)
+            if offset != NO_TIMESTAMP:
+                unit_data['timestamp'] = base_time + timedelta(milliseconds=offset)
+        mask &= ALL_FIELDS_MASK
+        for bit, column in enumerate(MEASUREMENT_FIELDS):
+            if mask >> bit & 1:
+                unit_data[column] = values[bit]
+        parsed_units.append(unit_data)
+
+    return parsed_units
+
+
+def encode_batch(units):
+    """
+    Encode parsed-unit dicts into a batch (used by simulators and firmware test rigs).
+    Missing or None fields are left out of the presence mask; a 'timestamp' (naive UTC
+    datetime) becomes the record's time offset from the earliest one in the batch.
+    """
+    timestamps = [unit_data['timestamp'] for unit_data in units if unit_data.get('timestamp') is not None]
+    base_seconds = int((min(timestamps) - EPOCH).total_seconds()) if timestamps else 0
+    base_time = EPOCH + timedelta(seconds=base_seconds)
+
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, 0, base_seconds)]
+    for unit_data in units:
+        mask = 0
+        values = []
+        for bit, column in enumerate(MEASUREMENT_FIELDS):
+            value = unit_data.get(column)
+            if value is None:
+                values.append(0.0)
+            else:
+                mask |= 1 << bit
+                values.append(float(value))
+        offset = NO_TIMESTAMP
+        if unit_data.get('timestamp') is not None:
+            offset = (unit_data['timestamp'] - base_time) // timedelta(milliseconds=1)
+            if offset >= NO_TIMESTAMP:
+                raise ValueError("A batch cannot span more than ~49 days of timestamps")
+        parts.append(RECORD.pack(unit_data['plant_id'], unit_data['unit_id'], mask, offset, *values))
+    return b"".join(parts)
@@ -0,0 +1,22 @@
+"""
+Tests run against a scratch SQLite database with the background jobs off. app07 reads
+its configuration at import time, so the environment is set before any test imports it.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="plant_tests_")
+os.environ.update(
+    PLANT_DB_URI=f"sqlite:///{os.path.join(SCRATCH_DIR, 'plant_monitoring.db')}?check_same_thread=False",
+    PLANT_JOBS="0",
+)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
@@ -0,0 +1,53 @@
+from admission import AdmissionController
+
+
+def test_bucket_allows_a_burst_then_refills():
+    admission = AdmissionController(rate=2.0, burst=4)
+
+    assert admission.try_acquire_all({(1, 1): 4}, now=0.0) == (True, 0)
+    allowed, retry_after = admission.try_acquire_all({(1, 1): 1}, now=0.0)
+    assert not allowed
+    assert retry_after == 0.5
+    assert admission.try_acquire_all({(1, 1): 1}, now=0.5) == (True, 0)
+
+
+def test_all_or_nothing_across_devices():
+    admission = AdmissionController(rate=1.0, burst=2)
+    admission.try_acquire_all({(1, 2): 2}, now=0.0)
+
+    allowed, retry_after = admission.try_acquire_all({(1, 1): 2, (1, 2): 1}, now=0.0)
+    assert not allowed
+    assert retry_after == 1.0
+    assert admission.shed_by_device == {(1, 2): 1}
+    # The device that could pay was not charged for the rejected request
+    assert admission.try_acquire_all({(1, 1): 2}, now=0.0) == (True, 0)
+
+
+def test_cost_above_burst_is_charged_as_a_full_bucket():
+    admission = AdmissionController(rate=1.0, burst=5)
+
+    assert admission.try_acquire_all({(1, 1): 50}, now=0.0) == (True, 0)
+    assert not admission.try_acquire_all({(1, 1): 1}, now=0.0)[0]
+
+
+def test_slow_writes_shed_until_the_latency_decays():
+    admission = AdmissionController(max_write_latency=1.0, latency_half_life=2.0, smoothing=1.0)
+    assert admission.check_writer(now=0.0) == 0
+
+    admission.record_write(4.0, now=0.0)
+    assert admission.check_writer(now=0.0) == 4.0     # two half-lives until 4s decays to 1s
+    assert admission.check_writer(now=4.1) == 0
+    assert admission.shed_overloaded == 1
+
+
+def test_admitted_counts_only_requests_that_passed_every_check():
+    admission = AdmissionController(rate=1.0, burst=1)
+
+    assert admission.check_writer(now=0.0) == 0
+    admission.try_acquire_all({(1, 1): 1}, now=0.0)
+    assert admission.check_writer(now=0.0) == 0
+    admission.try_acquire_all({(1, 1): 1}, now=0.0)
+    admission.record_admitted()
+
+    assert admission.stats()['admitted'] == 2
+    assert admission.stats()['shed_rate_limited'] == 1
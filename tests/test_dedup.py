@@ -0,0 +1,46 @@
+from dedup import DedupWindow, sequence_number
+
+
+def test_replay_is_refused_per_device():
+    window = DedupWindow()
+
+    assert window.claim((1, 1), '17')
+    assert not window.claim((1, 1), '17')
+    assert window.claim((1, 2), '17')
+    assert window.duplicates == 1
+
+
+def test_oldest_ids_leave_a_full_window():
+    window = DedupWindow(size=3)
+    for message_id in ('a', 'b', 'c', 'd'):
+        assert window.claim((1, 1), message_id)
+
+    assert window.claim((1, 1), 'a')          # evicted by 'd'
+    assert not window.claim((1, 1), 'd')
+
+
+def test_sequence_reset_forgets_the_old_ids():
+    window = DedupWindow(reset_gap=100)
+    assert window.claim((1, 1), '1000')
+    assert window.claim((1, 1), '950')        # out of order, within the gap
+    assert not window.claim((1, 1), '950')
+
+    assert window.claim((1, 1), '1')          # far below the newest: the device restarted
+    assert window.resets == 1
+    assert window.claim((1, 1), '1000')
+
+
+def test_release_allows_a_retry():
+    window = DedupWindow()
+    window.claim((1, 1), 'x')
+    window.release((1, 1), 'x')
+    window.release((1, 1), 'never-claimed')
+
+    assert window.claim((1, 1), 'x')
+
+
+def test_sequence_number():
+    assert sequence_number('42') == 42
+    assert sequence_number('abc') is None
+    assert sequence_number('1' * 19) is None  # would overflow SQLite's INTEGER
+    assert sequence_number('４２') is None     # non-ASCII digits
@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+from gorilla import encode_chunk, decode_chunk, GorillaFormatError
+
+
+def test_round_trip_regular_and_irregular_timestamps():
+    timestamps = [1_700_000_000_000 + i * 5000 for i in range(100)]
+    timestamps += [timestamps[-1] + delta for delta in (1, 70, 300, 2500, 10 ** 9)]
+    power = [1500.0 + (i % 7) * 0.25 for i in range(len(timestamps))]
+
+    decoded_timestamps, values = decode_chunk(encode_chunk(timestamps, {'power': power}))
+
+    assert decoded_timestamps == timestamps
+    assert values == {'power': power}
+
+
+def test_values_are_bit_exact():
+    values = [0.0, -0.0, 1e-300, -123.456, 1e308, math.pi, math.pi, 42.0]
+    timestamps = list(range(len(values)))
+
+    _, decoded = decode_chunk(encode_chunk(timestamps, {'energy': values}))
+
+    assert [math.copysign(1, v) for v in decoded['energy']] == [math.copysign(1, v) for v in values]
+    assert decoded['energy'] == values
+
+
+def test_nulls():
+    timestamps = list(range(0, 10_000, 1000))
+    some_null = [None if i % 3 == 0 else float(i) for i in range(len(timestamps))]
+    all_null = [None] * len(timestamps)
+
+    _, decoded = decode_chunk(encode_chunk(timestamps, {'power': some_null, 'runtime': all_null}))
+
+    assert decoded == {'power': some_null, 'runtime': all_null}
+
+
+def test_decode_selected_columns_only():
+    timestamps = [0, 1000, 2000]
+    chunk = encode_chunk(timestamps, {'power': [1.0, 2.0, 3.0], 'energy': [4.0, 5.0, 6.0]})
+
+    decoded_timestamps, values = decode_chunk(chunk, ['energy', 'unknown'])
+
+    assert decoded_timestamps == timestamps
+    assert values == {'energy': [4.0, 5.0, 6.0]}
+
+
+def test_column_length_must_match_timestamps():
+    with pytest.raises(ValueError):
+        encode_chunk([0, 1000], {'power': [1.0]})
+
+
+def test_rejects_foreign_and_truncated_chunks():
+    chunk = encode_chunk([0, 1000, 2000], {'power': [1.0, 2.0, 3.0]})
+    with pytest.raises(GorillaFormatError):
+        decode_chunk(b"XX" + chunk[2:])
+    with pytest.raises(GorillaFormatError):
+        decode_chunk(chunk[:4])
@@ -0,0 +1,51 @@
+"""Every hot telemetry statement must be served by an index on a freshly created database"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app07 import (
+    app, db, read_engine, PLANT_TABLES, hot_telemetry_queries, explain_query_plan,
+    latest_fleet_statement, latest_plants_statement,
+)
+
+
+def table_steps(plan, table_prefix):
+    """Plan steps that read a table whose name starts with table_prefix"""
+    return [step for step in plan if step.startswith(('SCAN ', 'SEARCH ')) and step.split()[1].startswith(table_prefix)]
+
+
+@pytest.fixture
+def connection():
+    with app.app_context():
+        with read_engine(db).connect() as connection:
+            yield connection
+
+
+@pytest.mark.parametrize('plant_id', sorted(PLANT_TABLES))
+def test_plant_table_queries_use_an_index(connection, plant_id):
+    PlantTable = PLANT_TABLES[plant_id]
+    for label, statement in hot_telemetry_queries(PlantTable).items():
+        plan = explain_query_plan(connection, statement)
+        steps = table_steps(plan, PlantTable.__tablename__)
+        assert steps, f"{label}: {plan}"
+        for step in steps:
+            assert 'USING INDEX' in step or 'USING COVERING INDEX' in step, f"{label}: {plan}"
+        assert not any('TEMP B-TREE' in step for step in plan), f"{label} sorts without an index: {plan}"
+
+
+def test_latest_plants_statement_uses_an_index(connection):
+    plan = explain_query_plan(connection, latest_plants_statement(datetime.utcnow() - timedelta(minutes=2)))
+    steps = table_steps(plan, 'plant_')
+    assert steps, plan
+    for step in steps:
+        assert 'USING INDEX' in step or 'USING COVERING INDEX' in step, plan
+
+
+def test_latest_fleet_statement_uses_the_clustered_key(connection):
+    plan = explain_query_plan(connection, latest_fleet_statement(datetime.utcnow() - timedelta(minutes=2)))
+    steps = table_steps(plan, 'fleet_telemetry')
+    assert steps, plan
+    # fleet_telemetry is WITHOUT ROWID: its primary key is the (plant_id, unit_id, timestamp) index
+    for step in steps:
+        assert step.startswith('SEARCH') and 'USING PRIMARY KEY' in step, plan
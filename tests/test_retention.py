@@ -0,0 +1,83 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from retention import RetentionEngine
+
+START = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def table_session():
+    metadata = sa.MetaData()
+    table = sa.Table(
+        'readings', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('plant_id', sa.Integer, nullable=False),
+        sa.Column('timestamp', sa.DateTime, nullable=False, index=True),
+    )
+    engine = sa.create_engine('sqlite://')
+    metadata.create_all(engine)
+    with Session(engine) as session:
+        yield table, session
+
+
+def insert(session, table, plant_id, timestamps):
+    session.execute(table.insert(), [{'plant_id': plant_id, 'timestamp': timestamp} for timestamp in timestamps])
+    session.commit()
+
+
+def remaining(session, table, *criteria):
+    return session.execute(sa.select(table.c.timestamp).where(*criteria).order_by(table.c.timestamp)).scalars().all()
+
+
+def chunk_sizes(reports):
+    return [int(re.search(r'chunk (\d+) rows', report).group(1)) for report in reports]
+
+
+def test_purge_deletes_exactly_the_expired_rows_in_growing_chunks(table_session):
+    table, session = table_session
+    insert(session, table, 1, [START + timedelta(minutes=i) for i in range(1000)])
+    reports = []
+    engine = RetentionEngine(chunk_rows=100, time_budget=60.0, pause=0, report=reports.append, report_every=0)
+
+    deleted = engine.purge(session, table, START + timedelta(minutes=700))
+
+    assert deleted == 700
+    assert remaining(session, table) == [START + timedelta(minutes=i) for i in range(700, 1000)]
+    # Chunks far under the time budget double
+    assert chunk_sizes(reports) == [200, 400, 800]
+
+
+def test_slow_chunks_shrink_to_the_minimum(table_session):
+    table, session = table_session
+    insert(session, table, 1, [START + timedelta(seconds=i) for i in range(300)])
+    reports = []
+    engine = RetentionEngine(chunk_rows=80, time_budget=0, pause=0, min_chunk_rows=20,
+                             report=reports.append, report_every=0)
+
+    assert engine.purge(session, table, START + timedelta(days=1)) == 300
+    assert chunk_sizes(reports)[:3] == [40, 20, 20]
+
+
+def test_rows_sharing_the_boundary_timestamp_go_in_one_chunk(table_session):
+    table, session = table_session
+    insert(session, table, 1, [START] * 5 + [START + timedelta(minutes=1)] * 5 + [START + timedelta(hours=1)])
+    engine = RetentionEngine(chunk_rows=3, pause=0, report=lambda line: None)
+
+    assert engine.purge(session, table, START + timedelta(minutes=30)) == 10
+    assert remaining(session, table) == [START + timedelta(hours=1)]
+
+
+def test_criteria_limit_the_purge(table_session):
+    table, session = table_session
+    insert(session, table, 1, [START + timedelta(minutes=i) for i in range(50)])
+    insert(session, table, 2, [START + timedelta(minutes=i) for i in range(50)])
+    engine = RetentionEngine(chunk_rows=10, pause=0, report=lambda line: None)
+
+    assert engine.purge(session, table, START + timedelta(days=1), table.c.plant_id == 2) == 50
+    assert len(remaining(session, table, table.c.plant_id == 1)) == 50
+    assert remaining(session, table, table.c.plant_id == 2) == []
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from scheduler import CronSchedule
+
+
+@pytest.mark.parametrize('expression, moment, expected', [
+    ('*/10 * * * *', datetime(2026, 5, 4, 10, 3, 30), datetime(2026, 5, 4, 10, 10)),
+    ('*/10 * * * *', datetime(2026, 5, 4, 10, 10), datetime(2026, 5, 4, 10, 20)),    # strictly after
+    ('30 0 * * *', datetime(2026, 5, 4, 0, 45), datetime(2026, 5, 5, 0, 30)),
+    ('0 0 1 * *', datetime(2026, 1, 31, 12, 0), datetime(2026, 2, 1, 0, 0)),
+    ('15 9-17/4 * * *', datetime(2026, 5, 4, 13, 15), datetime(2026, 5, 4, 17, 15)),
+    ('0 0 1 1 *', datetime(2026, 6, 1), datetime(2027, 1, 1)),
+    ('0 12 * * 7', datetime(2026, 5, 4, 0, 0), datetime(2026, 5, 10, 12, 0)),         # 7 is Sunday
+    ('0 12 * * 1,3', datetime(2026, 5, 4, 12, 0), datetime(2026, 5, 6, 12, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSchedule(expression).next_after(moment) == expected
+
+
+def test_restricted_day_and_weekday_match_either():
+    schedule = CronSchedule('0 0 13 * 5')
+    # Friday 2026-02-06 matches by weekday, Monday 2026-04-13 by day of month
+    assert schedule.next_after(datetime(2026, 2, 1)) == datetime(2026, 2, 6)
+    assert schedule.next_after(datetime(2026, 4, 10, 1)) == datetime(2026, 4, 13)
+
+
+@pytest.mark.parametrize('expression', [
+    '* * * *',
+    '60 * * * *',
+    '* 24 * * *',
+    '*/0 * * * *',
+    '5-1 * * * *',
+    '0 0 31 2 *',
+])
+def test_invalid_or_unsatisfiable_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression).next_after(datetime(2026, 1, 1))
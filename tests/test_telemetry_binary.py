@@ -0,0 +1,62 @@
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from telemetry_binary import (
+    encode_batch, decode_batch, BinaryFormatError, MAGIC, MEASUREMENT_FIELDS, RECORD_V1,
+)
+
+
+def test_round_trip_with_timestamps():
+    base = datetime(2026, 3, 1, 12, 0, 0, 250000)
+    units = [
+        {'plant_id': 1, 'unit_id': 1, 'timestamp': base, 'power': 1500.0, 'energy': 2.5},
+        {'plant_id': 5, 'unit_id': 3, 'timestamp': base + timedelta(seconds=90, milliseconds=5), 'runtime': 7.0},
+        {'plant_id': 2, 'unit_id': 2, 'power': 10.0},
+    ]
+
+    decoded = decode_batch(encode_batch(units))
+
+    assert decoded == units
+
+
+def test_timestamps_keep_milliseconds():
+    timestamp = datetime(2026, 3, 1, 12, 0, 0, 123456)
+
+    decoded = decode_batch(encode_batch([{'plant_id': 1, 'unit_id': 1, 'timestamp': timestamp, 'power': 1.0}]))
+
+    assert decoded[0]['timestamp'] == timestamp.replace(microsecond=123000)
+
+
+def test_absent_fields_are_left_out():
+    decoded = decode_batch(encode_batch([{'plant_id': 1, 'unit_id': 1, 'power': None, 'current_l1': 3.0}]))
+
+    assert decoded == [{'plant_id': 1, 'unit_id': 1, 'current_l1': 3.0}]
+
+
+def test_batch_spanning_too_long_is_refused():
+    start = datetime(2026, 1, 1)
+    with pytest.raises(ValueError):
+        encode_batch([
+            {'plant_id': 1, 'unit_id': 1, 'timestamp': start},
+            {'plant_id': 1, 'unit_id': 1, 'timestamp': start + timedelta(days=60)},
+        ])
+
+
+def test_version_1_batches_decode_without_timestamps():
+    values = [float(i) for i in range(len(MEASUREMENT_FIELDS))]
+    body = struct.pack("<2sBB", MAGIC, 1, 0) + RECORD_V1.pack(3, 2, 0b11, *values)
+
+    assert decode_batch(body) == [{'plant_id': 3, 'unit_id': 2, 'power': 0.0, 'current_l1': 1.0}]
+
+
+@pytest.mark.parametrize('body', [
+    b"P",                                          # shorter than the header
+    b"XX\x02\x00\x00\x00\x00\x00",                 # bad magic
+    b"PM\x09\x00\x00\x00\x00\x00",                 # unknown version
+    b"PM\x02\x00\x00\x00\x00\x00" + b"\x00" * 10,  # partial record
+])
+def test_rejects_malformed_bodies(body):
+    with pytest.raises(BinaryFormatError):
+        decode_batch(body)